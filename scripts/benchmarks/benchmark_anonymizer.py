@@ -0,0 +1,65 @@
+import sys
+import os
+import json
+import time
+import argparse
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.rag.anonymizer import PIIRuleEngine
+from src.rag.anonymizer_reference import ANONYMIZED_FIELDS, SAMPLE_TICKETS, legacy_anonymize_text
+from src.rag.config import PII_RULES_PATH
+
+
+def load_tickets(input_path, limit):
+    """
+    Loads up to `limit` records from a raw export (JSON with a 'records' key) or a JSONL file.
+    """
+    with open(input_path, 'r') as f:
+        if input_path.endswith('.jsonl'):
+            records = []
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+                if len(records) >= limit:
+                    break
+            return records
+        return json.load(f).get('records', [])[:limit]
+
+
+def run(anonymize, tickets, repeat):
+    """
+    Anonymizes every field of every ticket `repeat` times and returns records/sec.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for ticket in tickets:
+            for field in ANONYMIZED_FIELDS:
+                anonymize(ticket.get(field))
+    elapsed = time.perf_counter() - start
+    return len(tickets) * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PII rule engine against the legacy regex chain.")
+    parser.add_argument("--input-path", type=str, default=None,
+                        help="Raw ServiceNow JSON export or JSONL file to sample tickets from. Defaults to built-in samples.")
+    parser.add_argument("--limit", type=int, default=10000, help="Maximum number of tickets to load from --input-path.")
+    parser.add_argument("--repeat", type=int, default=None, help="Number of passes over the tickets.")
+    parser.add_argument("--rules-path", type=str, default=PII_RULES_PATH, help="Path to the PII rules file.")
+    args = parser.parse_args()
+
+    tickets = load_tickets(args.input_path, args.limit) if args.input_path else SAMPLE_TICKETS
+    repeat = args.repeat or max(1, 20000 // len(tickets))
+    engine = PIIRuleEngine.from_config(args.rules_path)
+
+    # Equivalence with the legacy chain is checked in tests/test_anonymizer.py
+    legacy_rate = run(legacy_anonymize_text, tickets, repeat)
+    engine_rate = run(engine.anonymize, tickets, repeat)
+    print(f"legacy chain: {legacy_rate:,.0f} records/sec")
+    print(f"rule engine:  {engine_rate:,.0f} records/sec ({engine_rate / legacy_rate:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import sys
+import os
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+# Each backend is measured in a fresh interpreter so import time and peak RSS are not shared
+BACKENDS = {
+    "torch": {"EMBEDDING_BACKEND": "torch"},
+    "onnx-fp32": {"EMBEDDING_BACKEND": "onnx", "EMBEDDING_ONNX_QUANTIZED": "0"},
+    "onnx-int8": {"EMBEDDING_BACKEND": "onnx", "EMBEDDING_ONNX_QUANTIZED": "1"},
+}
+
+SAMPLE_TEXTS = [
+    "How do I request more storage for my project directory?",
+    "My job has been pending for two days with reason QOSMaxCpuPerUserLimit.",
+    "Title: Password reset\n\nI cannot log in to the cluster via ssh after changing my password. "
+    "I tried resetting it through the portal twice and still get permission denied.",
+    "module load cuda/12.1 fails with 'unable to locate a modulefile'",
+    "sbatch --gres=gpu:1 --partition=gpu --time=02:00:00 job.sh",
+    "Quota exceeded on /home, how can I find which directories use the most space?",
+    "Jupyter notebook through OnDemand keeps disconnecting after a few minutes. "
+    "The session shows as running in the dashboard but the browser tab reports a proxy error.",
+    "What is the difference between the main and the gpu partitions?",
+]
+
+
+def load_texts(input_path, limit):
+    """
+    Loads chunk-sized texts from a prepared ServiceNow JSONL file.
+    """
+    texts = []
+    with open(input_path, 'r') as f:
+        for line in f:
+            texts.append(json.loads(line)["text"][:1000])
+            if len(texts) >= limit:
+                break
+    return texts
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure_backend(texts, queries):
+    """
+    Runs in the child process: loads the configured backend and reports
+    import and load time, query latency, batch throughput and peak RSS.
+    """
+    start = time.perf_counter()
+    from src.rag.vector_store import load_embedding_model
+    import_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embeddings = load_embedding_model()
+    load_s = time.perf_counter() - start
+
+    # Warm up before timing
+    embeddings.embed_documents(texts[:8])
+
+    latencies = []
+    for i in range(queries):
+        start = time.perf_counter()
+        embeddings.embed_query(SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)])
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    embeddings.embed_documents(texts)
+    batch_s = time.perf_counter() - start
+
+    return {
+        "import_s": import_s,
+        "load_s": load_s,
+        "query_p50_ms": percentile(latencies, 0.5) * 1000,
+        "query_p95_ms": percentile(latencies, 0.95) * 1000,
+        "chunks_per_sec": len(texts) / batch_s,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "vectors": embeddings.embed_documents(SAMPLE_TEXTS),
+    }
+
+
+def run_backend(name, args):
+    """
+    Measures one backend in a subprocess and returns its results, or None if
+    it could not be loaded.
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--child", "--queries", str(args.queries),
+               "--limit", str(args.limit)]
+    if args.input_path:
+        command += ["--input-path", args.input_path]
+    result = subprocess.run(command, env={**os.environ, **BACKENDS[name]}, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"{name}: failed\n{result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''}")
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the torch and ONNX embedding backends.")
+    parser.add_argument("--input-path", type=str, default=None,
+                        help="Prepared ServiceNow JSONL file to take texts from. Defaults to built-in samples.")
+    parser.add_argument("--limit", type=int, default=2000, help="Number of texts embedded for batch throughput.")
+    parser.add_argument("--queries", type=int, default=200, help="Number of single queries timed for latency.")
+    parser.add_argument("--backends", type=str, nargs="+", choices=list(BACKENDS), default=list(BACKENDS),
+                        help="Backends to compare.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.input_path:
+        texts = load_texts(args.input_path, args.limit)
+    else:
+        texts = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] + f" ({i})" for i in range(args.limit)]
+
+    if args.child:
+        print(json.dumps(measure_backend(texts, args.queries)))
+        return
+
+    results = {name: run_backend(name, args) for name in args.backends}
+    reference = results.get("torch")
+    print(f"{'backend':<10} {'import s':>9} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7} "
+          f"{'chunks/s':>9} {'RSS MB':>7} {'min cos':>8}")
+    for name, result in results.items():
+        if result is None:
+            continue
+        agreement = ""
+        if reference is not None:
+            similarities = [
+                sum(a * b for a, b in zip(u, v)) for u, v in zip(reference["vectors"], result["vectors"])
+            ]
+            agreement = f"{min(similarities):.6f}"
+        print(f"{name:<10} {result['import_s']:>9.2f} {result['load_s']:>7.2f} {result['query_p50_ms']:>7.2f} "
+              f"{result['query_p95_ms']:>7.2f} {result['chunks_per_sec']:>9.1f} {result['peak_rss_mb']:>7.0f} "
+              f"{agreement:>8}")
+
+
+if __name__ == '__main__':
+    main()
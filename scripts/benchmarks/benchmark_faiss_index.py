@@ -0,0 +1,110 @@
+import sys
+import os
+import time
+import argparse
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.rag.faiss_index import training_size
+
+DEFAULT_SPECS = ["HNSW32", "IVF1024,Flat", "IVF1024,PQ48"]
+
+
+def load_vectors(faiss_dir, synthetic, dimension, seed):
+    """
+    Returns the vectors of a persisted flat index, or random unit vectors.
+    """
+    import faiss
+
+    if faiss_dir:
+        index = faiss.read_index(os.path.join(faiss_dir, "index.faiss"))
+        return index.reconstruct_n(0, index.ntotal)
+    vectors = np.random.default_rng(seed).standard_normal((synthetic, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors, count, seed):
+    """
+    Builds queries near stored vectors, like questions close to indexed chunks.
+    """
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), size=count, replace=False)]
+    queries = queries + rng.standard_normal(queries.shape).astype(np.float32) * 0.05
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def search_latency(index, queries, k):
+    """
+    Searches one query at a time, like the chat server, and returns the
+    results and the median latency in milliseconds.
+    """
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        results.append(ids[0])
+    return np.array(results), float(np.median(latencies)) * 1000
+
+
+def recall(results, truth):
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare recall, latency and size of FAISS index specs.")
+    parser.add_argument("--faiss-dir", type=str, default=None,
+                        help="Flat FAISS index to take vectors from. Defaults to synthetic vectors.")
+    parser.add_argument("--synthetic", type=int, default=200000, help="Number of synthetic vectors.")
+    parser.add_argument("--dimension", type=int, default=384, help="Dimension of synthetic vectors.")
+    parser.add_argument("--specs", type=str, nargs="+", default=DEFAULT_SPECS, help="index_factory specs to compare.")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries.")
+    parser.add_argument("--k", type=int, default=5, help="Number of neighbours retrieved per query.")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 8, 16, 64], help="IVF nprobe values to sweep.")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 64, 128], help="HNSW efSearch values to sweep.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import faiss
+
+    vectors = load_vectors(args.faiss_dir, args.synthetic, args.dimension, args.seed)
+    queries = make_queries(vectors, args.queries, args.seed)
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    truth, flat_ms = search_latency(flat, queries, args.k)
+    print(f"{'spec':<16} {'param':<14} {'recall':>7} {'p50 ms':>7} {'size MB':>8} {'build s':>8}")
+    print(f"{'Flat':<16} {'':<14} {1.0:>7.3f} {flat_ms:>7.3f} {flat.ntotal * flat.d * 4 / 2**20:>8.1f} {0.0:>8.1f}")
+
+    for spec in args.specs:
+        start = time.perf_counter()
+        index = faiss.index_factory(vectors.shape[1], spec)
+        if not index.is_trained:
+            size = min(training_size(spec), len(vectors))
+            index.train(vectors[np.random.default_rng(args.seed).choice(len(vectors), size=size, replace=False)])
+        index.add(vectors)
+        build_s = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / 2**20
+
+        if "IVF" in spec:
+            sweep = [("nprobe", value) for value in args.nprobe]
+        elif "HNSW" in spec:
+            sweep = [("efSearch", value) for value in args.ef_search]
+        else:
+            sweep = [(None, None)]
+        for name, value in sweep:
+            if name == "nprobe":
+                faiss.extract_index_ivf(index).nprobe = value
+            elif name == "efSearch":
+                index.hnsw.efSearch = value
+            results, ms = search_latency(index, queries, args.k)
+            param = f"{name}={value}" if name else ""
+            print(f"{spec:<16} {param:<14} {recall(results, truth):>7.3f} {ms:>7.3f} {size_mb:>8.1f} {build_s:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import sys
+import os
+import time
+import argparse
+import threading
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.rag import config
+from src.rag.generation_scheduler import GenerationScheduler
+
+QUESTIONS = [
+    "How do I submit a batch job with Slurm?",
+    "How can I request a GPU node?",
+    "My job is stuck in the pending state, what should I do?",
+    "How do I load a specific version of gcc?",
+    "How do I transfer files to the cluster?",
+    "How much storage do I have in my home directory?",
+    "How do I run a Jupyter notebook on a compute node?",
+    "What is the maximum walltime of a job?",
+]
+
+
+def prompt_for(question):
+    return f"<|user|>\n{question}<|end|>\n<|assistant|>"
+
+
+def run_users(scheduler, users, requests_per_user, max_tokens):
+    """
+    Runs users threads that each ask requests_per_user questions one after
+    another. Returns the per-request latencies, times to first token, the
+    tokens generated and the wall time.
+    """
+    latencies, first_tokens = [], []
+    lock = threading.Lock()
+
+    def user(index):
+        for request in range(requests_per_user):
+            question = QUESTIONS[(index + request) % len(QUESTIONS)]
+            start = time.perf_counter()
+            first_token = None
+            for _ in scheduler.generate(prompt_for(question), max_tokens=max_tokens, seed=index):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                first_tokens.append(first_token or latencies[-1])
+
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    generated = scheduler.generated_tokens
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, first_tokens, scheduler.generated_tokens - generated, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure generation throughput and latency of the batching scheduler under concurrent users."
+    )
+    parser.add_argument("--model-path", type=str, default=config.LLAMA_CPP_MODEL_PATH, help="GGUF model.")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 16], help="Concurrent users.")
+    parser.add_argument("--parallel", type=int, nargs="+", default=[1, 16],
+                        help="Sequences decoded together. 1 generates one answer at a time.")
+    parser.add_argument("--requests-per-user", type=int, default=2, help="Questions each user asks in turn.")
+    parser.add_argument("--max-tokens", type=int, default=128, help="Maximum tokens per answer.")
+    args = parser.parse_args()
+
+    print(f"{'parallel':>8} {'users':>5} {'tokens/s':>9} {'p50 s':>7} {'p95 s':>7} {'TTFT p50':>9} {'TTFT p95':>9}")
+    for parallel in args.parallel:
+        scheduler = GenerationScheduler(args.model_path, max_sequences=parallel)
+        # Warm up so the first measurement does not include loading
+        list(scheduler.generate(prompt_for(QUESTIONS[0]), max_tokens=8))
+        for users in args.users:
+            latencies, first_tokens, tokens, elapsed = run_users(
+                scheduler, users, args.requests_per_user, args.max_tokens
+            )
+            print(f"{parallel:>8} {users:>5} {tokens / elapsed:>9.1f} "
+                  f"{np.percentile(latencies, 50):>7.2f} {np.percentile(latencies, 95):>7.2f} "
+                  f"{np.percentile(first_tokens, 50):>9.2f} {np.percentile(first_tokens, 95):>9.2f}")
+        scheduler.close()
+
+
+if __name__ == '__main__':
+    main()
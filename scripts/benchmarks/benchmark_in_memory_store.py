@@ -0,0 +1,67 @@
+import sys
+import os
+import time
+import argparse
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.rag.numpy_store import NumpyVectorStore
+
+
+def synthetic_vectors(count, dimension, seed):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def queries_per_second(search, queries, batch_size):
+    """
+    Runs all queries in batches of batch_size and returns the results and
+    the throughput.
+    """
+    results = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch_size):
+        results.append(search(queries[i:i + batch_size]))
+    elapsed = time.perf_counter() - start
+    return np.concatenate(results), len(queries) / elapsed
+
+
+def recall(results, truth):
+    return float(np.mean([len(set(r) & set(t)) / len(t) for r, t in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the NumPy in-memory vector store with FAISS Flat.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Corpus sizes.")
+    parser.add_argument("--dimension", type=int, default=384, help="Dimension of the vectors.")
+    parser.add_argument("--queries", type=int, default=256, help="Number of queries.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32], help="Queries searched at once.")
+    parser.add_argument("--k", type=int, default=5, help="Number of neighbours retrieved per query.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import faiss
+
+    print(f"{'size':>8} {'engine':<16} {'batch':>5} {'QPS':>10} {'recall':>7} {'MB':>7}")
+    for size in args.sizes:
+        vectors = synthetic_vectors(size, args.dimension, args.seed)
+        queries = synthetic_vectors(args.queries, args.dimension, args.seed + 1)
+
+        flat = faiss.IndexFlatIP(args.dimension)
+        flat.add(vectors)
+        texts = [""] * size
+        for batch_size in args.batch_sizes:
+            truth, qps = queries_per_second(lambda q: flat.search(q, args.k)[1], queries, batch_size)
+            print(f"{size:>8} {'faiss Flat':<16} {batch_size:>5} {qps:>10.0f} {1.0:>7.3f} {vectors.nbytes / 2**20:>7.1f}")
+            for dtype in ("float32", "float16"):
+                store = NumpyVectorStore(None, dtype=dtype)
+                store.add_vectors(vectors, texts)
+                results, qps = queries_per_second(lambda q: store.search_vectors(q, args.k)[1], queries, batch_size)
+                print(f"{size:>8} {'numpy ' + dtype:<16} {batch_size:>5} {qps:>10.0f} "
+                      f"{recall(results, truth):>7.3f} {store.vectors.nbytes / 2**20:>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import sys
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+# Add the project root to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.rag import config
+from src.rag.context_packer import ContextPacker
+from src.rag.reranker import CrossEncoderReranker
+
+DEFAULT_QUESTIONS = [
+    "How do I submit a batch job with Slurm?",
+    "How can I request a GPU node?",
+    "My job is stuck in the pending state, what should I do?",
+    "How do I load a specific version of gcc?",
+    "How do I transfer files to the cluster?",
+    "I cannot log in to Amarel, my password is not accepted.",
+    "How much storage do I have in my home directory?",
+    "How do I run a Jupyter notebook on a compute node?",
+]
+
+
+def load_questions(path):
+    """
+    Reads one question per line, or a JSON list of questions.
+    """
+    if not path:
+        return DEFAULT_QUESTIONS
+    with open(path, 'r') as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the latency cross-encoder reranking adds against the prompt tokens it saves."
+    )
+    parser.add_argument("--faiss-dir", type=str, default=config.FAISS_INDEX_PATH, help="Path to the saved FAISS index.")
+    parser.add_argument("--questions", type=str, default=None,
+                        help="File with one question per line or a JSON list. Defaults to built-in questions.")
+    parser.add_argument("--dense-k", type=int, default=5, help="Chunks used without reranking.")
+    parser.add_argument("--top-n", type=int, nargs="+", default=[2, 3], help="Chunks kept after reranking.")
+    parser.add_argument("--candidates", type=int, nargs="+", default=[20, 50], help="Candidates reranked.")
+    parser.add_argument("--budget-ms", type=float, default=config.RERANK_TIME_BUDGET_MS,
+                        help="Reranking time budget per question.")
+    parser.add_argument("--tokenizer", type=str, default="microsoft/Phi-3-mini-4k-instruct",
+                        help="Hugging Face tokenizer of the LLM, used to count prompt tokens.")
+    parser.add_argument("--prompt-eval-tps", type=float, default=150.0,
+                        help="Prompt tokens the LLM evaluates per second, to convert saved tokens to time.")
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+    from src.rag.vector_store import get_embedding_model, load_faiss_index
+
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    packer = ContextPacker(lambda text: len(tokenizer.encode(text, add_special_tokens=False)))
+    retriever = load_faiss_index(args.faiss_dir, get_embedding_model())
+    reranker = CrossEncoderReranker(time_budget_ms=args.budget_ms)
+    questions = load_questions(args.questions)
+
+    def context_tokens(documents):
+        return packer.count_tokens("\n\n".join(packer.spans(documents)))
+
+    # Warm up the models so the first question does not pay for loading
+    retriever.search_kwargs["k"] = max(args.candidates)
+    reranker.rerank(questions[0], retriever.invoke(questions[0]), 1)
+    reranker.requests = reranker.timeouts = 0
+
+    print(f"{'candidates':>10} {'top_n':>5} {'rerank ms':>10} {'p95 ms':>7} {'timeouts':>8} "
+          f"{'tokens':>7} {'dense':>6} {'saved':>6} {'saved ms':>8} {'overlap':>7}")
+    for candidates in args.candidates:
+        retriever.search_kwargs["k"] = candidates
+        retrieved = [retriever.invoke(question) for question in questions]
+        for top_n in args.top_n:
+            latencies, tokens, dense_tokens, overlaps = [], [], [], []
+            timeouts = reranker.timeouts
+            for question, documents in zip(questions, retrieved):
+                start = time.perf_counter()
+                reranked = reranker.rerank(question, documents, top_n)
+                latencies.append((time.perf_counter() - start) * 1000)
+                dense = documents[:args.dense_k]
+                tokens.append(context_tokens(reranked))
+                dense_tokens.append(context_tokens(dense))
+                overlaps.append(len({id(d) for d in reranked} & {id(d) for d in dense}) / max(len(reranked), 1))
+            saved = float(np.mean(dense_tokens) - np.mean(tokens))
+            print(f"{candidates:>10} {top_n:>5} {np.mean(latencies):>10.1f} {np.percentile(latencies, 95):>7.1f} "
+                  f"{reranker.timeouts - timeouts:>8} {np.mean(tokens):>7.0f} {np.mean(dense_tokens):>6.0f} "
+                  f"{saved:>6.0f} {saved / args.prompt_eval_tps * 1000:>8.0f} {np.mean(overlaps):>7.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,34 @@
 import argparse
+import os
 import socket
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, Response, render_template_string, request, jsonify, stream_with_context
 
 from src.rag.vector_store import load_faiss_index, get_embedding_model
+from src.rag.query_cache import QueryCachedEmbeddings
+from src.rag.answer_cache import SemanticAnswerCache
+from src.rag.reranker import CrossEncoderReranker, RerankingRetriever
+from src.rag.manifest import MANIFEST_FILENAME, index_version
 from src.rag.rag_pipeline import create_rag_chain
+from src.rag.streaming import CHAT_PAGE_HTML, SSE_HEADERS, StreamingStats, sse_answer_events, timed_stream
 from src.rag.logger import get_logger
 from src.rag import config
 
 logger = get_logger(__name__)
 
-def start_cli_chat(chain):
+def component_stats(query_cache=None, answer_cache=None, reranker=None):
     """
-    Starts an interactive command-line chat session.
+    Returns the counters of the optional pipeline stages reported at /stats.
+    """
+    return {
+        "query_cache": query_cache.stats() if query_cache is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+        "reranker": reranker.stats() if reranker is not None else None,
+    }
+
+def start_cli_chat(chain, query_cache=None, answer_cache=None, reranker=None):
+    """
+    Starts an interactive command-line chat session. Answers are printed as
+    they are generated.
     """
     print("Starting CLI chat with Phi-3. Type 'exit' or 'quit' to end.")
 
@@ -21,77 +38,40 @@ def start_cli_chat(chain):
             if prompt.lower() in ["exit", "quit"]:
                 break
 
-            response = chain.invoke(prompt)
-            print(f"Assistant: {response.strip()}")
+            print("Assistant: ", end="", flush=True)
+            started = False
+            for chunk in timed_stream(chain.stream(prompt)):
+                if not started:
+                    chunk = chunk.lstrip()
+                    started = bool(chunk)
+                print(chunk, end="", flush=True)
+            print()
 
         except KeyboardInterrupt:
             break
         except Exception as e:
             print(f"An error occurred: {e}")
             break
+    if query_cache is not None:
+        query_cache.log_stats()
+    if answer_cache is not None:
+        answer_cache.log_stats()
+    if reranker is not None:
+        logger.info(f"Reranker: {reranker.timeouts} of {reranker.requests} requests hit the time budget.")
     print("\nChat ended.")
 
-def start_web_chat(chain, host: str = "0.0.0.0", port: int = 8088):
+def start_web_chat(chain, host: str = "0.0.0.0", port: int = 8088, query_cache=None, answer_cache=None,
+                   reranker=None):
     """
-    Starts a web-based chat interface using Flask.
+    Starts a web-based chat interface using Flask. The page reads answers
+    from /chat/stream as Server-Sent Events and renders them as they arrive.
     """
     app = Flask(__name__)
-
-    HTML_TEMPLATE = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Chat with Phi-3</title>
-        <style>
-            body { font-family: sans-serif; }
-            #chatbox { width: 80%; height: 400px; border: 1px solid #ccc; overflow-y: scroll; padding: 10px; margin-bottom: 10px; }
-            #userInput { width: 70%; padding: 10px; }
-            #sendButton { padding: 10px; }
-        </style>
-    </head>
-    <body>
-        <h1>Chat with Phi-3</h1>
-        <div id="chatbox"></div>
-        <input type="text" id="userInput" placeholder="Type your message...">
-        <button id="sendButton">Send</button>
-
-        <script>
-            const chatbox = document.getElementById('chatbox');
-            const userInput = document.getElementById('userInput');
-            const sendButton = document.getElementById('sendButton');
-
-            async function sendMessage() {
-                const message = userInput.value;
-                if (!message) return;
-
-                chatbox.innerHTML += `<div><b>You:</b> ${message}</div>`;
-                userInput.value = '';
-
-                const response = await fetch('/chat', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ message: message })
-                });
-
-                const data = await response.json();
-                chatbox.innerHTML += `<div><b>Assistant:</b> ${data.response}</div>`;
-                chatbox.scrollTop = chatbox.scrollHeight;
-            }
-
-            sendButton.addEventListener('click', sendMessage);
-            userInput.addEventListener('keypress', function(e) {
-                if (e.key === 'Enter') {
-                    sendMessage();
-                }
-            });
-        </script>
-    </body>
-    </html>
-    """
+    streaming_stats = StreamingStats()
 
     @app.route("/")
     def home():
-        return render_template_string(HTML_TEMPLATE)
+        return render_template_string(CHAT_PAGE_HTML)
 
     @app.route("/chat", methods=["POST"])
     def chat():
@@ -99,13 +79,48 @@ def start_web_chat(chain, host: str = "0.0.0.0", port: int = 8088):
         bot_response = chain.invoke(user_message)
         return jsonify({"response": bot_response.strip()})
 
+    @app.route("/chat/stream", methods=["POST"])
+    def chat_stream():
+        user_message = request.json["message"]
+        events = sse_answer_events(chain.stream(user_message), streaming_stats)
+        return Response(stream_with_context(events), mimetype="text/event-stream", headers=SSE_HEADERS)
+
     @app.route("/health")
     def health():
         return jsonify({"status": "ok"}), 200
 
+    @app.route("/stats")
+    def stats():
+        return jsonify({
+            **component_stats(query_cache, answer_cache, reranker),
+            "streaming": streaming_stats.stats(),
+        }), 200
+
     node = socket.getfqdn() or "localhost"
     print(f"Starting web server at http://{host}:{port} (node: {node})", flush=True)
-    app.run(host=host, port=port, debug=False)
+    app.run(host=host, port=port, debug=False, threaded=True)
+
+def start_asgi_chat(chain, host: str = "0.0.0.0", port: int = 8088, query_cache=None, answer_cache=None,
+                    reranker=None, workers=config.SERVE_MAX_ACTIVE, max_queue=config.SERVE_MAX_QUEUE,
+                    queue_timeout=config.SERVE_QUEUE_TIMEOUT):
+    """
+    Serves the same web interface from an asynchronous Starlette app under
+    uvicorn. The chain runs on a pool of workers threads, at most max_queue
+    more requests wait for one (429 beyond that, 503 after queue_timeout
+    seconds), and answers stop being generated when the client disconnects.
+    """
+    import uvicorn
+    from src.rag.asgi_server import AdmissionController, create_app
+
+    admission = AdmissionController(max_active=workers, max_queue=max_queue, queue_timeout=queue_timeout)
+    app = create_app(
+        chain, CHAT_PAGE_HTML, stats=lambda: component_stats(query_cache, answer_cache, reranker),
+        admission=admission, workers=workers,
+    )
+    node = socket.getfqdn() or "localhost"
+    print(f"Starting ASGI server at http://{host}:{port} (node: {node})", flush=True)
+    # One process, since the models are loaded in it
+    uvicorn.run(app, host=host, port=port, workers=1)
 
 def main():
     parser = argparse.ArgumentParser(description="Chat with a local Llama model using RAG.")
@@ -115,6 +130,41 @@ def main():
     parser.add_argument("--web", action="store_true", help="Start the web-based chat interface.")
     parser.add_argument("--host", type=str, default="0.0.0.0", help="Host to bind the web server to.")
     parser.add_argument("--port", type=int, default=8088, help="Port to bind the web server to.")
+    parser.add_argument("--server", type=str, choices=["flask", "asgi"], default=config.CHAT_SERVER,
+                        help="Web server: Flask's threaded server, or an async uvicorn server with admission control.")
+    parser.add_argument("--workers", type=int, default=config.SERVE_MAX_ACTIVE,
+                        help="Requests the ASGI server answers at once.")
+    parser.add_argument("--max-queue", type=int, default=config.SERVE_MAX_QUEUE,
+                        help="Requests allowed to wait for a worker before the ASGI server answers 429.")
+    parser.add_argument("--queue-timeout", type=float, default=config.SERVE_QUEUE_TIMEOUT,
+                        help="Seconds a request may wait for a worker before the ASGI server answers 503.")
+    parser.add_argument("--nprobe", type=int, default=config.FAISS_NPROBE,
+                        help="IVF lists scanned per query. Higher is slower with better recall.")
+    parser.add_argument("--ef-search", type=int, default=config.FAISS_EF_SEARCH,
+                        help="HNSW candidate list size. Higher is slower with better recall.")
+    parser.add_argument("--no-hybrid", dest="hybrid", action="store_false", default=config.HYBRID_SEARCH,
+                        help="Only use dense retrieval instead of fusing it with BM25.")
+    parser.add_argument("--fetch-k", type=int, default=config.HYBRID_FETCH_K,
+                        help="Candidates taken from each of the dense and BM25 rankings before fusion.")
+    parser.add_argument("--partition-quotas", type=str, default=config.PARTITION_QUOTAS,
+                        help="Chunks to retrieve from each partition, e.g. 'guides=3,tickets=2'. "
+                             "Overrides --k. Defaults to searching the whole index.")
+    parser.add_argument("--no-mmap", dest="mmap", action="store_false", default=config.FAISS_MMAP,
+                        help="Read the index into memory instead of memory-mapping it.")
+    parser.add_argument("--query-cache-size", type=int, default=config.QUERY_CACHE_SIZE,
+                        help="Number of query embeddings kept in the LRU cache. 0 disables it.")
+    parser.add_argument("--query-cache-ttl", type=float, default=config.QUERY_CACHE_TTL,
+                        help="Seconds before a cached query embedding is recomputed. 0 keeps entries until evicted.")
+    parser.add_argument("--rerank", action=argparse.BooleanOptionalAction, default=config.RERANK,
+                        help="Rerank a wider candidate set with a cross-encoder and keep the best k.")
+    parser.add_argument("--rerank-candidates", type=int, default=config.RERANK_CANDIDATES,
+                        help="Candidates retrieved for reranking.")
+    parser.add_argument("--rerank-budget-ms", type=float, default=config.RERANK_TIME_BUDGET_MS,
+                        help="Time reranking may take per question before falling back to the retrieval order.")
+    parser.add_argument("--answer-cache", action=argparse.BooleanOptionalAction, default=config.ANSWER_CACHE,
+                        help="Reuse answers to similar questions that retrieved the same chunks.")
+    parser.add_argument("--answer-cache-threshold", type=float, default=config.ANSWER_CACHE_THRESHOLD,
+                        help="Minimum cosine similarity between questions for a cached answer to be reused.")
     args = parser.parse_args()
 
     logger.info("Starting chat with the following configuration:")
@@ -122,23 +172,57 @@ def main():
     logger.info(f"  Embedding model name: {config.EMBEDDING_MODEL}")
     logger.info(f"  FAISS index path: {args.faiss_dir}")
     logger.info(f"  k: {args.k}")
-    logger.info(f"  Maximum context length: 2048")
+    logger.info(f"  nprobe: {args.nprobe}, efSearch: {args.ef_search}")
+    logger.info(f"  Memory-mapped index: {args.mmap}")
+    logger.info(f"  Hybrid BM25 retrieval: {args.hybrid} (fetch_k {args.fetch_k})")
+    logger.info(f"  Partition quotas: {args.partition_quotas or 'none'}")
+    logger.info(f"  Maximum context length: {config.LLAMA_CPP_N_CTX}")
+    logger.info(f"  Answers generated together: {config.LLAMA_CPP_PARALLEL}")
+    logger.info(f"  Query cache: {args.query_cache_size} entries, TTL {args.query_cache_ttl or 'none'}")
+    logger.info(f"  Reranking: {args.rerank} ({args.rerank_candidates} candidates, {args.rerank_budget_ms} ms budget)")
+    logger.info(f"  Answer cache: {args.answer_cache} (threshold {args.answer_cache_threshold})")
 
     if args.web:
-        logger.info(f"  Web bind: http://{args.host}:{args.port}")
+        logger.info(f"  Web bind: http://{args.host}:{args.port} ({args.server})")
+        if args.server == "asgi":
+            logger.info(f"  Workers: {args.workers}, queue: {args.max_queue}, queue timeout: {args.queue_timeout}s")
 
     # Load the FAISS retriever
     embedding_model = get_embedding_model()
-    retriever = load_faiss_index(args.faiss_dir, embedding_model)
+    query_cache = None
+    if args.query_cache_size > 0:
+        query_cache = QueryCachedEmbeddings(embedding_model, maxsize=args.query_cache_size, ttl=args.query_cache_ttl)
+        embedding_model = query_cache
+    retriever = load_faiss_index(
+        args.faiss_dir, embedding_model, nprobe=args.nprobe, ef_search=args.ef_search, mmap=args.mmap,
+        hybrid=args.hybrid, fetch_k=args.fetch_k, quotas=args.partition_quotas,
+    )
     retriever.search_kwargs["k"] = args.k
+    reranker = None
+    if args.rerank:
+        reranker = CrossEncoderReranker(time_budget_ms=args.rerank_budget_ms)
+        retriever.search_kwargs["k"] = args.rerank_candidates
+        retriever = RerankingRetriever(base_retriever=retriever, reranker=reranker, top_n=args.k)
+
+    answer_cache = None
+    if args.answer_cache:
+        answer_cache = SemanticAnswerCache(
+            embedding_model, index_version(os.path.join(args.faiss_dir, MANIFEST_FILENAME)),
+            threshold=args.answer_cache_threshold,
+        )
 
     # Create the RAG chain
-    chain = create_rag_chain(retriever=retriever, llm_provider_name="llama_cpp")
-
-    if args.web:
-        start_web_chat(chain, host=args.host, port=args.port)
+    chain = create_rag_chain(retriever=retriever, llm_provider_name="llama_cpp", answer_cache=answer_cache)
+
+    if args.web and args.server == "asgi":
+        start_asgi_chat(chain, host=args.host, port=args.port, query_cache=query_cache, answer_cache=answer_cache,
+                        reranker=reranker, workers=args.workers, max_queue=args.max_queue,
+                        queue_timeout=args.queue_timeout)
+    elif args.web:
+        start_web_chat(chain, host=args.host, port=args.port, query_cache=query_cache, answer_cache=answer_cache,
+                       reranker=reranker)
     else:
-        start_cli_chat(chain)
+        start_cli_chat(chain, query_cache=query_cache, answer_cache=answer_cache, reranker=reranker)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
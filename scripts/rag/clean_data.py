@@ -1,10 +1,20 @@
 import json
-import re
 import os
+import sys
 import logging
 import argparse
 from datetime import datetime
 
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.rag.servicenow import (
+    anonymize_record,
+    available_cpus,
+    clean_record_batches,
+    iter_json_records,
+)
+
 # --- Logging Setup ---
 LOG_DIR = 'logs'
 if not os.path.exists(LOG_DIR):
@@ -22,55 +32,42 @@ logging.basicConfig(
 )
 
 
-def anonymize_text(text):
-    """
-    Anonymizes PII in a given text string.
-    """
-    if not isinstance(text, str):
-        return text
-
-    # Replace email addresses
-    text = re.sub(r'[\w\.-]+@[\w\.-]+', '[EMAIL]', text)
-
-    # Replace full names (simple pattern, might need refinement)
-    # This looks for Title Case words in sequence.
-    text = re.sub(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+\b', '[NAME]', text)
-
-    # Replace usernames/NetIDs (patterns observed in sample data)
-    text = re.sub(r'\b[a-z]{2,3}\d{3,4}\b', '[USER]', text) # e.g., rm1238, yw969, so398
-    text = re.sub(r'\bpgarias\b', '[USER]', text) # specific user from sample
-    text = re.sub(r'\bthackray\b', '[USER]', text) # specific user from sample
-
-    # Generalize file paths
-    text = re.sub(r'\/projects\/f_[a-z0-9]+_\d', '/projects/[USER_PROJECT]', text)
-
-    # Generalize cluster hostnames
-    text = re.sub(r'amarel\.rutgers\.edu', '[CLUSTER_HOSTNAME]', text)
-
-    # Remove or generalize URLs
-    text = re.sub(r'https?:\/\/\S+', '[URL]', text)
-
-    return text
-
-def clean_description(text):
+def process_servicenow_data_streaming(input_path, output_path, workers=None, batch_size=500):
     """
-    Performs general cleaning on the description field.
+    Streaming variant of process_servicenow_data. Records are read
+    incrementally, cleaned in batches across a process pool, and written to a
+    JSONL file in their original order, so memory use does not grow with the
+    size of the export.
     """
-    if not isinstance(text, str):
-        return text
-
-    # Remove redundant "original account request" sections
-    text = re.sub(r'#+\s*Below is the original account request\s*#+.*', '', text, flags=re.DOTALL)
-
-    # Remove Smartsheet footers
-    text = re.sub(r'You are receiving this email because.*', '', text, flags=re.DOTALL)
-    text = re.sub(r'Powered by Smartsheet Inc\..*', '', text, flags=re.DOTALL)
-
+    workers = workers or available_cpus()
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
 
-    # Normalize whitespace
-    text = ' '.join(text.split())
+    logging.info(f"Streaming records from {input_path} with {workers} worker(s), batch size {batch_size}")
+    count = 0
+    try:
+        with open(output_path, 'w') as out:
+            cleaned_batches = clean_record_batches(iter_json_records(input_path), workers, batch_size)
+            for cleaned_batch in cleaned_batches:
+                if count == 0 and cleaned_batch:
+                    first_entry_json = json.dumps(cleaned_batch[0], indent=2)
+                    logging.info(f"First cleaned entry for comparison:\n{first_entry_json}")
+                for entry in cleaned_batch:
+                    out.write(json.dumps(entry) + '\n')
+                previous_count, count = count, count + len(cleaned_batch)
+                if count // 100000 > previous_count // 100000:
+                    logging.info(f"Cleaned {count} records...")
+    except FileNotFoundError:
+        logging.error(f"Error: Input file not found at {input_path}")
+        return
+    except json.JSONDecodeError as e:
+        logging.error(f"Error: Could not decode JSON from {input_path}: {e}")
+        return
 
-    return text
+    if count == 0:
+        logging.warning(f"No records found in {input_path}. Wrote an empty records file.")
+    logging.info(f"Anonymized {count} records successfully written to {output_path}")
 
 def process_servicenow_data(input_path, output_path):
     """
@@ -93,21 +90,7 @@ def process_servicenow_data(input_path, output_path):
         logging.warning(f"No records found in {input_path}. Writing an empty records file.")
         anonymized_data = []
     else:
-        anonymized_data = []
-        for entry in records:
-            anonymized_entry = {}
-            for key, value in entry.items():
-                processed_value = value
-                if key in ['sys_updated_by', 'sys_created_by', 'short_description', 'watch_list']:
-                    processed_value = anonymize_text(value)
-                elif key == 'description':
-                    anonymized_value = anonymize_text(value)
-                    processed_value = clean_description(anonymized_value)
-
-                # Only add non-empty values to the cleaned entry
-                if processed_value != "":
-                    anonymized_entry[key] = processed_value
-            anonymized_data.append(anonymized_entry)
+        anonymized_data = [anonymize_record(entry) for entry in records]
 
     if anonymized_data:
         # Log the first cleaned entry for comparison, pretty-printed
@@ -138,11 +121,33 @@ def main():
         "--output-path",
         type=str,
         required=True,
-        help="Path to save the cleaned JSON file."
+        help="Path to save the cleaned JSON file (a JSONL file with --stream)."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read records incrementally, clean them across a process pool and write JSONL."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes for --stream. Defaults to the number of CPUs."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Number of records sent to a worker at a time with --stream."
     )
     args = parser.parse_args()
 
-    process_servicenow_data(args.input_path, args.output_path)
+    if args.stream:
+        process_servicenow_data_streaming(
+            args.input_path, args.output_path, workers=args.workers, batch_size=args.batch_size
+        )
+    else:
+        process_servicenow_data(args.input_path, args.output_path)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -5,39 +5,197 @@ import argparse
 # Add the src directory to the Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
+from src.rag.bulk_embed import embed_into_faiss
+from src.rag.config import (
+    CHUNKER,
+    DEDUP_THRESHOLD,
+    EMBED_BATCH_SIZE,
+    EMBEDDING_MODEL,
+    FAISS_INDEX_SPEC,
+    FAISS_TRAIN_SIZE,
+    MARKDOWN_LOADER,
+    NUMPY_STORE_PATH,
+    QDRANT_MANIFEST_PATH,
+    QDRANT_UPLOAD_BATCH_SIZE,
+    QDRANT_UPLOAD_PARALLEL,
+)
 from src.rag.data_loader import load_documents, chunk_documents
-from src.rag.vector_store import get_embedding_model, get_vector_store, add_documents_to_store
+from src.rag.dedup import duplicates_by_incident
+from src.rag.faiss_index import (
+    FLAT_SPEC,
+    apply_index_spec,
+    load_index_spec,
+    save_index_spec,
+    supports_removal,
+)
+from src.rag.manifest import (
+    MANIFEST_FILENAME,
+    assign_chunk_ids,
+    diff_chunks,
+    is_manifest_compatible,
+    load_manifest,
+    save_manifest,
+)
+from src.rag.numpy_store import NumpyVectorStore, embed_into_numpy
+from src.rag.qdrant_bulk import upload_to_qdrant
+from src.rag.sharding import select_shard, shard_dir, slurm_num_shards, slurm_shard_index
+from src.rag.vector_store import (
+    get_embedding_model,
+    get_vector_store,
+    log_embedding_cache_stats,
+    load_faiss_store,
+    save_faiss_store,
+    delete_documents_from_store,
+    update_duplicate_metadata,
+)
 from src.rag.logger import get_logger
 
 logger = get_logger(__name__)
 
-def main(vector_store_type, persist_dir, servicenow_path):
+def get_manifest_path(vector_store_type, persist_dir):
+    """
+    Returns where the chunk manifest for the given store lives.
+    """
+    if vector_store_type in ("faiss", "in_memory"):
+        return os.path.join(persist_dir, MANIFEST_FILENAME)
+    return QDRANT_MANIFEST_PATH
+
+def update_vector_store(vector_store_type, persist_dir, embeddings, manifest, chunked_documents, chunk_ids,
+                        embed_options=None, upload_options=None):
+    """
+    Embeds only new or changed chunks and deletes stale ones from an existing store.
+    Duplicate lists are not part of chunk IDs, so they are brought up to date
+    on the unchanged chunks separately.
+    Returns False if the store cannot be updated in place and has to be rebuilt.
+    """
+    new_documents, new_ids, stale_ids = diff_chunks(manifest, chunked_documents, chunk_ids)
+
+    if vector_store_type == "faiss":
+        index_spec = load_index_spec(persist_dir)
+        if stale_ids and not supports_removal(index_spec):
+            logger.info(f"Chunks cannot be deleted from a '{index_spec}' index in place.")
+            return False
+        vector_store = load_faiss_store(persist_dir, embeddings)
+    elif vector_store_type == "in_memory":
+        vector_store = NumpyVectorStore.load(persist_dir, embeddings)
+    else:
+        vector_store = get_vector_store(embeddings, vector_store_type=vector_store_type)
+
+    delete_documents_from_store(vector_store, stale_ids, vector_store_type=vector_store_type)
+    if vector_store_type == "faiss":
+        embed_into_faiss(new_documents, new_ids, embeddings, vector_store=vector_store, **(embed_options or {}))
+    elif vector_store_type == "in_memory":
+        embed_into_numpy(new_documents, new_ids, embeddings, vector_store=vector_store, **(embed_options or {}))
+    else:
+        upload_to_qdrant(
+            vector_store.client, new_documents, new_ids, embeddings, **(embed_options or {}), **(upload_options or {})
+        )
+    updated = update_duplicate_metadata(
+        vector_store, duplicates_by_incident(chunked_documents), vector_store_type=vector_store_type
+    )
+    if not new_documents and not stale_ids and not updated:
+        logger.info("Vector store is already up to date.")
+        return True
+
+    if vector_store_type == "faiss":
+        logger.info(f"Saving FAISS index to '{persist_dir}'...")
+        save_faiss_store(vector_store, persist_dir)
+        logger.info("FAISS index saved successfully.")
+    elif vector_store_type == "in_memory":
+        vector_store.save(persist_dir)
+    return True
+
+def main(vector_store_type, persist_dir, servicenow_path, incremental=False, markdown_loader=MARKDOWN_LOADER,
+         chunker=CHUNKER, workers=None, dedup_threshold=None,
+         use_embedding_cache=True, embed_workers=None, embed_threads=None, embed_batch_size=EMBED_BATCH_SIZE,
+         shard_index=None, num_shards=None, index_spec=FAISS_INDEX_SPEC, train_size=FAISS_TRAIN_SIZE,
+         upload_batch_size=QDRANT_UPLOAD_BATCH_SIZE, upload_parallel=QDRANT_UPLOAD_PARALLEL):
     """
     Main function to create the vector store.
+    With num_shards, only the chunks of the given shard are embedded into a
+    partial FAISS index under persist_dir/shards, to be combined afterwards
+    with scripts/rag/merge_faiss_shards.py. FAISS indexes are built flat and
+    then converted to index_spec; shards stay flat until they are merged.
+    Qdrant uploads go out in batches of upload_batch_size, upload_parallel
+    at a time, and resume from their checkpoint if interrupted.
     """
     logger.info("Starting the vector store creation process...")
-    
+
     # Load and chunk documents
-    documents = load_documents(servicenow_path)
-    chunked_documents = chunk_documents(documents)
-    
+    documents = load_documents(
+        servicenow_path,
+        markdown_loader=markdown_loader,
+        deduplicate=dedup_threshold is not None,
+        dedup_threshold=dedup_threshold,
+    )
+    chunked_documents = chunk_documents(documents, chunker=chunker, workers=workers)
+    chunked_documents, chunk_ids = assign_chunk_ids(chunked_documents)
+
+    if num_shards:
+        chunked_documents, chunk_ids = select_shard(chunked_documents, chunk_ids, shard_index, num_shards)
+        persist_dir = shard_dir(persist_dir, shard_index, num_shards)
+        index_spec = FLAT_SPEC
+        manifest_path = get_manifest_path(vector_store_type, persist_dir)
+        if not incremental and os.path.exists(manifest_path):
+            # Mark the shard incomplete until it has been rebuilt, so a failed task is never merged
+            os.remove(manifest_path)
+        if not chunk_ids:
+            # The manifest marks the shard as complete for the merge step
+            save_manifest(get_manifest_path(vector_store_type, persist_dir), [], EMBEDDING_MODEL, vector_store_type)
+            logger.info(f"Shard {shard_index} is empty.")
+            return
+
     # Get embedding model
-    embeddings = get_embedding_model()
-    
+    embeddings = get_embedding_model(use_cache=use_embedding_cache)
+
+    embed_options = {"workers": embed_workers, "threads_per_worker": embed_threads, "batch_size": embed_batch_size}
+    upload_options = {"upload_batch_size": upload_batch_size, "parallel": upload_parallel}
+    manifest_path = get_manifest_path(vector_store_type, persist_dir)
+    if incremental:
+        manifest = load_manifest(manifest_path)
+        if vector_store_type == "faiss" and manifest is not None and load_index_spec(persist_dir) != index_spec:
+            logger.info(f"Index was built as '{load_index_spec(persist_dir)}', requested '{index_spec}'.")
+            manifest = None
+        if is_manifest_compatible(manifest, EMBEDDING_MODEL, vector_store_type):
+            logger.info(f"Incrementally updating '{vector_store_type}' vector store...")
+            if update_vector_store(
+                vector_store_type, persist_dir, embeddings, manifest, chunked_documents, chunk_ids,
+                embed_options, upload_options
+            ):
+                save_manifest(manifest_path, chunk_ids, EMBEDDING_MODEL, vector_store_type)
+                log_embedding_cache_stats(embeddings)
+                logger.info(f"Vector store '{vector_store_type}' updated successfully.")
+                return
+        logger.info("Falling back to a full build.")
+
     logger.info(f"Creating '{vector_store_type}' vector store...")
     if vector_store_type == "faiss":
-        # For in-memory, we pass documents during creation
-        vector_store = get_vector_store(embeddings, vector_store_type=vector_store_type, documents=chunked_documents)
+        # Embed across worker processes and stream the vectors into the index
+        vector_store = embed_into_faiss(chunked_documents, chunk_ids, embeddings, **embed_options)
+        if vector_store is None:
+            logger.warning("No documents were found to index.")
+            return
+        apply_index_spec(vector_store, index_spec, train_size)
         if persist_dir:
             logger.info(f"Saving FAISS index to '{persist_dir}'...")
-            vector_store.save_local(persist_dir)
+            save_faiss_store(vector_store, persist_dir)
+            save_index_spec(persist_dir, index_spec, train_size)
             logger.info("FAISS index saved successfully.")
+    elif vector_store_type == "in_memory":
+        vector_store = embed_into_numpy(chunked_documents, chunk_ids, embeddings, **embed_options)
+        if vector_store is None:
+            logger.warning("No documents were found to index.")
+            return
+        vector_store.save(persist_dir)
     else:
-        # For Qdrant, we create the store and then add documents
+        # For Qdrant, we create the collection and then bulk upload the documents
         vector_store = get_vector_store(embeddings, vector_store_type=vector_store_type)
-        logger.info("Adding documents to the vector store...")
-        add_documents_to_store(vector_store, chunked_documents, vector_store_type=vector_store_type)
-        
+        upload_to_qdrant(vector_store.client, chunked_documents, chunk_ids, embeddings, **embed_options, **upload_options)
+
+    if vector_store_type != "faiss" or persist_dir:
+        save_manifest(manifest_path, chunk_ids, EMBEDDING_MODEL, vector_store_type)
+
+    log_embedding_cache_stats(embeddings)
     logger.info(f"Vector store '{vector_store_type}' created and documents added successfully.")
 
 if __name__ == "__main__":
@@ -45,15 +203,16 @@ if __name__ == "__main__":
     parser.add_argument(
         "--vector-store",
         type=str,
-        choices=["qdrant", "faiss"],
+        choices=["qdrant", "faiss", "in_memory"],
         default="faiss",
-        help="The vector store to create."
+        help="The vector store to create. 'in_memory' is an exact NumPy matrix for small corpora."
     )
     parser.add_argument(
         "--persist-dir",
         type=str,
-        default="vector_index/faiss_amarel",
-        help="The directory to save the FAISS index to."
+        default=None,
+        help="The directory to save the FAISS index or NumPy store to. "
+             f"Defaults to vector_index/faiss_amarel, or {NUMPY_STORE_PATH} for 'in_memory'."
     )
     parser.add_argument(
         "--servicenow-path",
@@ -61,5 +220,134 @@ if __name__ == "__main__":
         default=None,
         help="Path to the ServiceNow data file."
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only embed new or changed chunks and delete stale ones, using the manifest stored with the index."
+    )
+    parser.add_argument(
+        "--markdown-loader",
+        type=str,
+        choices=["unstructured", "native"],
+        default=MARKDOWN_LOADER,
+        help="How to parse the markdown guides. 'native' reads the files directly and is much faster."
+    )
+    parser.add_argument(
+        "--chunker",
+        type=str,
+        choices=["recursive", "markdown_tokens"],
+        default=CHUNKER,
+        help="'markdown_tokens' splits along headings and sizes chunks in embedding model tokens."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes for chunking. Defaults to the number of CPUs."
+    )
+    parser.add_argument(
+        "--embed-workers",
+        type=int,
+        default=None,
+        help="Number of embedding worker processes. Defaults to EMBED_WORKERS, or one per EMBED_THREADS_PER_WORKER CPUs."
+    )
+    parser.add_argument(
+        "--embed-threads",
+        type=int,
+        default=None,
+        help="Torch threads per embedding worker. Defaults to the CPUs divided evenly between workers."
+    )
+    parser.add_argument(
+        "--embed-batch-size",
+        type=int,
+        default=EMBED_BATCH_SIZE,
+        help="Number of chunks of similar token length embedded together."
+    )
+    parser.add_argument(
+        "--index-spec",
+        type=str,
+        default=FAISS_INDEX_SPEC,
+        help="FAISS index_factory spec, e.g. 'Flat' (exact), 'HNSW32', 'IVF4096,Flat' or 'IVF4096,PQ48'."
+    )
+    parser.add_argument(
+        "--train-size",
+        type=int,
+        default=FAISS_TRAIN_SIZE,
+        help="Number of vectors to train IVF/PQ indexes on. 0 uses 50 per IVF list."
+    )
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        default=None,
+        help="Only build one of this many shards of the FAISS index, split by chunk hash. "
+             "Defaults to the Slurm array size when --shard-index is given."
+    )
+    parser.add_argument(
+        "--shard-index",
+        type=int,
+        default=None,
+        help="Shard to build. Defaults to the Slurm array task ID when --num-shards is given."
+    )
+    parser.add_argument(
+        "--qdrant-batch-size",
+        type=int,
+        default=QDRANT_UPLOAD_BATCH_SIZE,
+        help="Number of points sent to Qdrant per upsert request."
+    )
+    parser.add_argument(
+        "--qdrant-parallel",
+        type=int,
+        default=QDRANT_UPLOAD_PARALLEL,
+        help="Number of upsert requests to Qdrant in flight at a time."
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Collapse near-duplicate ServiceNow tickets before chunking and embedding."
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEDUP_THRESHOLD,
+        help="Estimated Jaccard similarity above which tickets are treated as duplicates."
+    )
+    parser.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help="Embed every chunk with the model instead of reusing vectors from the embedding cache."
+    )
     args = parser.parse_args()
-    main(args.vector_store, args.persist_dir, args.servicenow_path)
\ No newline at end of file
+    if args.persist_dir is None:
+        args.persist_dir = NUMPY_STORE_PATH if args.vector_store == "in_memory" else "vector_index/faiss_amarel"
+
+    num_shards, shard_index = args.num_shards, args.shard_index
+    if num_shards or shard_index is not None:
+        num_shards = num_shards or slurm_num_shards()
+        shard_index = shard_index if shard_index is not None else slurm_shard_index()
+        if num_shards is None or shard_index is None:
+            parser.error("Sharded builds need --num-shards and --shard-index outside of a Slurm array job.")
+        if not 0 <= shard_index < num_shards:
+            parser.error(f"--shard-index must be between 0 and {num_shards - 1}.")
+        if args.vector_store != "faiss":
+            parser.error("Sharded builds are only supported for FAISS.")
+
+    main(
+        args.vector_store,
+        args.persist_dir,
+        args.servicenow_path,
+        incremental=args.incremental,
+        markdown_loader=args.markdown_loader,
+        chunker=args.chunker,
+        workers=args.workers,
+        dedup_threshold=args.dedup_threshold if args.dedup else None,
+        use_embedding_cache=not args.no_embedding_cache,
+        embed_workers=args.embed_workers,
+        embed_threads=args.embed_threads,
+        embed_batch_size=args.embed_batch_size,
+        shard_index=shard_index,
+        num_shards=num_shards,
+        index_spec=args.index_spec,
+        train_size=args.train_size,
+        upload_batch_size=args.qdrant_batch_size,
+        upload_parallel=args.qdrant_parallel,
+    )
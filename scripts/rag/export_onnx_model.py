@@ -0,0 +1,150 @@
+import sys
+import os
+import json
+import argparse
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.rag.config import EMBEDDING_MODEL, EMBEDDING_MODEL_ID, EMBEDDING_ONNX_DIR
+from src.rag.onnx_embeddings import (
+    EXPORT_CONFIG_FILE,
+    ONNX_MODEL_FILE,
+    ONNX_QUANTIZED_MODEL_FILE,
+    OnnxEmbeddings,
+)
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Minimum cosine similarity between ONNX and PyTorch vectors for the same text
+FP32_TOLERANCE = 0.9999
+INT8_TOLERANCE = 0.99
+
+VERIFICATION_TEXTS = [
+    "How do I request more storage for my project directory?",
+    "My job has been pending for two days with reason QOSMaxCpuPerUserLimit.",
+    "Title: Password reset\n\nI cannot log in to the cluster via ssh after changing my password.",
+    "module load cuda/12.1 fails with 'unable to locate a modulefile'",
+    "sbatch --gres=gpu:1 --partition=gpu --time=02:00:00 job.sh",
+    "Quota exceeded on /home, how can I find which directories use the most space?",
+    "Jupyter notebook through OnDemand keeps disconnecting after a few minutes.",
+    "x",
+]
+
+
+def export_model(output_dir, opset=17):
+    """
+    Exports the transformer of the sentence-transformers model to ONNX, with
+    dynamic batch and sequence axes, along with its tokenizer. Pooling and
+    normalization are done by OnnxEmbeddings, so the graph outputs token
+    embeddings.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(EMBEDDING_MODEL_ID, device="cpu")
+    tokenizer = model.tokenizer
+    transformer = model[0].auto_model.eval()
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.transformer(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            )[0]
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer.save_pretrained(output_dir)
+    sample = tokenizer(["Exporting the embedding model"], return_tensors="pt")
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    logger.info(f"Exporting {EMBEDDING_MODEL_ID} to '{model_path}'...")
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(transformer),
+            (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+            model_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["token_embeddings"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "token_type_ids": {0: "batch", 1: "sequence"},
+                "token_embeddings": {0: "batch", 1: "sequence"},
+            },
+            opset_version=opset,
+        )
+
+    export_config = {
+        "model": EMBEDDING_MODEL,
+        "model_id": EMBEDDING_MODEL_ID,
+        "max_seq_length": model.max_seq_length,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "pad_token": tokenizer.pad_token,
+    }
+    with open(os.path.join(output_dir, EXPORT_CONFIG_FILE), 'w') as f:
+        json.dump(export_config, f, indent=2)
+    return model
+
+
+def quantize_model(output_dir):
+    """
+    Writes an int8 copy of the exported model with dynamically quantized weights.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantized_path = os.path.join(output_dir, ONNX_QUANTIZED_MODEL_FILE)
+    logger.info(f"Quantizing to '{quantized_path}'...")
+    quantize_dynamic(os.path.join(output_dir, ONNX_MODEL_FILE), quantized_path, weight_type=QuantType.QInt8)
+
+
+def verify_model(model, output_dir, quantized, tolerance):
+    """
+    Compares ONNX vectors against the PyTorch model on a few sample texts.
+    Returns True if every cosine similarity is at least the tolerance.
+    """
+    reference = model.encode([text.replace("\n", " ") for text in VERIFICATION_TEXTS], normalize_embeddings=True)
+    vectors = OnnxEmbeddings(model_dir=output_dir, quantized=quantized).encode(VERIFICATION_TEXTS)
+    similarities = np.sum(reference * vectors, axis=1)
+    label = "int8" if quantized else "fp32"
+    logger.info(
+        f"{label} vs PyTorch cosine similarity: min {similarities.min():.6f}, mean {similarities.mean():.6f} "
+        f"(tolerance {tolerance})"
+    )
+    return bool(similarities.min() >= tolerance)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX for the onnxruntime backend.")
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        default=EMBEDDING_ONNX_DIR,
+        help="Directory to write the ONNX models and tokenizer to."
+    )
+    parser.add_argument(
+        "--no-quantize",
+        action="store_true",
+        help="Only export the fp32 model, without the int8 quantized copy."
+    )
+    parser.add_argument("--opset", type=int, default=17, help="ONNX opset version.")
+    args = parser.parse_args()
+
+    model = export_model(args.output_dir, opset=args.opset)
+    ok = verify_model(model, args.output_dir, quantized=False, tolerance=FP32_TOLERANCE)
+    if not args.no_quantize:
+        quantize_model(args.output_dir)
+        ok = verify_model(model, args.output_dir, quantized=True, tolerance=INT8_TOLERANCE) and ok
+
+    if not ok:
+        logger.error("ONNX vectors are outside the tolerance of the PyTorch model.")
+        sys.exit(1)
+    logger.info(f"ONNX model exported to '{args.output_dir}'.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import sys
+import os
+import argparse
+
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.rag.config import CHUNKER, DATA_PATH, DEDUP_THRESHOLD, EMBED_BATCH_SIZE, FAISS_INDEX_SPEC, FAISS_TRAIN_SIZE, MARKDOWN_LOADER
+from src.rag.ingest import run_ingest_pipeline
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Clean, prepare, chunk and embed the ServiceNow export and markdown guides into a FAISS index in one pass."
+    )
+    parser.add_argument(
+        "--input-path",
+        type=str,
+        default="docs/servicenow/task.json",
+        help="Path to the raw ServiceNow JSON export."
+    )
+    parser.add_argument(
+        "--markdown-path",
+        type=str,
+        default=DATA_PATH,
+        help="Directory containing the markdown guides."
+    )
+    parser.add_argument(
+        "--markdown-loader",
+        type=str,
+        choices=["unstructured", "native"],
+        default=MARKDOWN_LOADER,
+        help="How to parse the markdown guides. 'native' reads the files directly and is much faster."
+    )
+    parser.add_argument(
+        "--chunker",
+        type=str,
+        choices=["recursive", "markdown_tokens"],
+        default=CHUNKER,
+        help="'markdown_tokens' splits along headings and sizes chunks in embedding model tokens."
+    )
+    parser.add_argument(
+        "--persist-dir",
+        type=str,
+        default="vector_index/faiss_amarel",
+        help="The directory to save the FAISS index to."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes for cleaning. Defaults to the number of CPUs."
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="Number of records sent to a cleaning worker at a time."
+    )
+    parser.add_argument(
+        "--embed-batch-size",
+        type=int,
+        default=EMBED_BATCH_SIZE,
+        help="Number of chunks of similar token length embedded at a time."
+    )
+    parser.add_argument(
+        "--embed-workers",
+        type=int,
+        default=None,
+        help="Number of embedding worker processes. Defaults to EMBED_WORKERS, or one per EMBED_THREADS_PER_WORKER CPUs."
+    )
+    parser.add_argument(
+        "--embed-threads",
+        type=int,
+        default=None,
+        help="Torch threads per embedding worker. Defaults to the CPUs divided evenly between workers."
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=8,
+        help="Maximum number of batches buffered between stages."
+    )
+    parser.add_argument(
+        "--cleaned-output",
+        type=str,
+        default=None,
+        help="Optionally write the cleaned records to this JSONL file."
+    )
+    parser.add_argument(
+        "--prepared-output",
+        type=str,
+        default=None,
+        help="Optionally write the prepared records to this JSONL file."
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only embed new or changed chunks and delete stale ones, using the manifest stored with the index."
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Skip ServiceNow tickets that are near-duplicates of an earlier ticket."
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=DEDUP_THRESHOLD,
+        help="Estimated Jaccard similarity above which tickets are treated as duplicates."
+    )
+    parser.add_argument(
+        "--index-spec",
+        type=str,
+        default=FAISS_INDEX_SPEC,
+        help="FAISS index_factory spec, e.g. 'Flat' (exact), 'HNSW32', 'IVF4096,Flat' or 'IVF4096,PQ48'."
+    )
+    parser.add_argument(
+        "--train-size",
+        type=int,
+        default=FAISS_TRAIN_SIZE,
+        help="Number of vectors to train IVF/PQ indexes on. 0 uses 50 per IVF list."
+    )
+    parser.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help="Embed every chunk with the model instead of reusing vectors from the embedding cache."
+    )
+    args = parser.parse_args()
+    run_ingest_pipeline(
+        args.input_path,
+        args.persist_dir,
+        markdown_path=args.markdown_path,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        embed_batch_size=args.embed_batch_size,
+        queue_size=args.queue_size,
+        embed_workers=args.embed_workers,
+        embed_threads=args.embed_threads,
+        cleaned_output=args.cleaned_output,
+        prepared_output=args.prepared_output,
+        incremental=args.incremental,
+        markdown_loader=args.markdown_loader,
+        chunker=args.chunker,
+        dedup_threshold=args.dedup_threshold if args.dedup else None,
+        use_embedding_cache=not args.no_embedding_cache,
+        index_spec=args.index_spec,
+        train_size=args.train_size,
+    )
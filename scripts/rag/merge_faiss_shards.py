@@ -0,0 +1,54 @@
+import sys
+import os
+import argparse
+
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.rag.config import FAISS_INDEX_SPEC, FAISS_TRAIN_SIZE
+from src.rag.sharding import merge_shards
+from src.rag.vector_store import get_embedding_model
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Merge the partial FAISS indexes of a sharded create_vector_store.py build into one index."
+    )
+    parser.add_argument(
+        "--persist-dir",
+        type=str,
+        default="vector_index/faiss_amarel",
+        help="The directory the shards were built under and the merged index is saved to."
+    )
+    parser.add_argument(
+        "--num-shards",
+        type=int,
+        required=True,
+        help="Number of shards the build was split into."
+    )
+    parser.add_argument(
+        "--index-spec",
+        type=str,
+        default=FAISS_INDEX_SPEC,
+        help="FAISS index_factory spec for the merged index, e.g. 'Flat', 'HNSW32' or 'IVF4096,PQ48'."
+    )
+    parser.add_argument(
+        "--train-size",
+        type=int,
+        default=FAISS_TRAIN_SIZE,
+        help="Number of vectors to train IVF/PQ indexes on. 0 uses 50 per IVF list."
+    )
+    args = parser.parse_args()
+
+    # Merging never embeds anything, so with the embedding cache enabled the model is not loaded
+    embeddings = get_embedding_model(use_cache=True)
+    try:
+        vector_store = merge_shards(
+            args.persist_dir, args.num_shards, embeddings, index_spec=args.index_spec, train_size=args.train_size
+        )
+    except (RuntimeError, ValueError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+    logger.info(f"Merged {args.num_shards} shards into '{args.persist_dir}' ({vector_store.index.ntotal} vectors).")
@@ -1,9 +1,15 @@
 import json
 import os
+import sys
 import logging
 import argparse
 from datetime import datetime
 
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.rag.servicenow import prepare_record
+
 # --- Logging Setup ---
 LOG_DIR = 'logs'
 if not os.path.exists(LOG_DIR):
@@ -20,15 +26,24 @@ logging.basicConfig(
     ]
 )
 
+def load_records(input_path):
+    """
+    Loads cleaned records from either the JSON file written by clean_data.py
+    or the JSONL file written by its --stream mode.
+    """
+    with open(input_path, 'r') as f:
+        if input_path.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data.get('records', [])
+
 def prepare_for_embedding(input_path, output_path):
     """
     Reads cleaned ServiceNow data, combines relevant text fields for embedding,
     and saves the result to a JSONL file.
     """
     try:
-        with open(input_path, 'r') as f:
-            data = json.load(f)
-        records = data.get('records', [])
+        records = load_records(input_path)
     except FileNotFoundError:
         logging.error(f"Error: Input file not found at {input_path}")
         return
@@ -40,24 +55,7 @@ def prepare_for_embedding(input_path, output_path):
         logging.warning(f"No records found in {input_path}. No output file will be generated.")
         return
 
-    prepared_data = []
-    for record in records:
-        short_desc = record.get('short_description', '')
-        desc = record.get('description', '')
-
-        # Combine the text fields
-        # Using a clear separator can sometimes help the model distinguish between title and body
-        combined_text = f"Title: {short_desc}\n\n{desc}"
-
-        # Store the original incident number as metadata
-        metadata = {
-            'incident_number': record.get('number', record.get('sys_id', 'N/A'))
-        }
-
-        prepared_data.append({
-            'text': combined_text.strip(),
-            'metadata': metadata
-        })
+    prepared_data = [prepare_record(record) for record in records]
 
     # Write to a JSONL file
     try:
@@ -78,7 +76,7 @@ def main():
         "--input-path",
         type=str,
         required=True,
-        help="Path to the cleaned JSON file."
+        help="Path to the cleaned JSON or JSONL file."
     )
     parser.add_argument(
         "--output-path",
@@ -1,8 +1,10 @@
 #!/bin/bash
 #
 # This script orchestrates the execution of the RAG data pipeline.
-# It runs a sequence of Python scripts to clean, prepare, and
-# create a vector store from the raw ServiceNow data.
+# By default it runs the fused ingest pipeline, which cleans, prepares,
+# chunks and embeds the raw ServiceNow data in a single process.
+# Set PIPELINE_MODE=staged to run the individual scripts one after
+# another with intermediate files instead.
 
 # Exit immediately if a command exits with a non-zero status.
 set -e
@@ -16,21 +18,70 @@ INPUT_FILE="docs/servicenow/task.json"
 OUTPUT_DIR="docs/servicenow/"
 
 # Intermediate and final file paths.
-CLEANED_FILE="${OUTPUT_DIR}task_cleaned.json"
+CLEANED_FILE="${OUTPUT_DIR}task_cleaned.jsonl"
 PREPARED_FILE="${OUTPUT_DIR}task_prepared.jsonl"
 
+# Number of worker processes used for cleaning (defaults to the Slurm allocation).
+CLEAN_WORKERS="${SLURM_CPUS_PER_TASK:-$(nproc)}"
+
 # Directory to save the FAISS vector store.
 VECTOR_STORE_DIR="vector_index/faiss_amarel"
 
+# Set INCREMENTAL=1 to only embed new or changed chunks, using the
+# manifest stored next to the existing index.
+INCREMENTAL="${INCREMENTAL:-0}"
+INCREMENTAL_FLAG=""
+if [ "$INCREMENTAL" = "1" ]; then
+    INCREMENTAL_FLAG="--incremental"
+fi
+
+# Set DEDUP=1 to collapse near-duplicate tickets before embedding.
+DEDUP="${DEDUP:-0}"
+DEDUP_FLAG=""
+if [ "$DEDUP" = "1" ]; then
+    DEDUP_FLAG="--dedup"
+fi
+
+# "fused" (default) or "staged".
+PIPELINE_MODE="${PIPELINE_MODE:-fused}"
+
+# Set WRITE_INTERMEDIATE=1 to keep the cleaned and prepared JSONL files in fused mode.
+WRITE_INTERMEDIATE="${WRITE_INTERMEDIATE:-0}"
+
 
 # --- Pipeline Execution ---
 
+if [ "$PIPELINE_MODE" = "fused" ]; then
+    INTERMEDIATE_FLAGS=""
+    if [ "$WRITE_INTERMEDIATE" = "1" ]; then
+        INTERMEDIATE_FLAGS="--cleaned-output $CLEANED_FILE --prepared-output $PREPARED_FILE"
+    fi
+
+    echo "--- Running fused ingest pipeline ---"
+    python3 scripts/rag/ingest_pipeline.py \
+        --input-path "$INPUT_FILE" \
+        --persist-dir "$VECTOR_STORE_DIR" \
+        --workers "$CLEAN_WORKERS" \
+        $INTERMEDIATE_FLAGS \
+        $INCREMENTAL_FLAG \
+        $DEDUP_FLAG
+    echo "--- Ingest pipeline complete ---"
+    echo
+
+    echo "RAG data pipeline executed successfully!"
+    echo "Vector store created at: $VECTOR_STORE_DIR"
+    exit 0
+fi
+
 # Step 1: Clean the raw data
 # This script anonymizes PII, removes redundant text, and normalizes whitespace.
+# Records are streamed through a process pool and written as JSONL.
 echo "--- Step 1: Cleaning data ---"
 python3 scripts/rag/clean_data.py \
     --input-path "$INPUT_FILE" \
-    --output-path "$CLEANED_FILE"
+    --output-path "$CLEANED_FILE" \
+    --stream \
+    --workers "$CLEAN_WORKERS"
 echo "--- Cleaning complete ---"
 echo
 
@@ -51,7 +102,9 @@ echo "--- Step 3: Creating vector store ---"
 python3 scripts/rag/create_vector_store.py \
     --vector-store faiss \
     --persist-dir "$VECTOR_STORE_DIR" \
-    --servicenow-path "$PREPARED_FILE"
+    --servicenow-path "$PREPARED_FILE" \
+    $INCREMENTAL_FLAG \
+    $DEDUP_FLAG
 echo "--- Vector store creation complete ---"
 echo
 
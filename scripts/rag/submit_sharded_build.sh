@@ -0,0 +1,22 @@
+#!/bin/bash
+
+# Submits a sharded FAISS build as a Slurm array job, followed by a merge job
+# that only runs once every shard has succeeded.
+# The prepared ServiceNow data (steps 1-2 of run_pipeline.sh) must already exist.
+#
+# USAGE: scripts/rag/submit_sharded_build.sh [NUM_SHARDS]
+
+set -euo pipefail
+
+NUM_SHARDS="${1:-8}"
+mkdir -p logs
+
+BUILD_JOB_ID=$(sbatch --parsable --array=0-$((NUM_SHARDS - 1)) --export=ALL,NUM_SHARDS="$NUM_SHARDS" \
+    scripts/rag/run_sharded_build.sbatch)
+echo "Submitted shard build array job $BUILD_JOB_ID with $NUM_SHARDS tasks."
+
+MERGE_JOB_ID=$(sbatch --parsable --dependency=afterok:"$BUILD_JOB_ID" --export=ALL,NUM_SHARDS="$NUM_SHARDS" \
+    scripts/rag/merge_faiss_shards.sbatch)
+echo "Submitted merge job $MERGE_JOB_ID, waiting on $BUILD_JOB_ID."
+echo "If a shard fails, rerun it with: sbatch --array=<task id> --export=ALL,NUM_SHARDS=$NUM_SHARDS scripts/rag/run_sharded_build.sbatch"
+echo "and then: sbatch --export=ALL,NUM_SHARDS=$NUM_SHARDS scripts/rag/merge_faiss_shards.sbatch"
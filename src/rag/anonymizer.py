@@ -0,0 +1,108 @@
+import json
+import os
+import re
+from src.rag.config import PII_RULES_PATH
+
+
+def build_trie_pattern(words):
+    """
+    Compiles a list of literal words into a trie-shaped regex alternation.
+    Shared prefixes are only tested once, so the regex engine walks the list
+    like a multi-pattern automaton instead of trying each word in turn.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def to_regex(node):
+        optional = '' in node
+        children = [(char, child) for char, child in sorted(node.items()) if char]
+        if not children:
+            return ''
+        leaves = [char for char, child in children if child == {'': True}]
+        if len(leaves) == len(children) and len(leaves) > 1:
+            body, atomic = '[' + ''.join(re.escape(char) for char in leaves) + ']', True
+        else:
+            branches = [re.escape(char) + to_regex(child) for char, child in children]
+            if len(branches) > 1:
+                body, atomic = '(?:' + '|'.join(branches) + ')', True
+            else:
+                body, atomic = branches[0], len(leaves) == 1
+        if optional:
+            body = body + '?' if atomic else '(?:' + body + ')?'
+        return body
+
+    return to_regex(trie)
+
+
+class PIIRuleEngine:
+    """
+    Replaces PII in text using a list of rules fused into one compiled regex.
+    The text is scanned once; at each position the first rule that matches wins.
+    """
+
+    def __init__(self, rules):
+        if not rules:
+            raise ValueError("At least one PII rule is required.")
+        self.rule_names = []
+        self._replacements = {}
+        alternatives = []
+        for i, rule in enumerate(rules):
+            group = f"r{i}"
+            pattern = rule["pattern"]
+            if rule.get("ignore_case"):
+                pattern = f"(?i:{pattern})"
+            alternatives.append(f"(?P<{group}>{pattern})")
+            self._replacements[group] = rule["replacement"]
+            self.rule_names.append(rule.get("name", group))
+        self.pattern = re.compile('|'.join(alternatives))
+
+    @classmethod
+    def from_config(cls, config_path=PII_RULES_PATH):
+        """
+        Builds an engine from a JSON rules file (see pii_rules.json).
+        """
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(config_path))
+
+        rules = []
+        for rule in config.get("rules", []):
+            if "pattern" not in rule:
+                words = list(rule.get("words", []))
+                for word_file in rule.get("word_files", []):
+                    with open(os.path.join(base_dir, word_file), 'r') as f:
+                        words.extend(line.strip() for line in f if line.strip())
+                if not words:
+                    continue
+                rule = dict(rule, pattern=r'\b' + build_trie_pattern(set(words)) + r'\b')
+            rules.append(rule)
+        return cls(rules)
+
+    def _replace(self, match):
+        return self._replacements[match.lastgroup]
+
+    def anonymize(self, text):
+        """
+        Anonymizes PII in a given text string. Non-string values are returned unchanged.
+        """
+        if not isinstance(text, str):
+            return text
+        return self.pattern.sub(self._replace, text)
+
+
+_default_engine = None
+
+
+def get_default_engine():
+    """
+    Returns the engine for PII_RULES_PATH, compiling it on first use.
+    Each worker process compiles its own copy.
+    """
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = PIIRuleEngine.from_config()
+    return _default_engine
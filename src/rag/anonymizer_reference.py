@@ -0,0 +1,61 @@
+import re
+from src.rag.servicenow import ANONYMIZED_FIELDS as RECORD_FIELDS
+
+# Reference data for the PII rule engine, shared by tests/test_anonymizer.py and
+# scripts/benchmarks/benchmark_anonymizer.py
+
+# Fields anonymized by anonymize_record; the description is anonymized before it is cleaned
+ANONYMIZED_FIELDS = RECORD_FIELDS + ['description']
+
+SAMPLE_TICKETS = [
+    {
+        "short_description": "Account request for Jane Doe",
+        "description": "Hi, my NetID is jd1234 and my advisor Robert Smith (robert.smith@rutgers.edu) approved it. "
+                       "Please add me to /projects/f_rs123_1 on amarel.rutgers.edu.",
+        "sys_created_by": "jd1234",
+        "sys_updated_by": "pgarias",
+        "watch_list": "thackray, yw969, so398@scarletmail.rutgers.edu",
+    },
+    {
+        "short_description": "Job pending QOSMaxCpuPerUserLimit",
+        "description": "My job 1234567 on partition main has been pending for 2 days. "
+                       "See https://sites.google.com/view/cluster-user-guide/amarel/job-scheduling Thanks Mary Ann",
+        "sys_created_by": "ma987",
+        "sys_updated_by": "rm1238",
+        "watch_list": "",
+    },
+    {
+        "short_description": "Password reset",
+        "description": "Dear Help Desk, I cannot log in to amarel.rutgers.edu via ssh ab123@amarel.rutgers.edu. "
+                       "Sent from John Smith.Jones@gmail.com on behalf of Carl",
+        "sys_created_by": "guest",
+        "sys_updated_by": "thackray",
+        "watch_list": "pgarias",
+    },
+    {
+        "short_description": "Smartsheet form submission",
+        "description": "A new row was added. Read more at https://app.smartsheet.com/Form View Details "
+                       "You are receiving this email because you are subscribed. Powered by Smartsheet Inc.",
+        "sys_created_by": "system",
+        "sys_updated_by": "system",
+        "watch_list": None,
+    },
+]
+
+
+def legacy_anonymize_text(text):
+    """
+    The original sequential regex chain from clean_data.py. The rule engine must
+    produce the same output, and the benchmark times it as the baseline.
+    """
+    if not isinstance(text, str):
+        return text
+    text = re.sub(r'[\w\.-]+@[\w\.-]+', '[EMAIL]', text)
+    text = re.sub(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+\b', '[NAME]', text)
+    text = re.sub(r'\b[a-z]{2,3}\d{3,4}\b', '[USER]', text)
+    text = re.sub(r'\bpgarias\b', '[USER]', text)
+    text = re.sub(r'\bthackray\b', '[USER]', text)
+    text = re.sub(r'\/projects\/f_[a-z0-9]+_\d', '/projects/[USER_PROJECT]', text)
+    text = re.sub(r'amarel\.rutgers\.edu', '[CLUSTER_HOSTNAME]', text)
+    text = re.sub(r'https?:\/\/\S+', '[URL]', text)
+    return text
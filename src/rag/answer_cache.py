@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from src.rag.config import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_PATH, ANSWER_CACHE_THRESHOLD
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def context_ids(documents):
+    """
+    Returns the set of IDs of retrieved chunks. Chunks without an ID (for
+    example from older stores) are identified by a hash of their text.
+    """
+    return frozenset(
+        document.id
+        or document.metadata.get("_id")
+        or hashlib.sha256(document.page_content.encode("utf-8")).hexdigest()
+        for document in documents
+    )
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+class SemanticAnswerCache:
+    """
+    Persistent cache of generated answers keyed on the question embedding.
+    A question reuses a stored answer if its cosine similarity to the stored
+    question is at least threshold and the same chunks were retrieved for
+    it, so paraphrases skip the LLM but answers never outlive their context.
+    Entries are kept in SQLite and mirrored in memory for the similarity
+    search. Entries from another index_version are dropped on startup, and
+    the least recently used ones once there are more than max_entries.
+    """
+
+    def __init__(self, embeddings, index_version, cache_path=ANSWER_CACHE_PATH,
+                 max_entries=ANSWER_CACHE_MAX_ENTRIES, threshold=ANSWER_CACHE_THRESHOLD):
+        self.embeddings = embeddings
+        self.index_version = index_version or ""
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.context_mismatches = 0
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, index_version TEXT NOT NULL, question TEXT NOT NULL, vector BLOB NOT NULL, "
+            "context_ids TEXT NOT NULL, answer TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        stale = self._conn.execute("DELETE FROM answers WHERE index_version != ?", (self.index_version,)).rowcount
+        self._conn.commit()
+        if stale:
+            logger.info(f"Dropped {stale} cached answers from a previous index version.")
+
+        rows = self._conn.execute(
+            "SELECT id, vector, context_ids, answer, last_used FROM answers ORDER BY last_used"
+        ).fetchall()
+        self._ids = [row[0] for row in rows]
+        self._vectors = [np.frombuffer(row[1], dtype=np.float32) for row in rows]
+        self._contexts = [frozenset(json.loads(row[2])) for row in rows]
+        self._answers = [row[3] for row in rows]
+        self._last_used = [row[4] for row in rows]
+        self._matrix = None
+        self._evict()
+        self._conn.commit()
+        logger.info(f"Answer cache at '{cache_path}' holds {len(self._ids)} answers.")
+
+    def _embed(self, question):
+        return _normalize(self.embeddings.embed_query(question))
+
+    def lookup(self, question, contexts):
+        """
+        Returns the cached answer for a question and the set of retrieved
+        chunk IDs, or None.
+        """
+        vector = self._embed(question)
+        with self._lock:
+            if self._ids:
+                if self._matrix is None:
+                    self._matrix = np.stack(self._vectors)
+                similarities = self._matrix @ vector
+                for i in np.argsort(-similarities):
+                    if similarities[i] < self.threshold:
+                        break
+                    if self._contexts[i] == contexts:
+                        self.hits += 1
+                        self._last_used[i] = time.time()
+                        self._conn.execute(
+                            "UPDATE answers SET last_used = ? WHERE id = ?", (self._last_used[i], self._ids[i])
+                        )
+                        self._conn.commit()
+                        return self._answers[i]
+                    self.context_mismatches += 1
+            self.misses += 1
+            return None
+
+    def store(self, question, contexts, answer):
+        """
+        Stores a generated answer, evicting the least recently used answers
+        beyond max_entries.
+        """
+        vector = self._embed(question)
+        with self._lock:
+            now = time.time()
+            cursor = self._conn.execute(
+                "INSERT INTO answers (index_version, question, vector, context_ids, answer, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.index_version, question, vector.tobytes(), json.dumps(sorted(contexts)), answer, now),
+            )
+            self._ids.append(cursor.lastrowid)
+            self._vectors.append(vector)
+            self._contexts.append(contexts)
+            self._answers.append(answer)
+            self._last_used.append(now)
+            self._matrix = None
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if len(self._ids) <= self.max_entries:
+            return
+        keep = sorted(range(len(self._ids)), key=self._last_used.__getitem__)[len(self._ids) - self.max_entries:]
+        evicted = set(range(len(self._ids))) - set(keep)
+        self._conn.executemany("DELETE FROM answers WHERE id = ?", [(self._ids[i],) for i in evicted])
+        keep.sort()
+        self._ids = [self._ids[i] for i in keep]
+        self._vectors = [self._vectors[i] for i in keep]
+        self._contexts = [self._contexts[i] for i in keep]
+        self._answers = [self._answers[i] for i in keep]
+        self._last_used = [self._last_used[i] for i in keep]
+        self._matrix = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "context_mismatches": self.context_mismatches,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self._ids),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Answer cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), "
+            f"{stats['context_mismatches']} similar questions with different context, "
+            f"{stats['size']}/{stats['max_entries']} entries."
+        )
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,238 @@
+import asyncio
+import threading
+import anyio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse, StreamingResponse
+from starlette.routing import Route
+from src.rag.config import SERVE_MAX_ACTIVE, SERVE_MAX_QUEUE, SERVE_QUEUE_TIMEOUT
+from src.rag.logger import get_logger
+from src.rag.streaming import SSE_HEADERS, StreamingStats, sse_event, timed_stream
+
+logger = get_logger(__name__)
+
+# How often a non-streaming request checks whether its client has gone
+DISCONNECT_POLL_SECONDS = 0.5
+# Seconds rejected clients are told to wait before retrying
+RETRY_AFTER_SECONDS = 5
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is not admitted, with the HTTP status to answer
+    with: 429 if the queue is full, 503 if it waited too long for a slot.
+    """
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class AdmissionController:
+    """
+    Lets at most max_active requests run the chain at once and up to
+    max_queue more wait for a slot. Requests beyond that are rejected
+    straight away, and queued ones give up after queue_timeout seconds, so
+    an overloaded server answers quickly instead of piling up work.
+    """
+
+    def __init__(self, max_active=SERVE_MAX_ACTIVE, max_queue=SERVE_MAX_QUEUE, queue_timeout=SERVE_QUEUE_TIMEOUT):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._slots = asyncio.Semaphore(max_active)
+
+    async def acquire(self):
+        if self.active >= self.max_active and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(429, "Too many questions are waiting. Please try again shortly.")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise AdmissionRejected(503, "The server is busy. Please try again shortly.")
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+
+    def release(self):
+        self.active -= 1
+        self._slots.release()
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+        }
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+async def iterate_in_thread(chunks, executor):
+    """
+    Runs a blocking generator, such as chain.stream(question), on executor
+    and yields its items without blocking the event loop. If the consumer
+    stops early, for example because the client disconnected, the generator
+    is closed after the item it is producing, and this waits until it is, so
+    the request does not give up its slot while its thread still uses the LLM.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, _Failure(e))
+        finally:
+            chunks.close()
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    future = loop.run_in_executor(executor, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        # Starlette cancels through anyio, which would cancel this await too
+        # unless it is shielded, and asyncio.shield alone does not stop that
+        with anyio.CancelScope(shield=True):
+            await asyncio.shield(future)
+
+
+class _SlotStreamingResponse(StreamingResponse):
+    """
+    Streaming response that calls release once it is over, also if it failed
+    before its body iterator started, which then never runs its own cleanup.
+    """
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+
+def create_app(chain, html, stats=None, admission=None, workers=SERVE_MAX_ACTIVE):
+    """
+    Creates the ASGI app serving chain with the same routes as the Flask
+    server: the chat page at /, /chat, /chat/stream, /health and /stats.
+    The chain runs on a pool of workers threads, and admission limits how
+    many requests run and wait. stats returns extra counters for /stats.
+    """
+    admission = admission or AdmissionController(max_active=workers)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chain")
+    streaming_stats = StreamingStats()
+
+    def rejected(error):
+        return JSONResponse({"error": str(error)}, status_code=error.status_code,
+                            headers={"Retry-After": str(RETRY_AFTER_SECONDS)})
+
+    async def home(request):
+        return HTMLResponse(html)
+
+    async def chat(request):
+        user_message = (await request.json())["message"]
+        try:
+            await admission.acquire()
+        except AdmissionRejected as e:
+            return rejected(e)
+
+        async def answer():
+            return "".join([chunk async for chunk in iterate_in_thread(chain.stream(user_message), executor)])
+
+        try:
+            task = asyncio.ensure_future(answer())
+            while True:
+                finished, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+                if finished:
+                    return JSONResponse({"response": task.result().strip()})
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, cancelling its answer.")
+                    task.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await task
+                    return JSONResponse({"error": "Client disconnected."}, status_code=499)
+        finally:
+            admission.release()
+
+    async def chat_stream(request):
+        user_message = (await request.json())["message"]
+        try:
+            await admission.acquire()
+        except AdmissionRejected as e:
+            return rejected(e)
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                admission.release()
+
+        async def events():
+            # Starlette cancels this when the client disconnects, and every way
+            # out of it gives the slot back
+            try:
+                chunks = timed_stream(chain.stream(user_message), streaming_stats)
+                async for chunk in iterate_in_thread(chunks, executor):
+                    yield sse_event({"token": chunk})
+            except asyncio.CancelledError:
+                logger.info("Client disconnected, cancelled its answer.")
+                raise
+            except Exception as e:
+                logger.error(f"Streaming the answer failed: {e}")
+                yield sse_event({"error": "An error occurred while generating the answer."})
+            finally:
+                release()
+            yield sse_event({}, event="done")
+
+        return _SlotStreamingResponse(events(), release, media_type="text/event-stream", headers=SSE_HEADERS)
+
+    async def health(request):
+        return JSONResponse({"status": "ok"})
+
+    async def stats_route(request):
+        return JSONResponse({
+            **(stats() if stats is not None else {}),
+            "streaming": streaming_stats.stats(),
+            "admission": admission.stats(),
+        })
+
+    return Starlette(routes=[
+        Route("/", home),
+        Route("/chat", chat, methods=["POST"]),
+        Route("/chat/stream", chat_stream, methods=["POST"]),
+        Route("/health", health),
+        Route("/stats", stats_route),
+    ])
@@ -0,0 +1,159 @@
+import json
+import os
+import re
+import shutil
+from collections import Counter, defaultdict
+import numpy as np
+from src.rag.config import BM25_B, BM25_K1
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+BM25_DIRNAME = "bm25"
+BM25_FORMAT_FILE = "format.json"
+BM25_FORMAT_VERSION = 1
+# Longer tokens are truncated so terms fit a fixed-width array
+MAX_TERM_LENGTH = 64
+
+# Words joined by ".", "_", "-", "/" or ":" stay one token, so error strings,
+# module names (gcc/11.2.0), partition names and ticket numbers match exactly
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-/:][a-z0-9]+)*")
+_PART_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """
+    Lowercases text and splits it into terms. Compound tokens are also split
+    into their parts, so "gcc/11.2.0" matches queries for "gcc" as well.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        terms.append(token[:MAX_TERM_LENGTH])
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            terms.extend(part[:MAX_TERM_LENGTH] for part in parts)
+    return terms
+
+
+def document_terms(document):
+    """
+    Returns the terms a chunk is indexed under: its text and its string
+    metadata, such as the incident number, headings and source file.
+    """
+    fields = [document.page_content]
+    fields.extend(value for value in document.metadata.values() if isinstance(value, str))
+    return tokenize(" ".join(fields))
+
+
+def write_bm25_index(vector_store, persist_dir):
+    """
+    Builds a BM25 inverted index over the chunks of a FAISS store and writes
+    it to persist_dir/bm25. Documents are numbered by their position in the
+    FAISS index. Postings are stored as flat arrays: the sorted terms, an
+    offset per term, and the document positions and term frequencies of all
+    postings back to back.
+    """
+    count = vector_store.index.ntotal
+    postings = defaultdict(list)
+    doc_lengths = np.zeros(count, dtype=np.int32)
+    for position in range(count):
+        document = vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+        terms = Counter(document_terms(document))
+        doc_lengths[position] = sum(terms.values())
+        for term, tf in terms.items():
+            postings[term].append((position, tf))
+
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+    docs = np.empty(offsets[-1], dtype=np.int32)
+    tfs = np.empty(offsets[-1], dtype=np.uint16)
+    for i, term in enumerate(terms):
+        term_postings = np.array(postings[term], dtype=np.int64)
+        docs[offsets[i]:offsets[i + 1]] = term_postings[:, 0]
+        tfs[offsets[i]:offsets[i + 1]] = np.minimum(term_postings[:, 1], np.iinfo(np.uint16).max)
+
+    bm25_dir = os.path.join(persist_dir, BM25_DIRNAME)
+    tmp_dir = f"{bm25_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "terms.npy"), np.array([term.encode("utf-8") for term in terms], dtype=bytes))
+    np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_dir, "docs.npy"), docs)
+    np.save(os.path.join(tmp_dir, "tfs.npy"), tfs)
+    np.save(os.path.join(tmp_dir, "doc_lengths.npy"), doc_lengths)
+    with open(os.path.join(tmp_dir, BM25_FORMAT_FILE), 'w') as f:
+        json.dump({"version": BM25_FORMAT_VERSION, "count": count}, f)
+
+    shutil.rmtree(bm25_dir, ignore_errors=True)
+    os.replace(tmp_dir, bm25_dir)
+    logger.info(f"Wrote BM25 index with {len(terms)} terms over {count} chunks to '{bm25_dir}'.")
+
+
+def has_bm25_index(persist_dir, count=None):
+    """
+    Whether persist_dir has a BM25 index of a supported version, covering
+    count chunks if given.
+    """
+    path = os.path.join(persist_dir, BM25_DIRNAME, BM25_FORMAT_FILE)
+    if not os.path.exists(path):
+        return False
+    with open(path, 'r') as f:
+        bm25_format = json.load(f)
+    if bm25_format.get("version") != BM25_FORMAT_VERSION:
+        return False
+    return count is None or bm25_format.get("count") == count
+
+
+class BM25Index:
+    """
+    Read-only BM25 index written by write_bm25_index. The arrays are memory
+    mapped, so only the postings of the query terms are read.
+    """
+
+    def __init__(self, persist_dir, k1=BM25_K1, b=BM25_B):
+        bm25_dir = os.path.join(persist_dir, BM25_DIRNAME)
+        self.terms = np.load(os.path.join(bm25_dir, "terms.npy"), mmap_mode='r')
+        self.offsets = np.load(os.path.join(bm25_dir, "offsets.npy"), mmap_mode='r')
+        self.docs = np.load(os.path.join(bm25_dir, "docs.npy"), mmap_mode='r')
+        self.tfs = np.load(os.path.join(bm25_dir, "tfs.npy"), mmap_mode='r')
+        doc_lengths = np.load(os.path.join(bm25_dir, "doc_lengths.npy"))
+        self.k1 = k1
+        self.b = b
+        # Per-document part of the BM25 denominator
+        average_length = doc_lengths.mean() if len(doc_lengths) else 0.0
+        self._length_norm = (k1 * (1 - b + b * doc_lengths / max(average_length, 1e-9))).astype(np.float32)
+
+    def __len__(self):
+        return len(self._length_norm)
+
+    def _postings(self, term):
+        key = term.encode("utf-8")
+        i = int(np.searchsorted(self.terms, key))
+        if i < len(self.terms) and self.terms[i] == key:
+            return self.docs[self.offsets[i]:self.offsets[i + 1]], self.tfs[self.offsets[i]:self.offsets[i + 1]]
+        return None
+
+    def search(self, query, k, mask=None):
+        """
+        Returns the positions and BM25 scores of the k best matching chunks,
+        best first, among the positions set in mask if given. Chunks sharing
+        no term with the query are never returned.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            postings = self._postings(term)
+            if postings is None:
+                continue
+            docs, tfs = postings
+            idf = np.log(1 + (len(self) - len(docs) + 0.5) / (len(docs) + 0.5))
+            tfs = tfs.astype(np.float32)
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[docs])
+
+        if mask is not None:
+            scores[~mask] = 0
+        matches = np.flatnonzero(scores)
+        if len(matches) > k:
+            matches = matches[np.argpartition(-scores[matches], k - 1)[:k]]
+        matches = matches[np.argsort(-scores[matches], kind="stable")]
+        return matches, scores[matches]
@@ -0,0 +1,198 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from src.rag.config import (
+    EMBED_BATCH_SIZE,
+    EMBED_THREADS_PER_WORKER,
+    EMBED_WORKERS,
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL,
+    EMBEDDING_MODEL_ID,
+)
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.servicenow import available_cpus
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+_worker_encode = None
+
+
+def resolve_embed_workers(workers=None, threads_per_worker=None):
+    """
+    Splits the available CPUs between embedding worker processes. By default
+    each worker gets about EMBED_THREADS_PER_WORKER threads, beyond which
+    intra-op parallelism for a model of this size stops paying off.
+    """
+    cpus = available_cpus()
+    if not workers:
+        workers = EMBED_WORKERS or max(1, cpus // (threads_per_worker or EMBED_THREADS_PER_WORKER))
+    if not threads_per_worker:
+        threads_per_worker = max(1, cpus // workers)
+    return workers, threads_per_worker
+
+
+def token_lengths(texts):
+    """
+    Returns the number of embedding model tokens in each text.
+    """
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_ID)
+    encoded = tokenizer(texts, add_special_tokens=True, truncation=False, verbose=False)
+    return [len(input_ids) for input_ids in encoded["input_ids"]]
+
+
+def length_bucketed_batches(texts, batch_size=EMBED_BATCH_SIZE):
+    """
+    Groups the indices of texts of similar token length into batches, so
+    little compute is spent on padding. Batches are ordered longest first,
+    which keeps the workers evenly loaded towards the end of the run.
+    """
+    lengths = token_lengths(texts)
+    order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def _init_embed_worker(backend, model_name, threads):
+    """
+    Pins the worker's thread pools and loads the model once per process.
+    """
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    global _worker_encode
+    if backend == "onnx":
+        from src.rag.onnx_embeddings import OnnxEmbeddings
+
+        model = OnnxEmbeddings(threads=threads)
+        _worker_encode = model.encode
+        return
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads)
+    model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(texts):
+        # Same preprocessing as HuggingFaceEmbeddings.embed_documents
+        texts = [text.replace("\n", " ") for text in texts]
+        return model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+
+    _worker_encode = encode
+
+
+def _embed_batch(texts):
+    return np.asarray(_worker_encode(texts), dtype=np.float32)
+
+
+def _finish(entry, cache):
+    """
+    Waits for a pending batch and adds newly embedded vectors to the cache.
+    """
+    items, texts, result = entry
+    if texts is None:
+        return items, result
+    vectors = result.result()
+    if cache is not None:
+        cache.store(texts, vectors)
+    return items, vectors
+
+
+def iter_windowed_embeddings(windows, workers=None, threads_per_worker=None, batch_size=EMBED_BATCH_SIZE,
+                             cache=None):
+    """
+    Embeds texts that arrive in windows, such as the chunks of a streaming
+    ingest, with one pool of worker processes for all of them. windows yields
+    lists of (text, item) pairs, and each window is length-bucketed on its
+    own. Yields (items, vectors) pairs in input order as batches finish.
+    Texts found in the cache are not sent to a worker, and the pool is only
+    started once a text misses it.
+    """
+    executor = None
+    max_pending = in_flight = 0
+    pending = deque()
+    try:
+        for window in windows:
+            texts = [text for text, _ in window]
+            indices = list(range(len(window)))
+            if cache is not None:
+                cached = cache.lookup(texts)
+                hits = [i for i in indices if cached[i] is not None]
+                if hits:
+                    pending.append(([window[i][1] for i in hits], None, np.stack([cached[i] for i in hits])))
+                indices = [i for i in indices if cached[i] is None]
+            if indices and executor is None:
+                workers, threads_per_worker = resolve_embed_workers(workers, threads_per_worker)
+                logger.info(f"Embedding with {workers} worker(s) x {threads_per_worker} thread(s).")
+                # Spawned workers do not inherit torch thread pools or locks from the parent
+                executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_embed_worker,
+                    initargs=(EMBEDDING_BACKEND, EMBEDDING_MODEL, threads_per_worker),
+                )
+                max_pending = workers * 2
+            batches = length_bucketed_batches([texts[i] for i in indices], batch_size) if indices else []
+            logger.debug(f"Embedding {len(indices)} of {len(window)} texts in {len(batches)} batches.")
+            for batch in batches:
+                batch_texts = [texts[indices[i]] for i in batch]
+                items = [window[indices[i]][1] for i in batch]
+                pending.append((items, batch_texts, executor.submit(_embed_batch, batch_texts)))
+                in_flight += 1
+                while in_flight >= max_pending:
+                    entry = pending.popleft()
+                    in_flight -= entry[1] is not None
+                    yield _finish(entry, cache)
+            # Cache hits ahead of the in-flight batches are ready now
+            while pending and pending[0][1] is None:
+                yield _finish(pending.popleft(), cache)
+        while pending:
+            yield _finish(pending.popleft(), cache)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def iter_bulk_embeddings(texts, workers=None, threads_per_worker=None, batch_size=EMBED_BATCH_SIZE, cache=None):
+    """
+    Embeds texts across a pool of worker processes in length-bucketed
+    batches. Yields (indices, vectors) pairs as batches finish; vectors are a
+    float32 array with one row per index. Texts found in the cache are yielded
+    first without being sent to a worker, and new vectors are added to it.
+    """
+    window = [(text, i) for i, text in enumerate(texts)]
+    yield from iter_windowed_embeddings([window], workers, threads_per_worker, batch_size, cache)
+
+
+def embed_into_faiss(documents, ids, embeddings, vector_store=None, workers=None, threads_per_worker=None,
+                     batch_size=EMBED_BATCH_SIZE):
+    """
+    Embeds documents with the bulk embedding engine and streams the vectors
+    into a FAISS store as batches finish. A new store is created unless an
+    existing one is given. Returns the store, or None if there was nothing to
+    embed.
+    """
+    start = time.perf_counter()
+    cache = embeddings if isinstance(embeddings, CachedEmbeddings) else None
+    texts = [document.page_content for document in documents]
+
+    added = 0
+    for batch, vectors in iter_bulk_embeddings(texts, workers, threads_per_worker, batch_size, cache):
+        text_embeddings = [(texts[i], vector.tolist()) for i, vector in zip(batch, vectors)]
+        metadatas = [documents[i].metadata for i in batch]
+        batch_ids = [ids[i] for i in batch]
+        if vector_store is None:
+            vector_store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=batch_ids)
+        else:
+            vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=batch_ids)
+        added += len(batch)
+
+    elapsed = time.perf_counter() - start
+    if added:
+        logger.info(f"Embedded {added} chunks in {elapsed:.1f}s ({added / elapsed:.1f} chunks/sec).")
+    return vector_store
@@ -0,0 +1,105 @@
+import re
+from langchain_core.documents import Document
+from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
+from src.rag.config import EMBEDDING_MODEL_ID, CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+
+HEADING_RE = re.compile(r'^(#{1,6})[ \t]+(.+?)[ \t#]*$')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+
+
+def split_markdown_sections(text, max_level=3):
+    """
+    Splits markdown text at headings up to max_level, outside of code fences.
+    Returns (headings, section_text) pairs, where headings maps "h1".."hN" to
+    the titles of the enclosing headings. Section text is kept verbatim.
+    """
+    sections = []
+    headings = {}
+    current_headings = {}
+    lines = []
+    in_fence = False
+
+    for line in text.splitlines(keepends=True):
+        if FENCE_RE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING_RE.match(line.rstrip('\r\n'))
+        if match and len(match.group(1)) <= max_level:
+            if ''.join(lines).strip():
+                sections.append((current_headings, ''.join(lines)))
+            level = len(match.group(1))
+            headings = {key: value for key, value in headings.items() if int(key[1:]) < level}
+            headings[f"h{level}"] = match.group(2)
+            current_headings = dict(headings)
+            lines = []
+        lines.append(line)
+
+    if ''.join(lines).strip():
+        sections.append((current_headings, ''.join(lines)))
+    return sections
+
+
+def _shared_headings(first, second):
+    """
+    Returns the enclosing headings two sections have in common, from h1 down.
+    """
+    shared = {}
+    for key in sorted(first, key=lambda key: int(key[1:])):
+        if second.get(key) != first[key]:
+            break
+        shared[key] = first[key]
+    return shared
+
+
+def merge_sections(sections, budget, count_tokens):
+    """
+    Merges consecutive (headings, section_text) pairs under the same h1 while
+    they fit in budget tokens together, so short sections do not each become
+    a chunk of their own. A merged section keeps the headings its parts share.
+    """
+    merged = []
+    for headings, text in sections:
+        tokens = count_tokens(text)
+        if merged:
+            last_headings, last_text, last_tokens = merged[-1]
+            if last_headings.get("h1") == headings.get("h1") and last_tokens + tokens <= budget:
+                merged[-1] = (_shared_headings(last_headings, headings), last_text + text, last_tokens + tokens)
+                continue
+        merged.append((headings, text, tokens))
+    return [(headings, text) for headings, text, _ in merged]
+
+
+class MarkdownTokenSplitter:
+    """
+    Splits documents along markdown headings first, merges short neighbouring
+    sections, then packs each section into chunks measured in the embedding
+    model's own tokens, so no chunk is truncated by the embedder.
+    """
+
+    def __init__(self, model_id=EMBEDDING_MODEL_ID, chunk_tokens=CHUNK_SIZE_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        from transformers import AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        # Leave room for [CLS] and [SEP]
+        self.budget = chunk_tokens - self.tokenizer.num_special_tokens_to_add()
+        self.text_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+            self.tokenizer,
+            chunk_size=self.budget,
+            chunk_overlap=overlap_tokens,
+            separators=RecursiveCharacterTextSplitter.get_separators_for_language(Language.MARKDOWN),
+        )
+
+    def split_documents(self, documents):
+        """
+        Splits the documents into heading-aware, token-budgeted chunks.
+        """
+        sections = []
+        for document in documents:
+            document_sections = merge_sections(
+                split_markdown_sections(document.page_content), self.budget, self._count_tokens
+            )
+            for headings, text in document_sections:
+                sections.append(Document(page_content=text, metadata={**document.metadata, **headings}))
+        return self.text_splitter.split_documents(sections)
+
+    def _count_tokens(self, text):
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
@@ -7,18 +7,145 @@ load_dotenv()
 DATA_PATH = "docs/google_sites_guide/"
 SERVICE_NOW_DATA_PATH = "docs/servicenow/task_prepared.jsonl"
 
+# How markdown files are parsed: "unstructured" (DirectoryLoader default) or "native" (plain-text read)
+MARKDOWN_LOADER = os.environ.get("MARKDOWN_LOADER", "unstructured")
+# Parsed markdown is cached here, keyed by path, mtime and content hash. Set to an empty string to disable.
+MARKDOWN_CACHE_DIR = os.environ.get("MARKDOWN_CACHE_DIR", ".cache/markdown")
+
+# Near-duplicate ticket collapsing: estimated Jaccard similarity of word shingles above which tickets are merged
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", 0.8))
+DEDUP_NUM_PERM = int(os.environ.get("DEDUP_NUM_PERM", 128))
+
+# PII anonymization rules used when cleaning ServiceNow data
+PII_RULES_PATH = os.environ.get("PII_RULES_PATH", os.path.join(os.path.dirname(__file__), "pii_rules.json"))
+
 # Embedding model to use
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Full Hugging Face Hub ID of the embedding model, for loading its tokenizer and config directly
+EMBEDDING_MODEL_ID = EMBEDDING_MODEL if "/" in EMBEDDING_MODEL else f"sentence-transformers/{EMBEDDING_MODEL}"
+# Embedding backend: "torch" (sentence-transformers) or "onnx" (onnxruntime, see scripts/rag/export_onnx_model.py)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.environ.get("EMBEDDING_ONNX_DIR", f"models/onnx/{EMBEDDING_MODEL}")
+# Use the int8 dynamically quantized export rather than the fp32 one
+EMBEDDING_ONNX_QUANTIZED = os.environ.get("EMBEDDING_ONNX_QUANTIZED", "1") == "1"
+# Dimension of the embedding vectors (0 = read it from the model's config files)
+EMBEDDING_DIMENSION = int(os.environ.get("EMBEDDING_DIMENSION", 0))
+
+# Persistent cache of document embeddings, keyed by model name and normalized text. Set to an empty string to disable.
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite")
+# Least recently used vectors are evicted once the cache grows beyond this size
+EMBEDDING_CACHE_MAX_BYTES = int(os.environ.get("EMBEDDING_CACHE_MAX_BYTES", 4 * 1024**3))
+
+# Bulk embedding for index builds: worker processes (0 = one per EMBED_THREADS_PER_WORKER CPUs),
+# threads per worker and texts per length-bucketed batch
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", 0))
+EMBED_THREADS_PER_WORKER = int(os.environ.get("EMBED_THREADS_PER_WORKER", 4))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", 64))
+
+# In-memory LRU cache of query embeddings used when serving. Set the size to 0 to disable; a TTL of 0 never expires entries.
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", 1024))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", 0))
+
+# Chunking: "recursive" (1000-character chunks) or "markdown_tokens" (heading-aware, sized in embedding model tokens)
+CHUNKER = os.environ.get("CHUNKER", "recursive")
+# Token budget per chunk, including the model's special tokens. all-MiniLM-L6-v2 truncates input at 256 tokens.
+CHUNK_SIZE_TOKENS = int(os.environ.get("CHUNK_SIZE_TOKENS", 256))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 16))
+
+# FAISS index type as a faiss index_factory spec: "Flat" (exact), "HNSW32", "IVF4096,Flat", "IVF4096,PQ48", ...
+FAISS_INDEX_SPEC = os.environ.get("FAISS_INDEX_SPEC", "Flat")
+# Number of vectors IVF/PQ indexes are trained on (0 = 50 per IVF list)
+FAISS_TRAIN_SIZE = int(os.environ.get("FAISS_TRAIN_SIZE", 0))
+# Search-time knobs for approximate indexes: IVF lists probed per query and HNSW candidate list size
+FAISS_NPROBE = int(os.environ.get("FAISS_NPROBE", 16))
+FAISS_EF_SEARCH = int(os.environ.get("FAISS_EF_SEARCH", 64))
+# Memory-map the FAISS index and docstore when serving instead of reading them into memory
+FAISS_MMAP = os.environ.get("FAISS_MMAP", "1") == "1"
+
+# Hybrid retrieval: a BM25 index is saved next to every FAISS index and, with HYBRID_SEARCH,
+# queried alongside it; both rankings are fused with reciprocal rank fusion
+BM25_INDEX = os.environ.get("BM25_INDEX", "1") == "1"
+BM25_K1 = float(os.environ.get("BM25_K1", 1.2))
+BM25_B = float(os.environ.get("BM25_B", 0.75))
+HYBRID_SEARCH = os.environ.get("HYBRID_SEARCH", "1") == "1"
+# Candidates taken from each of the dense and BM25 rankings before fusion
+HYBRID_FETCH_K = int(os.environ.get("HYBRID_FETCH_K", 20))
+RRF_K = int(os.environ.get("RRF_K", 60))
+# Chunks are labelled with a partition (guides or tickets, optionally tickets by year) that queries
+# can be restricted to. PARTITION_QUOTAS, e.g. "guides=3,tickets=2", searches each listed
+# partition separately and returns up to that many chunks from it
+PARTITION_BY_DATE = os.environ.get("PARTITION_BY_DATE", "0") == "1"
+PARTITION_QUOTAS = os.environ.get("PARTITION_QUOTAS", "")
+
+# In-process NumPy vector store ("in_memory"): where it is saved and the dtype of its matrix.
+# float16 halves the memory, but blocks are converted to float32 on every search, which is
+# several times slower for single queries
+NUMPY_STORE_PATH = os.environ.get("NUMPY_STORE_PATH", "vector_index/numpy")
+NUMPY_STORE_DTYPE = os.environ.get("NUMPY_STORE_DTYPE", "float32")
+
+# Cross-encoder reranking: RERANK_CANDIDATES retrieved chunks are scored against the question and
+# only the best k are kept. Scoring stops after RERANK_TIME_BUDGET_MS and the candidates not
+# scored by then keep their retrieval order. Batches of up to RERANK_BATCH_SIZE are sized from the
+# measured time per candidate to fit the remaining budget; only the very first batch after startup,
+# before anything has been timed, can overrun it by up to one batch's latency
+RERANK = os.environ.get("RERANK", "0") == "1"
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", 50))
+RERANK_TIME_BUDGET_MS = float(os.environ.get("RERANK_TIME_BUDGET_MS", 250))
+RERANK_BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", 16))
+
+# Web server of chat_hpc.py: "flask" or "asgi". The ASGI server answers SERVE_MAX_ACTIVE requests at
+# once and lets SERVE_MAX_QUEUE more wait; beyond that it answers 429, and after waiting
+# SERVE_QUEUE_TIMEOUT seconds 503
+CHAT_SERVER = os.environ.get("CHAT_SERVER", "flask")
+SERVE_MAX_ACTIVE = int(os.environ.get("SERVE_MAX_ACTIVE", 4))
+SERVE_MAX_QUEUE = int(os.environ.get("SERVE_MAX_QUEUE", 16))
+SERVE_QUEUE_TIMEOUT = float(os.environ.get("SERVE_QUEUE_TIMEOUT", 30))
+
+# Context packing: retrieved chunks are deduplicated and packed into at most this many tokens of
+# the LLM's tokenizer. 0 uses what the context window leaves after the prompt, the question and
+# the tokens reserved for the answer
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 0))
+# A warning is logged when a long question leaves less than this many tokens of context. The
+# best chunk is truncated to whatever room is left; questions that leave none are turned away
+CONTEXT_MIN_TOKENS = int(os.environ.get("CONTEXT_MIN_TOKENS", 128))
+# Tokens reserved for, and the maximum length of, the generated answer
+LLM_MAX_NEW_TOKENS = int(os.environ.get("LLM_MAX_NEW_TOKENS", 512))
+
+# Semantic answer cache: a stored answer is reused for a question whose embedding has at least
+# this cosine similarity to a cached question, if the same chunks were retrieved for it
+ANSWER_CACHE = os.environ.get("ANSWER_CACHE", "0") == "1"
+ANSWER_CACHE_PATH = os.environ.get("ANSWER_CACHE_PATH", ".cache/answers.sqlite")
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 2000))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.95))
 
 # Qdrant configuration
 QDRANT_HOST = os.environ.get("QDRANT_HOST", "localhost")
-QDRANT_PORT = os.environ.get("QDRANT_PORT", 6333)
+QDRANT_PORT = int(os.environ.get("QDRANT_PORT", 6333))
+QDRANT_GRPC_PORT = int(os.environ.get("QDRANT_GRPC_PORT", 6334))
+# Talk to the server over gRPC, which is considerably faster for bulk uploads
+QDRANT_PREFER_GRPC = os.environ.get("QDRANT_PREFER_GRPC", "1") == "1"
+# Use qdrant-client's local mode instead of a server: ":memory:" or a directory to store the collection in
+QDRANT_LOCATION = os.environ.get("QDRANT_LOCATION", "")
 QDRANT_COLLECTION_NAME = "rag_system_collection"
+# Bulk uploads: points per upsert request and number of requests in flight
+QDRANT_UPLOAD_BATCH_SIZE = int(os.environ.get("QDRANT_UPLOAD_BATCH_SIZE", 256))
+QDRANT_UPLOAD_PARALLEL = int(os.environ.get("QDRANT_UPLOAD_PARALLEL", 4))
+# Chunk IDs of the batches an unfinished upload has written, to resume from
+QDRANT_CHECKPOINT_PATH = os.environ.get("QDRANT_CHECKPOINT_PATH", f"vector_index/{QDRANT_COLLECTION_NAME}_upload_checkpoint.txt")
+# Chunk manifest used for incremental Qdrant updates (FAISS keeps it in the index directory)
+QDRANT_MANIFEST_PATH = os.environ.get("QDRANT_MANIFEST_PATH", f"vector_index/{QDRANT_COLLECTION_NAME}_manifest.json")
 
 # Hugging Face API configuration
 HF_API_TOKEN = os.environ.get("HUGGINGFACE_API_TOKEN")
-# HF_MODEL_NAME = "meta-llama/Llama-3.1-8B-Instruct"
+HF_MODEL_NAME = os.environ.get("HF_MODEL_NAME", "meta-llama/Llama-3.1-8B-Instruct")
+HF_CONTEXT_WINDOW = int(os.environ.get("HF_CONTEXT_WINDOW", 8192))
 
 # RAG and Llama.cpp server configuration
 LLAMA_CPP_MODEL_PATH = "models/Phi-3-mini-4k-instruct-q4.gguf"
+LLAMA_CPP_N_CTX = int(os.environ.get("LLAMA_CPP_N_CTX", 2048))
+LLAMA_CPP_N_BATCH = int(os.environ.get("LLAMA_CPP_N_BATCH", 512))
+# Answers decoded together by the continuous-batching scheduler, each with LLAMA_CPP_N_CTX tokens
+# of context. 1 generates one answer at a time with LangChain's LlamaCpp
+LLAMA_CPP_PARALLEL = int(os.environ.get("LLAMA_CPP_PARALLEL", 1))
 FAISS_INDEX_PATH="vector_index/faiss_amarel"
\ No newline at end of file
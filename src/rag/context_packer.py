@@ -0,0 +1,122 @@
+from src.rag.config import CONTEXT_TOKEN_BUDGET
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Chunks are only joined at an overlap if it starts with this many matching
+# characters, so short common phrases do not glue unrelated chunks together
+MIN_OVERLAP_CHARS = 40
+
+
+def source_key(document):
+    """
+    Returns what identifies the document a chunk was split from: the guide's
+    path or the incident number. None if neither is known.
+    """
+    return document.metadata.get("source") or document.metadata.get("incident_number")
+
+
+def _overlap_join(first, second):
+    # Looks for the start of second inside first and checks that the rest of
+    # first is exactly where second begins
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return None
+    start = first.find(probe)
+    while start != -1:
+        if second.startswith(first[start:]):
+            return first[:start] + second
+        start = first.find(probe, start + 1)
+    return None
+
+
+def join_spans(first, second, same_source):
+    """
+    Returns the text covering both spans if one contains the other or, for
+    spans of the same source, if they overlap. Returns None otherwise.
+    """
+    if second in first:
+        return first
+    if first in second:
+        return second
+    if not same_source:
+        return None
+    return _overlap_join(first, second) or _overlap_join(second, first)
+
+
+class ContextPacker:
+    """
+    Assembles the retrieved chunks into the prompt context. Adjacent chunks
+    of the same guide or ticket repeat their overlap, and near-duplicate
+    chunks repeat whole passages, so overlapping and contained chunks are
+    merged into one span first. Spans are then added in rank order of their
+    best chunk until the token budget is filled, measured with count_tokens,
+    which should be the LLM's own tokenizer. Every token kept out of the
+    prompt saves prompt-evaluation time and leaves room for the answer.
+    """
+
+    def __init__(self, count_tokens, token_budget=CONTEXT_TOKEN_BUDGET, separator="\n\n"):
+        self.count_tokens = count_tokens
+        self.token_budget = token_budget
+        self.separator = separator
+
+    def spans(self, documents):
+        """
+        Merges the chunks into non-overlapping spans, ordered by the rank of
+        their best chunk. documents are expected best first.
+        """
+        spans = []
+        for rank, document in enumerate(documents):
+            key, text = source_key(document), document.page_content.strip()
+            if not text:
+                continue
+            # A chunk can bridge two spans, so keep merging until nothing changes
+            merged = True
+            while merged:
+                merged = False
+                for span in spans:
+                    joined = join_spans(span[2], text, key is not None and span[1] == key)
+                    if joined is not None:
+                        spans.remove(span)
+                        rank, text, merged = min(rank, span[0]), joined, True
+                        break
+            spans.append((rank, key, text))
+        return [text for _, _, text in sorted(spans, key=lambda span: span[0])]
+
+    def _truncate(self, text, budget):
+        # Longest prefix, cut at a word boundary, that fits the budget
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(text[:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        cut = text.rfind(" ", 0, low) if low < len(text) else low
+        return text[:cut if cut > 0 else low].rstrip()
+
+    def pack(self, documents, token_budget=None):
+        """
+        Returns the context string for documents within token_budget tokens
+        (the packer's budget if not given). Spans that do not fit are skipped
+        so smaller, lower ranked ones can still fill the budget. The best span
+        is truncated rather than dropped if it does not fit on its own.
+        """
+        budget = self.token_budget if token_budget is None else token_budget
+        spans = self.spans(documents)
+        separator_tokens = self.count_tokens(self.separator)
+        packed, used = [], 0
+        for text in spans:
+            cost = self.count_tokens(text) + (separator_tokens if packed else 0)
+            if used + cost <= budget:
+                packed.append(text)
+                used += cost
+            elif not packed and budget > 0:
+                truncated = self._truncate(text, budget)
+                if truncated:
+                    packed.append(truncated)
+                    used = self.count_tokens(truncated)
+        logger.debug(
+            f"Packed {len(packed)} of {len(spans)} spans from {len(documents)} chunks into {used}/{budget} tokens."
+        )
+        return self.separator.join(packed)
@@ -1,8 +1,22 @@
+import glob
+import hashlib
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from langchain_core.documents import Document
-from langchain_community.document_loaders import DirectoryLoader
+from langchain_community.document_loaders import UnstructuredFileLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from src.rag.config import DATA_PATH, SERVICE_NOW_DATA_PATH
+from src.rag.chunking import MarkdownTokenSplitter
+from src.rag.config import (
+    DATA_PATH,
+    SERVICE_NOW_DATA_PATH,
+    MARKDOWN_LOADER,
+    MARKDOWN_CACHE_DIR,
+    CHUNKER,
+    DEDUP_THRESHOLD,
+)
+from src.rag.dedup import deduplicate_documents
+from src.rag.servicenow import available_cpus
 from src.rag.logger import get_logger
 
 logger = get_logger(__name__)
@@ -29,31 +43,177 @@ def load_servicenow_documents(servicenow_path=SERVICE_NOW_DATA_PATH):
     return documents
 
 
-def load_documents(servicenow_path=SERVICE_NOW_DATA_PATH):
+def parse_markdown_file(path, loader=MARKDOWN_LOADER):
     """
-    Loads all .md files from the directory specified in the config.
+    Parses a single markdown file into documents.
+    The "native" loader keeps the file's text as-is, which is much cheaper than
+    going through unstructured and preserves headings for chunking.
     """
-    logger.info(f"Loading documents from {DATA_PATH}")
-    loader = DirectoryLoader(DATA_PATH, glob="**/*.md", show_progress=True)
-    markdown_documents = loader.load()
+    if loader == "native":
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        return [Document(page_content=text, metadata={"source": path})]
+    elif loader == "unstructured":
+        # Same loader DirectoryLoader uses by default
+        return UnstructuredFileLoader(path).load()
+    else:
+        raise ValueError(f"Unknown markdown loader: {loader}")
+
+
+def _cache_path(cache_dir, path, loader):
+    """
+    Returns the cache file for a markdown file parsed with the given loader.
+    """
+    key = hashlib.sha1(f"{loader}:{os.path.abspath(path)}".encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def _read_cache_entry(cache_dir, path, loader):
+    """
+    Returns the cached documents for a file if it has not changed since it was
+    parsed, and the file's stat and content hash so a miss can be written back.
+    The hash is only computed when the mtime or size differ from the cache.
+    """
+    stat = os.stat(path)
+    entry = None
+    cache_path = _cache_path(cache_dir, path, loader)
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r') as f:
+                entry = json.load(f)
+        except (IOError, json.JSONDecodeError):
+            entry = None
+
+    if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+        return entry["documents"], stat, entry["sha256"]
+
+    with open(path, 'rb') as f:
+        content_hash = hashlib.sha256(f.read()).hexdigest()
+    if entry and entry["sha256"] == content_hash:
+        # Touched but unchanged, refresh the stat so the next lookup is cheap
+        _write_cache_entry(cache_dir, path, loader, stat, content_hash, entry["documents"])
+        return entry["documents"], stat, content_hash
+    return None, stat, content_hash
+
+
+def _write_cache_entry(cache_dir, path, loader, stat, content_hash, documents):
+    """
+    Stores the parsed documents for a file in the cache.
+    """
+    entry = {
+        "path": path,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": content_hash,
+        "documents": documents,
+    }
+    cache_path = _cache_path(cache_dir, path, loader)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, cache_path)
+
+
+def load_markdown_documents(data_path=DATA_PATH, loader=MARKDOWN_LOADER, workers=None, cache_dir=MARKDOWN_CACHE_DIR):
+    """
+    Loads all .md files from the given directory.
+    Files are parsed in parallel (threads for the native loader, processes for
+    unstructured), and parsed output is cached in cache_dir so unchanged files
+    are not parsed again on the next build.
+    """
+    logger.info(f"Loading documents from {data_path} with the '{loader}' markdown loader")
+    paths = sorted(glob.glob(os.path.join(data_path, "**", "*.md"), recursive=True))
+
+    parsed = {}
+    stats = {}
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        for path in paths:
+            documents, stat, content_hash = _read_cache_entry(cache_dir, path, loader)
+            if documents is not None:
+                parsed[path] = [Document(**document) for document in documents]
+            else:
+                stats[path] = (stat, content_hash)
+    to_parse = [path for path in paths if path not in parsed]
+    logger.info(f"Found {len(paths)} markdown files, {len(parsed)} cached, {len(to_parse)} to parse.")
+
+    if to_parse:
+        if loader == "native":
+            executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers or available_cpus())
+        with executor:
+            results = executor.map(parse_markdown_file, to_parse, [loader] * len(to_parse))
+            for path, documents in zip(to_parse, results):
+                parsed[path] = documents
+                if cache_dir:
+                    stat, content_hash = stats[path]
+                    serialized = [{"page_content": d.page_content, "metadata": d.metadata} for d in documents]
+                    _write_cache_entry(cache_dir, path, loader, stat, content_hash, serialized)
+
+    markdown_documents = [document for path in paths for document in parsed[path]]
     logger.info(f"Loaded {len(markdown_documents)} documents.")
+    return markdown_documents
+
+
+def load_documents(servicenow_path=SERVICE_NOW_DATA_PATH, markdown_loader=MARKDOWN_LOADER, deduplicate=False,
+                   dedup_threshold=DEDUP_THRESHOLD):
+    """
+    Loads the markdown guides from the directory specified in the config
+    and the prepared ServiceNow documents, optionally collapsing
+    near-duplicate tickets.
+    """
+    markdown_documents = load_markdown_documents(loader=markdown_loader)
 
     servicenow_documents = load_servicenow_documents(servicenow_path)
+    if deduplicate:
+        servicenow_documents = deduplicate_documents(servicenow_documents, threshold=dedup_threshold)
 
     documents = markdown_documents + servicenow_documents
     logger.info(f"Loaded a total of {len(documents)} documents.")
     return documents
 
-def chunk_documents(documents):
+def get_text_splitter(chunker=CHUNKER):
+    """
+    Returns the text splitter used to chunk documents.
+    """
+    if chunker == "recursive":
+        return RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        )
+    elif chunker == "markdown_tokens":
+        return MarkdownTokenSplitter()
+    else:
+        raise ValueError(f"Unknown chunker: {chunker}")
+
+_worker_text_splitter = None
+
+def _init_chunk_worker(chunker):
+    """
+    Builds the text splitter once per worker process.
+    """
+    global _worker_text_splitter
+    _worker_text_splitter = get_text_splitter(chunker)
+
+def _chunk_batch(documents):
+    return _worker_text_splitter.split_documents(documents)
+
+def chunk_documents(documents, chunker=CHUNKER, workers=1, batch_size=256):
     """
     Splits the loaded documents into smaller chunks.
+    With more than one worker, batches of documents are split across a process
+    pool; chunks are returned in document order either way.
     """
-    logger.info("Chunking documents...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
-    )
-    chunked_documents = text_splitter.split_documents(documents)
+    logger.info(f"Chunking documents with the '{chunker}' chunker...")
+    if workers is None:
+        workers = available_cpus()
+    if workers <= 1 or len(documents) <= batch_size:
+        chunked_documents = get_text_splitter(chunker).split_documents(documents)
+    else:
+        batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_chunk_worker, initargs=(chunker,)) as executor:
+            chunked_documents = [chunk for chunks in executor.map(_chunk_batch, batches) for chunk in chunks]
     logger.info(f"Created {len(chunked_documents)} document chunks.")
     return chunked_documents
 
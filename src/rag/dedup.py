@@ -0,0 +1,172 @@
+import re
+import zlib
+import numpy as np
+from langchain_core.documents import Document
+from src.rag.config import DEDUP_THRESHOLD, DEDUP_NUM_PERM
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Minhash values are computed modulo a Mersenne prime below 2**31, so
+# a * hash + b stays within uint64 for 32-bit shingle hashes.
+_PRIME = np.uint64((1 << 31) - 1)
+_WORD_RE = re.compile(r'\w+')
+
+DUPLICATES_KEY = "duplicate_incident_numbers"
+
+
+def choose_lsh_params(num_perm, threshold):
+    """
+    Picks the (bands, rows) split of the signature whose LSH S-curve threshold
+    (1/bands)^(1/rows) is closest to the requested Jaccard similarity.
+    Leftover signature positions are only used to verify candidates.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        distance = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if best is None or distance < best[0]:
+            best = (distance, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateIndex:
+    """
+    Finds near-duplicate texts with MinHash signatures and LSH banding.
+    Texts are added one at a time; each is either registered as a new
+    representative or matched to an earlier one, in roughly linear time.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM, shingle_size=3, seed=1):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands, self.rows = choose_lsh_params(num_perm, threshold)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = []
+
+    def signature(self, text):
+        """
+        Returns the MinHash signature of the text's word shingles.
+        """
+        words = _WORD_RE.findall(text.lower())
+        n = self.shingle_size
+        shingles = {' '.join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        return ((self._a * hashes + self._b) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def add(self, text):
+        """
+        Returns the index of the representative this text duplicates, or
+        registers the text as a new representative and returns None.
+        """
+        signature = self.signature(text)
+        keys = [hash(signature[i * self.rows:(i + 1) * self.rows].tobytes()) for i in range(self.bands)]
+
+        for band, key in enumerate(keys):
+            candidate = self._buckets[band].get(key)
+            if candidate is not None and np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                return candidate
+
+        representative = len(self._signatures)
+        self._signatures.append(signature)
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, representative)
+        return None
+
+
+class TicketDeduplicator:
+    """
+    Collapses near-duplicate ServiceNow tickets into one representative per
+    cluster, remembering the incident numbers of the tickets that were dropped.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM):
+        self.index = NearDuplicateIndex(threshold=threshold, num_perm=num_perm)
+        self.representatives = []
+        self.duplicates = {}
+        self.dropped = 0
+
+    def add(self, document):
+        """
+        Returns True if the document is a new representative that should be
+        indexed, False if it duplicates an earlier ticket.
+        """
+        match = self.index.add(document.page_content)
+        if match is None:
+            self.representatives.append(document.metadata.get("incident_number"))
+            return True
+        representative = self.representatives[match]
+        self.duplicates.setdefault(representative, []).append(document.metadata.get("incident_number"))
+        self.dropped += 1
+        return False
+
+    def log_summary(self):
+        logger.info(
+            f"Deduplication kept {len(self.representatives)} tickets and collapsed {self.dropped} "
+            f"near-duplicates into {len(self.duplicates)} clusters."
+        )
+
+
+def deduplicate_documents(documents, threshold=DEDUP_THRESHOLD, num_perm=DEDUP_NUM_PERM):
+    """
+    Keeps one representative per cluster of near-duplicate tickets. The
+    incident numbers of the other tickets are stored in the representative's
+    metadata under DUPLICATES_KEY.
+    """
+    logger.info(f"Deduplicating {len(documents)} tickets (Jaccard threshold {threshold})...")
+    deduplicator = TicketDeduplicator(threshold=threshold, num_perm=num_perm)
+    kept = [document for document in documents if deduplicator.add(document)]
+    for document in kept:
+        duplicates = deduplicator.duplicates.get(document.metadata.get("incident_number"))
+        if duplicates:
+            document.metadata[DUPLICATES_KEY] = duplicates
+    deduplicator.log_summary()
+    return kept
+
+
+def duplicates_by_incident(documents):
+    """
+    Returns the duplicate lists stored on deduplicated documents, keyed by
+    the incident number of their representative.
+    """
+    return {
+        document.metadata.get("incident_number"): document.metadata[DUPLICATES_KEY]
+        for document in documents
+        if document.metadata.get(DUPLICATES_KEY)
+    }
+
+
+def with_duplicates(metadata, duplicates):
+    """
+    Returns a copy of a chunk's metadata carrying its ticket's duplicate
+    list from duplicates, or without one if the ticket has none.
+    """
+    metadata = {key: value for key, value in metadata.items() if key != DUPLICATES_KEY}
+    if metadata.get("incident_number") in duplicates:
+        metadata[DUPLICATES_KEY] = duplicates[metadata["incident_number"]]
+    return metadata
+
+
+def apply_duplicate_metadata(vector_store, duplicates):
+    """
+    Records the incident numbers collapsed into each representative ticket on
+    the representative's chunks in a FAISS store, and drops duplicate lists
+    that are no longer current. Duplicate lists are left out of chunk IDs,
+    so chunks whose list changed are not re-embedded and are updated here.
+    Returns the number of chunks updated.
+    """
+    updated = {}
+    for chunk_id in vector_store.index_to_docstore_id.values():
+        document = vector_store.docstore.search(chunk_id)
+        metadata = with_duplicates(document.metadata, duplicates)
+        if metadata != document.metadata:
+            updated[chunk_id] = Document(page_content=document.page_content, metadata=metadata, id=document.id)
+    if updated:
+        vector_store.docstore.delete(list(updated))
+        vector_store.docstore.add(updated)
+    return len(updated)
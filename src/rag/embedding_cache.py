@@ -0,0 +1,181 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.rag.config import EMBEDDING_CACHE_MAX_BYTES, EMBEDDING_CACHE_PATH, EMBEDDING_MODEL
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+# Eviction trims the cache to this fraction of its size limit so it does not run on every insert
+_EVICTION_TARGET = 0.9
+
+
+def normalize_text(text):
+    """
+    Collapses runs of whitespace. The embedding tokenizer splits on whitespace,
+    so texts that only differ in spacing produce the same vector.
+    """
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def cache_key(model_name, text):
+    """
+    Returns the cache key for a text embedded with the given model.
+    """
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a persistent SQLite cache of document
+    vectors, keyed by model name and normalized text. The model itself is
+    only loaded on the first cache miss, so rebuilding an index from an
+    already embedded corpus does not load it at all.
+    Least recently used vectors are evicted once the cache grows beyond
+    max_bytes. Queries are passed straight through to the model.
+    The cache runs in WAL mode, which needs shared memory between the
+    processes using it: several processes may share a cache on one host,
+    but not across nodes or on a network filesystem such as NFS or GPFS.
+    """
+
+    def __init__(self, load_embeddings, model_name=EMBEDDING_MODEL, cache_path=EMBEDDING_CACHE_PATH,
+                 max_bytes=EMBEDDING_CACHE_MAX_BYTES):
+        self.model_name = model_name
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_embeddings = load_embeddings
+        self._embeddings = None
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._size = self._stored_bytes()
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            self._embeddings = self._load_embeddings()
+        return self._embeddings
+
+    def _stored_bytes(self):
+        return self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+
+    def _lookup(self, keys):
+        found = {}
+        for i in range(0, len(keys), _LOOKUP_BATCH):
+            batch = keys[i:i + _LOOKUP_BATCH]
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch
+            )
+            for key, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+
+    def _evict(self):
+        """
+        Deletes the least recently used vectors until the cache is back under
+        its eviction target. Other processes may share the file, so the size
+        is re-read before deciding what to delete.
+        """
+        self._size = self._stored_bytes()
+        target = int(self.max_bytes * _EVICTION_TARGET)
+        while self._size > target:
+            row_bytes = self._conn.execute("SELECT LENGTH(vector) FROM embeddings LIMIT 1").fetchone()[0]
+            count = max(1, (self._size - target + row_bytes - 1) // row_bytes)
+            deleted = self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (count,)
+            ).rowcount
+            self.evictions += deleted
+            self._size = self._stored_bytes()
+        logger.info(f"Evicted embeddings down to {self._size / 2**20:.1f} MiB, {self.evictions} evicted so far.")
+
+    def lookup(self, texts):
+        """
+        Returns the cached vector for each text, or None where there is none.
+        """
+        keys = [cache_key(self.model_name, text) for text in texts]
+        with self._lock:
+            cached = self._lookup(list(set(keys)))
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in cached]
+            )
+            self._conn.commit()
+        vectors = [cached.get(key) for key in keys]
+        hits = sum(1 for vector in vectors if vector is not None)
+        self.hits += hits
+        self.misses += len(vectors) - hits
+        return vectors
+
+    def store(self, texts, vectors):
+        """
+        Adds vectors for the given texts to the cache, evicting old entries if
+        it has grown beyond max_bytes.
+        """
+        rows = {}
+        for text, vector in zip(texts, vectors):
+            rows[cache_key(self.model_name, text)] = np.asarray(vector, dtype=np.float32).tobytes()
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, vector, now) for key, vector in rows.items()],
+            )
+            self._conn.commit()
+            self._size += sum(len(vector) for vector in rows.values())
+            if self.max_bytes and self._size > self.max_bytes:
+                self._evict()
+                self._conn.commit()
+
+    def embed_documents(self, texts):
+        vectors = self.lookup(texts)
+        missing = {}
+        for text, vector in zip(texts, vectors):
+            if vector is None:
+                missing.setdefault(normalize_text(text), text)
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            self.store(missing.values(), embedded)
+            embedded = dict(zip(missing, embedded))
+            vectors = [
+                vector if vector is not None else embedded[normalize_text(text)]
+                for text, vector in zip(texts, vectors)
+            ]
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0.0
+        logger.info(
+            f"Embedding cache '{self.cache_path}': {self.hits} hits, {self.misses} misses "
+            f"({hit_rate:.1%} hit rate), {self.evictions} evictions, {self._size / 2**20:.1f} MiB stored."
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,110 @@
+import json
+import os
+import re
+import numpy as np
+from src.rag.config import FAISS_INDEX_SPEC, FAISS_TRAIN_SIZE
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_SPEC_FILENAME = "index_spec.json"
+FLAT_SPEC = "Flat"
+
+# faiss recommends at least this many training vectors per IVF list
+_TRAIN_POINTS_PER_LIST = 50
+_IVF_RE = re.compile(r'IVF(\d+)')
+
+
+def training_size(index_spec, train_size=FAISS_TRAIN_SIZE):
+    """
+    Returns how many vectors to train an index_factory spec on. A train_size
+    of 0 picks a size from the number of IVF lists in the spec.
+    """
+    if train_size:
+        return train_size
+    match = _IVF_RE.search(index_spec)
+    return int(match.group(1)) * _TRAIN_POINTS_PER_LIST if match else 0
+
+
+def supports_removal(index_spec):
+    """
+    Whether vectors can be deleted from an index of this spec in place.
+    LangChain renumbers positions after a delete, which only matches how flat
+    indexes shift their IDs; HNSW cannot remove vectors at all.
+    """
+    return index_spec == FLAT_SPEC
+
+
+def apply_index_spec(vector_store, index_spec=FAISS_INDEX_SPEC, train_size=FAISS_TRAIN_SIZE, seed=0):
+    """
+    Replaces the flat index of a FAISS store with an index_factory index such
+    as "HNSW32", "IVF4096,Flat" or "IVF4096,PQ48", trained on a random sample
+    of the stored vectors. Vectors keep their positions, so the docstore
+    mapping is unchanged.
+    """
+    import faiss
+
+    if index_spec == FLAT_SPEC:
+        return vector_store
+    flat_index = vector_store.index
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+
+    index = faiss.index_factory(flat_index.d, index_spec, flat_index.metric_type)
+    if not index.is_trained:
+        size = min(training_size(index_spec, train_size), len(vectors))
+        match = _IVF_RE.search(index_spec)
+        if match and len(vectors) < int(match.group(1)):
+            raise ValueError(
+                f"'{index_spec}' needs at least {match.group(1)} vectors to train, the index only has {len(vectors)}."
+            )
+        sample = np.random.default_rng(seed).choice(len(vectors), size=size, replace=False)
+        logger.info(f"Training '{index_spec}' index on {size} of {len(vectors)} vectors...")
+        index.train(vectors[np.sort(sample)])
+
+    logger.info(f"Adding {len(vectors)} vectors to the '{index_spec}' index...")
+    index.add(vectors)
+    vector_store.index = index
+    return vector_store
+
+
+def save_index_spec(persist_dir, index_spec, train_size=FAISS_TRAIN_SIZE):
+    """
+    Records the spec an index was built with next to it.
+    """
+    with open(os.path.join(persist_dir, INDEX_SPEC_FILENAME), 'w') as f:
+        json.dump({"spec": index_spec, "train_size": training_size(index_spec, train_size)}, f, indent=2)
+
+
+def load_index_spec(persist_dir):
+    """
+    Returns the spec a persisted index was built with. Indexes built before
+    specs were recorded are flat.
+    """
+    path = os.path.join(persist_dir, INDEX_SPEC_FILENAME)
+    if not os.path.exists(path):
+        return FLAT_SPEC
+    with open(path, 'r') as f:
+        return json.load(f)["spec"]
+
+
+def set_search_params(vector_store, nprobe=None, ef_search=None):
+    """
+    Sets the runtime search knobs of an approximate index: nprobe, the
+    number of IVF lists scanned per query, and efSearch, the HNSW candidate
+    list size. Higher values raise recall at the cost of latency. Knobs that
+    do not apply to the index type are ignored.
+    """
+    import faiss
+
+    index = vector_store.index
+    if nprobe:
+        try:
+            faiss.extract_index_ivf(index).nprobe = nprobe
+            logger.info(f"Set IVF nprobe to {nprobe}.")
+        except RuntimeError:
+            pass
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if ef_search and hnsw is not None:
+        hnsw.efSearch = ef_search
+        logger.info(f"Set HNSW efSearch to {ef_search}.")
+    return vector_store
@@ -0,0 +1,334 @@
+import queue
+import threading
+from typing import Any, Iterator, Optional
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import ConfigDict
+from src.rag.config import (
+    LLAMA_CPP_MODEL_PATH, LLAMA_CPP_N_BATCH, LLAMA_CPP_N_CTX, LLAMA_CPP_PARALLEL, LLM_MAX_NEW_TOKENS,
+)
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Sentinel put on a request's output queue when its answer is complete
+_DONE = object()
+# Tokens looked back at for the repetition penalty, like llama.cpp's default
+_PENALTY_WINDOW = 64
+
+
+def sample_token(logits, rng, temperature=0.8, top_k=40, top_p=0.95, repeat_penalty=1.1, recent_tokens=()):
+    """
+    Samples the next token from logits with llama.cpp's default chain:
+    repetition penalty, top-k, temperature and top-p. A temperature of 0
+    picks the most likely token.
+    """
+    logits = np.array(logits, dtype=np.float32)
+    if repeat_penalty != 1.0 and len(recent_tokens):
+        recent = np.unique(np.asarray(recent_tokens))
+        values = logits[recent]
+        logits[recent] = np.where(values > 0, values / repeat_penalty, values * repeat_penalty)
+    if temperature <= 0:
+        return int(np.argmax(logits))
+
+    candidates = np.argpartition(-logits, top_k - 1)[:top_k] if 0 < top_k < len(logits) else np.arange(len(logits))
+    scaled = logits[candidates] / temperature
+    probabilities = np.exp(scaled - scaled.max())
+    probabilities /= probabilities.sum()
+    order = np.argsort(-probabilities)
+    cumulative = np.cumsum(probabilities[order])
+    keep = order[:int(np.searchsorted(cumulative, top_p)) + 1]
+    probabilities = probabilities[keep] / probabilities[keep].sum()
+    return int(candidates[keep[rng.choice(len(keep), p=probabilities)]])
+
+
+def missing_llama_cpp_api():
+    """
+    Returns the parts of llama-cpp-python's low-level API the scheduler uses
+    that the installed release lacks, or all of it if llama_cpp is missing.
+    The _internals module is not public and may change between releases.
+    """
+    try:
+        import llama_cpp
+        from llama_cpp import _internals
+    except ImportError:
+        return ["llama_cpp"]
+    required = {
+        "llama_cpp.llama_context_params": (llama_cpp, "llama_context_params"),
+        "llama_cpp.llama_vocab_is_eog": (llama_cpp, "llama_vocab_is_eog"),
+        "_internals.LlamaBatch": (_internals, "LlamaBatch"),
+        "_internals.LlamaContext": (_internals, "LlamaContext"),
+    }
+    missing = [name for name, (owner, attribute) in required.items() if not hasattr(owner, attribute)]
+    context = getattr(_internals, "LlamaContext", None)
+    for method in ("decode", "get_logits_ith", "kv_cache_seq_rm"):
+        if context is not None and not hasattr(context, method):
+            missing.append(f"_internals.LlamaContext.{method}")
+    return missing
+
+
+class _Sequence:
+    """
+    State of one request in the batch: the tokens still to be decoded, its
+    position in its KV cache sequence, its sampling settings and RNG, and the
+    text produced so far.
+    """
+
+    def __init__(self, prompt_tokens, max_tokens, stop, sampling, seed):
+        self.seq_id = None
+        self.pending = list(prompt_tokens)
+        self.prompt_length = len(prompt_tokens)
+        self.position = 0
+        self.max_tokens = max_tokens
+        self.stop = [s for s in stop if s]
+        self.sampling = sampling
+        self.rng = np.random.default_rng(seed)
+        self.tokens = list(prompt_tokens)
+        self.generated = 0
+        self.output = bytearray()
+        self.sent = 0
+        self.logits_index = None
+        self.cancelled = False
+        self.queue = queue.Queue()
+
+    def emit(self, final=False):
+        """
+        Sends the text that is complete so far, holding back what could be
+        the start of a stop string. Returns True once a stop string is seen.
+        """
+        text = self.output.decode("utf-8", errors="ignore")
+        stopped = False
+        end = len(text)
+        for stop in self.stop:
+            index = text.find(stop)
+            if index != -1:
+                end, stopped = min(end, index), True
+        if not stopped and not final:
+            end -= max((len(stop) - 1 for stop in self.stop), default=0)
+        if end > self.sent:
+            self.queue.put(text[self.sent:end])
+            self.sent = end
+        return stopped
+
+
+class GenerationScheduler:
+    """
+    Continuous-batching generation for a llama.cpp model. Requests are
+    decoded together in one llama_decode call per step, each in its own KV
+    cache sequence with its own sampling state. Sequences that finish leave
+    the batch and waiting requests join it at the next step, their prompts
+    filling the room left by the sequences that are generating, so aggregate
+    throughput grows with the number of concurrent requests instead of each
+    one waiting for the previous answer.
+
+    Up to max_sequences requests are decoded at once, each with n_ctx tokens
+    of context; n_batch bounds the tokens decoded per step.
+    """
+
+    def __init__(self, model_path=LLAMA_CPP_MODEL_PATH, max_sequences=LLAMA_CPP_PARALLEL, n_ctx=LLAMA_CPP_N_CTX,
+                 n_batch=LLAMA_CPP_N_BATCH, n_gpu_layers=-1, stop=("<|end|>", "<|endoftext|>")):
+        import llama_cpp
+        from llama_cpp import _internals
+
+        self.max_sequences = max_sequences
+        self.n_ctx = n_ctx
+        self.n_batch = n_batch
+        self.stop = list(stop)
+        # The Llama object loads the weights and tokenizer; its own context is
+        # kept minimal since generation uses the batched context below
+        self._llama = llama_cpp.Llama(
+            model_path=model_path, n_gpu_layers=n_gpu_layers, n_ctx=n_batch, n_batch=n_batch, verbose=False,
+        )
+        params = llama_cpp.llama_context_params.from_buffer_copy(self._llama.context_params)
+        params.n_ctx = n_ctx * max_sequences
+        params.n_batch = params.n_ubatch = n_batch
+        params.n_seq_max = max_sequences
+        self._context = _internals.LlamaContext(model=self._llama._model, params=params, verbose=False)
+        self._batch = _internals.LlamaBatch(n_tokens=n_batch, embd=0, n_seq_max=1, verbose=False)
+        vocab = self._llama._model.vocab
+        self.n_vocab = self._llama.n_vocab()
+        self._eog = {token for token in range(self.n_vocab) if llama_cpp.llama_vocab_is_eog(vocab, token)}
+
+        self._free_ids = list(range(max_sequences))
+        self._waiting = []
+        self._active = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self.steps = 0
+        self.decoded_tokens = 0
+        self.generated_tokens = 0
+        self._thread = threading.Thread(target=self._run, name="generation-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"Generation scheduler decoding up to {max_sequences} sequences of {n_ctx} tokens at once.")
+
+    def tokenize(self, text):
+        return self._llama.tokenize(text.encode("utf-8"), add_bos=True, special=True)
+
+    def generate(self, prompt, max_tokens=LLM_MAX_NEW_TOKENS, stop=None, temperature=0.8, top_k=40, top_p=0.95,
+                 repeat_penalty=1.1, seed=None):
+        """
+        Queues prompt for generation and yields the answer text as it is
+        produced. Closing the generator cancels the request.
+        """
+        tokens = self.tokenize(prompt)
+        if len(tokens) >= self.n_ctx:
+            raise ValueError(f"Requested tokens ({len(tokens)}) exceed context window of {self.n_ctx}")
+        sampling = {"temperature": temperature, "top_k": top_k, "top_p": top_p, "repeat_penalty": repeat_penalty}
+        sequence = _Sequence(tokens, max_tokens, self.stop + list(stop or []), sampling, seed)
+        with self._condition:
+            self._waiting.append(sequence)
+            self._condition.notify()
+        finished = False
+        try:
+            while True:
+                item = sequence.queue.get()
+                if item is _DONE:
+                    finished = True
+                    return
+                if isinstance(item, Exception):
+                    finished = True
+                    raise item
+                yield item
+        finally:
+            if not finished:
+                sequence.cancelled = True
+
+    def _admit(self):
+        with self._condition:
+            while not self._active and not self._waiting and not self._closed:
+                self._condition.wait()
+            while self._waiting and self._free_ids:
+                sequence = self._waiting.pop(0)
+                sequence.seq_id = self._free_ids.pop()
+                self._active.append(sequence)
+
+    def _release(self, sequence):
+        self._context.kv_cache_seq_rm(sequence.seq_id, -1, -1)
+        self._active.remove(sequence)
+        with self._condition:
+            self._free_ids.append(sequence.seq_id)
+
+    def _finish(self, sequence, error=None):
+        if error is None:
+            sequence.emit(final=True)
+        sequence.queue.put(error if error is not None else _DONE)
+        self._release(sequence)
+
+    def _fill_batch(self):
+        # Generating sequences go first, one token each, so their answers keep
+        # flowing; new prompts are prefilled with the remaining room
+        batch = self._batch.batch
+        batch.n_tokens = 0
+        for sequence in sorted(self._active, key=lambda s: len(s.pending) > 1):
+            count = min(len(sequence.pending), self.n_batch - batch.n_tokens)
+            if count == 0:
+                break
+            for token in sequence.pending[:count]:
+                i = batch.n_tokens
+                batch.token[i] = token
+                batch.pos[i] = sequence.position
+                batch.n_seq_id[i] = 1
+                batch.seq_id[i][0] = sequence.seq_id
+                batch.logits[i] = False
+                batch.n_tokens += 1
+                sequence.position += 1
+            del sequence.pending[:count]
+            if not sequence.pending:
+                batch.logits[batch.n_tokens - 1] = True
+                sequence.logits_index = batch.n_tokens - 1
+        return batch.n_tokens
+
+    def _step(self):
+        for sequence in [s for s in self._active if s.cancelled]:
+            self._release(sequence)
+        if not self._active:
+            return
+        n_tokens = self._fill_batch()
+        try:
+            self._context.decode(self._batch)
+        except RuntimeError as e:
+            logger.error(f"Batched decode of {n_tokens} tokens failed: {e}")
+            for sequence in list(self._active):
+                self._finish(sequence, e)
+            return
+        self.steps += 1
+        self.decoded_tokens += n_tokens
+
+        for sequence in [s for s in self._active if s.logits_index is not None]:
+            pointer = self._context.get_logits_ith(sequence.logits_index)
+            logits = np.ctypeslib.as_array(pointer, shape=(self.n_vocab,))
+            sequence.logits_index = None
+            token = sample_token(logits, sequence.rng, recent_tokens=sequence.tokens[-_PENALTY_WINDOW:],
+                                 **sequence.sampling)
+            if token in self._eog:
+                self._finish(sequence)
+                continue
+            sequence.tokens.append(token)
+            sequence.generated += 1
+            self.generated_tokens += 1
+            sequence.output += self._llama.detokenize([token])
+            stopped = sequence.emit()
+            if stopped or sequence.generated >= sequence.max_tokens or sequence.position >= self.n_ctx:
+                self._finish(sequence)
+            else:
+                sequence.pending.append(token)
+
+    def _run(self):
+        while True:
+            self._admit()
+            if self._closed:
+                break
+            try:
+                self._step()
+            except Exception as e:
+                logger.error(f"Generation step failed: {e}")
+                for sequence in list(self._active):
+                    self._finish(sequence, e)
+
+    def stats(self):
+        return {
+            "active": len(self._active),
+            "waiting": len(self._waiting),
+            "steps": self.steps,
+            "generated_tokens": self.generated_tokens,
+            "mean_batch_tokens": self.decoded_tokens / self.steps if self.steps else 0.0,
+        }
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+
+class BatchedLlamaCpp(LLM):
+    """
+    LangChain LLM generating through a shared GenerationScheduler, so the
+    chain can be called from many threads at once.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    scheduler: Any
+    max_tokens: int = LLM_MAX_NEW_TOKENS
+
+    @property
+    def _llm_type(self) -> str:
+        return "batched_llama_cpp"
+
+    def _call(self, prompt: str, stop: Optional[list[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    def _stream(self, prompt: str, stop: Optional[list[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[GenerationChunk]:
+        for text in self.scheduler.generate(prompt, max_tokens=self.max_tokens, stop=stop):
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    def get_num_tokens(self, text: str) -> int:
+        return len(self.scheduler.tokenize(text))
@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, PrivateAttr
+from src.rag.config import HYBRID_FETCH_K, RRF_K
+from src.rag.partitions import expand_quotas, selector_params
+
+
+def reciprocal_rank_fusion(rankings, rrf_k=RRF_K):
+    """
+    Fuses ranked lists of keys with reciprocal rank fusion: each key scores
+    the sum of 1 / (rrf_k + rank) over the lists it appears in. Returns the
+    keys ordered by fused score, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retrieves chunks from a FAISS store with a columnar docstore and,
+    optionally, its BM25 index, fusing both rankings with reciprocal rank
+    fusion. BM25 catches exact matches on error strings, module and partition
+    names and ticket numbers that the embedding model misses, so a small k
+    finds the right chunk more often. fetch_k candidates are taken from each
+    side.
+
+    search_kwargs["k"] is the number of chunks returned and
+    search_kwargs["filter"] an optional metadata filter, applied as a
+    pre-filter inside the FAISS and BM25 searches. With quotas, each listed
+    partition is searched concurrently and contributes up to its quota of
+    chunks instead.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    vector_store: Any
+    bm25: Any = None
+    search_kwargs: dict = {"k": 4}
+    quotas: dict = {}
+    fetch_k: int = HYBRID_FETCH_K
+    rrf_k: int = RRF_K
+    _executor: ThreadPoolExecutor = PrivateAttr(default_factory=lambda: ThreadPoolExecutor(max_workers=4))
+
+    def _dense_search(self, query_vector, k, mask):
+        if mask is None:
+            _, positions = self.vector_store.index.search(query_vector, k)
+        else:
+            params, _keepalive = selector_params(self.vector_store.index, mask)
+            _, positions = self.vector_store.index.search(query_vector, k, params=params)
+        return [int(position) for position in positions[0] if position >= 0]
+
+    def _embed_query(self, query):
+        import faiss
+
+        query_vector = np.array([self.vector_store.embedding_function.embed_query(query)], dtype=np.float32)
+        if getattr(self.vector_store, "_normalize_L2", False):
+            faiss.normalize_L2(query_vector)
+        return query_vector
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        docstore = self.vector_store.docstore
+        metadata_filter = self.search_kwargs.get("filter")
+        filter_mask = docstore.filter_mask(metadata_filter) if metadata_filter else None
+        if self.quotas:
+            searches = []
+            for name, quota in expand_quotas(self.quotas, docstore.partition_names).items():
+                mask = docstore.partition_mask(name)
+                searches.append((quota, mask if filter_mask is None else mask & filter_mask))
+        else:
+            searches = [(self.search_kwargs.get("k", 4), filter_mask)]
+        searches = [(k, mask) for k, mask in searches if k > 0 and (mask is None or mask.any())]
+
+        candidates = [(max(self.fetch_k, k) if self.bm25 is not None else k, mask) for k, mask in searches]
+        # Embedding the query and searching FAISS release the GIL, so BM25 runs meanwhile
+        vector_future = self._executor.submit(self._embed_query, query)
+        sparse = [
+            list(self.bm25.search(query, fetch_k, mask=mask)[0]) if self.bm25 is not None else []
+            for fetch_k, mask in candidates
+        ]
+        query_vector = vector_future.result()
+        dense = list(self._executor.map(lambda candidate: self._dense_search(query_vector, *candidate), candidates))
+
+        # Interleave partitions by rank, so each gets its quota
+        ranked = []
+        for partition, ((k, _), dense_positions, sparse_positions) in enumerate(zip(searches, dense, sparse)):
+            fused = reciprocal_rank_fusion([dense_positions, sparse_positions], self.rrf_k)
+            ranked.extend((rank, partition, position) for rank, position in enumerate(fused[:k]))
+        return [docstore.document_at(position) for _, _, position in sorted(ranked)]
@@ -0,0 +1,242 @@
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import ExitStack
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from src.rag.bulk_embed import iter_windowed_embeddings
+from src.rag.config import (
+    CHUNKER,
+    DATA_PATH,
+    EMBED_BATCH_SIZE,
+    EMBEDDING_MODEL,
+    FAISS_INDEX_SPEC,
+    FAISS_TRAIN_SIZE,
+    MARKDOWN_LOADER,
+)
+from src.rag.data_loader import load_markdown_documents, get_text_splitter
+from src.rag.dedup import TicketDeduplicator, apply_duplicate_metadata
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.faiss_index import apply_index_spec, load_index_spec, save_index_spec, supports_removal
+from src.rag.manifest import (
+    MANIFEST_FILENAME,
+    compute_chunk_id,
+    is_manifest_compatible,
+    load_manifest,
+    save_manifest,
+)
+from src.rag.servicenow import clean_record_batches, iter_batches, iter_json_records, prepare_record
+from src.rag.vector_store import (
+    get_embedding_model,
+    load_faiss_store,
+    log_embedding_cache_stats,
+    save_faiss_store,
+)
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+_END = object()
+
+
+class _StageError:
+    """
+    Carries an exception raised in a stage thread over to the consuming thread.
+    """
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def buffered(iterable, maxsize=8, name="stage"):
+    """
+    Runs an iterable in a background thread and yields its items through a
+    bounded queue, so the producing stage runs ahead of the consumer by at most
+    maxsize items. Exceptions in the producer are re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    break
+            else:
+                put(_END)
+        except BaseException as e:
+            put(_StageError(e))
+        finally:
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    thread = threading.Thread(target=produce, name=f"ingest-{name}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _END:
+                return
+            if isinstance(item, _StageError):
+                raise item.exception
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_servicenow_documents(input_path, workers=None, batch_size=500, queue_size=8,
+                              cleaned_output=None, prepared_output=None, deduplicator=None):
+    """
+    Streams records from a raw ServiceNow export through cleaning and text
+    assembly, yielding one Document per ticket. The cleaned and prepared
+    records are only written to disk when an output path is given.
+    With a deduplicator, near-duplicates of earlier tickets are skipped.
+    """
+    cleaned_batches = buffered(
+        clean_record_batches(iter_json_records(input_path), workers, batch_size),
+        maxsize=queue_size,
+        name="clean",
+    )
+    with ExitStack() as stack:
+        cleaned_file = stack.enter_context(open(cleaned_output, 'w')) if cleaned_output else None
+        prepared_file = stack.enter_context(open(prepared_output, 'w')) if prepared_output else None
+        for cleaned_batch in cleaned_batches:
+            for record in cleaned_batch:
+                if cleaned_file:
+                    cleaned_file.write(json.dumps(record) + '\n')
+                prepared = prepare_record(record)
+                if prepared_file:
+                    prepared_file.write(json.dumps(prepared) + '\n')
+                document = Document(page_content=prepared['text'], metadata=prepared['metadata'])
+                if deduplicator and not deduplicator.add(document):
+                    continue
+                yield document
+
+
+def iter_chunks(documents, text_splitter, chunk_ids):
+    """
+    Splits documents one at a time and yields (chunk, chunk_id) pairs,
+    skipping exact duplicates. Every chunk ID seen is added to chunk_ids.
+    """
+    for document in documents:
+        for chunk in text_splitter.split_documents([document]):
+            chunk_id = compute_chunk_id(chunk)
+            if chunk_id in chunk_ids:
+                continue
+            chunk_ids.add(chunk_id)
+            yield chunk, chunk_id
+
+
+def run_ingest_pipeline(input_path, persist_dir, markdown_path=DATA_PATH, workers=None, batch_size=500,
+                        embed_batch_size=EMBED_BATCH_SIZE, queue_size=8, embed_workers=None, embed_threads=None, cleaned_output=None, prepared_output=None,
+                        incremental=False, markdown_loader=MARKDOWN_LOADER, chunker=CHUNKER, dedup_threshold=None,
+                        use_embedding_cache=True, index_spec=FAISS_INDEX_SPEC, train_size=FAISS_TRAIN_SIZE):
+    """
+    Builds the FAISS index from the markdown guides and a raw ServiceNow export
+    in a single pass. Cleaning, text assembly, chunking and embedding run as
+    generator stages connected by bounded queues, so they overlap in time and
+    no intermediate files are needed. Chunks are embedded with the bulk
+    embedding engine, length-bucketed within windows of queue_size batches.
+    With a dedup_threshold, near-duplicate tickets are dropped before chunking.
+    The index is built flat and then converted to index_spec. Incremental
+    updates delete stale chunks in place, so they need a flat index; other
+    specs are rebuilt in full.
+    """
+    start = time.perf_counter()
+    embeddings = get_embedding_model(use_cache=use_embedding_cache)
+    manifest_path = os.path.join(persist_dir, MANIFEST_FILENAME)
+
+    vector_store = None
+    indexed_ids = set()
+    if incremental:
+        manifest = load_manifest(manifest_path)
+        built_spec = load_index_spec(persist_dir)
+        if manifest is not None and built_spec != index_spec:
+            logger.info(f"Index was built as '{built_spec}', requested '{index_spec}'.")
+        elif manifest is not None and not supports_removal(built_spec):
+            # Stale chunks are only known after the pass, so assume some will have to go
+            logger.info(f"Chunks cannot be deleted from a '{built_spec}' index in place.")
+        elif is_manifest_compatible(manifest, EMBEDDING_MODEL, "faiss"):
+            vector_store = load_faiss_store(persist_dir, embeddings)
+            indexed_ids = set(manifest["chunk_ids"])
+        if vector_store is None:
+            logger.info("Falling back to a full build.")
+
+    deduplicator = TicketDeduplicator(threshold=dedup_threshold) if dedup_threshold is not None else None
+
+    def iter_documents():
+        yield from load_markdown_documents(markdown_path, loader=markdown_loader)
+        if input_path:
+            yield from iter_servicenow_documents(
+                input_path, workers, batch_size, queue_size, cleaned_output, prepared_output, deduplicator
+            )
+
+    chunk_ids = set()
+    new_chunks = (
+        (chunk, chunk_id)
+        for chunk, chunk_id in iter_chunks(iter_documents(), get_text_splitter(chunker), chunk_ids)
+        if chunk_id not in indexed_ids
+    )
+    windows = (
+        [(chunk.page_content, (chunk, chunk_id)) for chunk, chunk_id in window]
+        for window in iter_batches(buffered(new_chunks, maxsize=queue_size * embed_batch_size, name="chunk"),
+                                   queue_size * embed_batch_size)
+    )
+    cache = embeddings if isinstance(embeddings, CachedEmbeddings) else None
+    embedded_batches = buffered(
+        iter_windowed_embeddings(windows, embed_workers, embed_threads, embed_batch_size, cache),
+        maxsize=queue_size,
+        name="embed",
+    )
+
+    rebuilt = vector_store is None
+    embedded = 0
+    for batch, vectors in embedded_batches:
+        text_embeddings = [(chunk.page_content, vector.tolist()) for (chunk, _), vector in zip(batch, vectors)]
+        metadatas = [chunk.metadata for chunk, _ in batch]
+        ids = [chunk_id for _, chunk_id in batch]
+        if vector_store is None:
+            vector_store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+        else:
+            vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        embedded += len(batch)
+        logger.info(f"Embedded {embedded} chunks...")
+
+    stale_ids = sorted(indexed_ids - chunk_ids)
+    if stale_ids:
+        logger.info(f"Deleting {len(stale_ids)} stale chunks from the index.")
+        vector_store.delete(stale_ids)
+
+    if vector_store is None:
+        logger.warning("No documents were found to index.")
+        return
+
+    if deduplicator:
+        deduplicator.log_summary()
+    # Duplicate lists are only known once the whole export has been read
+    apply_duplicate_metadata(vector_store, deduplicator.duplicates if deduplicator else {})
+
+    if rebuilt:
+        apply_index_spec(vector_store, index_spec, train_size)
+    logger.info(f"Saving FAISS index to '{persist_dir}'...")
+    save_faiss_store(vector_store, persist_dir)
+    save_index_spec(persist_dir, index_spec, train_size)
+    save_manifest(manifest_path, chunk_ids, EMBEDDING_MODEL, "faiss")
+
+    log_embedding_cache_stats(embeddings)
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Ingest finished in {elapsed:.1f}s: {len(chunk_ids)} chunks in the index, "
+        f"{embedded} embedded ({embedded / elapsed:.1f} chunks/sec), {len(stale_ids)} deleted."
+    )
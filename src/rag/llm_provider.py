@@ -2,7 +2,10 @@ from abc import ABC, abstractmethod
 from langchain_huggingface import HuggingFaceEndpoint
 from langchain_huggingface.chat_models import ChatHuggingFace
 from langchain_community.llms import LlamaCpp
-from src.rag.config import HF_API_TOKEN, HF_MODEL_NAME, LLAMA_CPP_MODEL_PATH
+from src.rag.config import (
+    HF_API_TOKEN, HF_CONTEXT_WINDOW, HF_MODEL_NAME, LLAMA_CPP_MODEL_PATH, LLAMA_CPP_N_BATCH, LLAMA_CPP_N_CTX,
+    LLAMA_CPP_PARALLEL, LLM_MAX_NEW_TOKENS,
+)
 from src.rag.logger import get_logger
 
 logger = get_logger(__name__)
@@ -13,16 +16,30 @@ class LLMProvider(ABC):
     Abstract base class for LLM providers.
     """
 
+    # Tokens the model can attend to, prompt and answer together
+    context_window = None
+    # Whether the LLM can serve several requests from different threads at once
+    thread_safe = True
+
     @abstractmethod
     def get_llm(self):
         pass
 
+    def get_token_counter(self, llm):
+        """
+        Returns a function counting the tokens of a text with the LLM's
+        tokenizer.
+        """
+        return llm.get_num_tokens
+
 
 class HuggingFaceAPIProvider(LLMProvider):
     """
     LLM provider for the Hugging Face API.
     """
 
+    context_window = HF_CONTEXT_WINDOW
+
     def __init__(self, api_token=HF_API_TOKEN, model_name=HF_MODEL_NAME):
         if not api_token:
             raise ValueError("Hugging Face API token is required.")
@@ -41,30 +58,64 @@ class HuggingFaceAPIProvider(LLMProvider):
             repo_id=self.model_name,
             huggingfacehub_api_token=self.api_token,
             temperature=0.1,
-            max_new_tokens=512,
+            max_new_tokens=LLM_MAX_NEW_TOKENS,
         )
         return ChatHuggingFace(llm=llm)
 
+    def get_token_counter(self, llm):
+        """
+        Counts tokens with the model's tokenizer if ChatHuggingFace could
+        load it, and LangChain's approximation otherwise.
+        """
+        tokenizer = getattr(llm, "tokenizer", None)
+        if tokenizer is None:
+            return llm.get_num_tokens
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
 
 class LlamaCPPProvider(LLMProvider):
     """
-    LLM provider for a local Llama.cpp model.
+    LLM provider for a local Llama.cpp model. With parallel above 1,
+    concurrent requests are decoded together by a GenerationScheduler.
     """
 
-    def __init__(self, model_path=LLAMA_CPP_MODEL_PATH):
+    context_window = LLAMA_CPP_N_CTX
+
+    def __init__(self, model_path=LLAMA_CPP_MODEL_PATH, parallel=LLAMA_CPP_PARALLEL):
         self.model_path = model_path
+        if parallel > 1:
+            from src.rag.generation_scheduler import missing_llama_cpp_api
+
+            missing = missing_llama_cpp_api()
+            if missing:
+                logger.warning(
+                    f"This llama-cpp-python lacks {', '.join(missing)}, which batched generation needs; "
+                    f"answering one request at a time instead."
+                )
+                parallel = 1
+        self.parallel = parallel
+        # One llama.cpp context holds the state of a single generation, unless
+        # the scheduler gives each request its own sequence
+        self.thread_safe = parallel > 1
         logger.info(f"Initialized LlamaCPPProvider with model: {self.model_path}")
 
     def get_llm(self):
         """
         Returns the Llama.cpp LLM instance.
         """
+        if self.parallel > 1:
+            from src.rag.generation_scheduler import BatchedLlamaCpp, GenerationScheduler
+
+            logger.info(f"Creating batched Llama.cpp LLM for {self.parallel} concurrent requests.")
+            return BatchedLlamaCpp(scheduler=GenerationScheduler(self.model_path, max_sequences=self.parallel))
+
         logger.info("Creating Llama.cpp LLM instance.")
         llm = LlamaCpp(
             model_path=self.model_path,
             n_gpu_layers=-1,  # Offload all layers to GPU
-            n_batch=512,
-            n_ctx=2048,
+            n_batch=LLAMA_CPP_N_BATCH,
+            n_ctx=self.context_window,
+            max_tokens=LLM_MAX_NEW_TOKENS,
             f16_kv=True,  # Use half-precision for KV cache
             verbose=True,
         )
@@ -0,0 +1,88 @@
+import socket
+from src.rag.streaming import CHAT_PAGE_HTML, SSE_HEADERS, StreamingStats, sse_answer_events, timed_stream
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def format_prompt(prompt):
+    return f"<|user|>\n{prompt}<|end|>\n<|assistant|>"
+
+
+def iter_answer(llm, prompt, max_tokens=1024):
+    """
+    Yields the text of the answer a llama_cpp.Llama model gives to prompt,
+    without retrieval, as it is generated.
+    """
+    for chunk in llm(format_prompt(prompt), max_tokens=max_tokens, stop=["<|end|>"], echo=False, stream=True):
+        yield chunk['choices'][0]['text']
+
+
+def start_cli_chat(llm):
+    """
+    Starts an interactive command-line chat session. Answers are printed as
+    they are generated.
+    """
+    print("Starting CLI chat with Phi-3. Type 'exit' or 'quit' to end.")
+
+    while True:
+        try:
+            prompt = input("You: ")
+            if prompt.lower() in ["exit", "quit"]:
+                break
+
+            print("Assistant: ", end="", flush=True)
+            started = False
+            for text in timed_stream(iter_answer(llm, prompt)):
+                if not started:
+                    text = text.lstrip()
+                    started = bool(text)
+                print(text, end="", flush=True)
+            print()
+
+        except KeyboardInterrupt:
+            break
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            break
+    print("\nChat ended.")
+
+
+def create_web_app(llm):
+    """
+    Creates the Flask app of the local chat: the chat page at /, /chat for
+    whole answers and /chat/stream streaming them as Server-Sent Events.
+    """
+    from flask import Flask, Response, jsonify, render_template_string, request, stream_with_context
+
+    app = Flask(__name__)
+    streaming_stats = StreamingStats()
+
+    @app.route("/")
+    def home():
+        return render_template_string(CHAT_PAGE_HTML)
+
+    @app.route("/chat", methods=["POST"])
+    def chat():
+        user_message = request.json["message"]
+        return jsonify({"response": "".join(iter_answer(llm, user_message)).strip()})
+
+    @app.route("/chat/stream", methods=["POST"])
+    def chat_stream():
+        events = sse_answer_events(iter_answer(llm, request.json["message"]), streaming_stats)
+        return Response(stream_with_context(events), mimetype="text/event-stream", headers=SSE_HEADERS)
+
+    @app.route("/stats")
+    def stats():
+        return jsonify({"streaming": streaming_stats.stats()}), 200
+
+    return app
+
+
+def start_web_chat(llm, host="0.0.0.0", port=5000):
+    """
+    Starts the web-based chat interface.
+    """
+    node = socket.getfqdn() or "localhost"
+    print(f"Starting web server at http://{host}:{port} (node: {node})", flush=True)
+    create_web_app(llm).run(host=host, port=port)
@@ -7,6 +7,7 @@ import streamlit as st
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
 from src.rag.rag_pipeline import create_rag_chain
+from src.rag.streaming import timed_stream
 from src.rag.logger import get_logger
 
 logger = get_logger(__name__)
@@ -66,13 +67,9 @@ if prompt := st.chat_input("What is your question?"):
     st.session_state.messages.append({"role": "user", "content": prompt})
 
     try:
-        # Get the answer from the RAG chain
-        with st.spinner("Thinking..."):
-            answer = rag_chain.invoke(prompt)
-        
-        # Display assistant response in chat message container
+        # Stream the answer from the RAG chain into the assistant message
         with st.chat_message("assistant"):
-            st.markdown(answer)
+            answer = st.write_stream(timed_stream(rag_chain.stream(prompt)))
         # Add assistant response to chat history
         st.session_state.messages.append({"role": "assistant", "content": answer})
 
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timezone
+from src.rag.dedup import DUPLICATES_KEY
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def compute_chunk_id(document):
+    """
+    Returns a stable content hash for a chunk, covering its text and metadata.
+    The duplicate incident numbers are left out: the staged build knows them
+    before hashing but the streaming ingest only after, and both must agree.
+    """
+    metadata = {key: value for key, value in document.metadata.items() if key != DUPLICATES_KEY}
+    payload = json.dumps(
+        {"text": document.page_content, "metadata": metadata},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def qdrant_point_id(chunk_id):
+    """
+    Qdrant only accepts integers or UUIDs as point IDs, so the chunk hash is
+    folded into a deterministic UUID.
+    """
+    return str(uuid.UUID(hex=chunk_id[:32]))
+
+
+def assign_chunk_ids(documents):
+    """
+    Computes chunk IDs for the documents and drops exact duplicates, which
+    would otherwise collide in the docstore.
+    Returns the unique documents and their IDs in the original order.
+    """
+    unique_documents = []
+    chunk_ids = []
+    seen = set()
+    for document in documents:
+        chunk_id = compute_chunk_id(document)
+        if chunk_id in seen:
+            continue
+        seen.add(chunk_id)
+        unique_documents.append(document)
+        chunk_ids.append(chunk_id)
+
+    duplicates = len(documents) - len(unique_documents)
+    if duplicates:
+        logger.info(f"Skipped {duplicates} duplicate chunks.")
+    return unique_documents, chunk_ids
+
+
+def load_manifest(manifest_path):
+    """
+    Loads the chunk manifest stored next to an index, or returns None if it
+    does not exist or cannot be read.
+    """
+    if not os.path.exists(manifest_path):
+        logger.info(f"No manifest found at '{manifest_path}'.")
+        return None
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (IOError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not read manifest at '{manifest_path}': {e}")
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        logger.warning(f"Ignoring manifest with unsupported version: {manifest.get('version')}")
+        return None
+    return manifest
+
+
+def save_manifest(manifest_path, chunk_ids, embedding_model, vector_store_type):
+    """
+    Writes the chunk manifest for an index. The file is replaced atomically so
+    an interrupted build never leaves a half-written manifest behind.
+    """
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "embedding_model": embedding_model,
+        "vector_store": vector_store_type,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "chunk_ids": sorted(chunk_ids),
+    }
+    manifest_dir = os.path.dirname(manifest_path)
+    if manifest_dir:
+        os.makedirs(manifest_dir, exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+    logger.info(f"Saved manifest with {len(chunk_ids)} chunks to '{manifest_path}'.")
+
+
+def index_version(manifest_path):
+    """
+    Identifies the build of an index from its manifest: the embedding model
+    and the time it was last written. Returns None without a manifest.
+    """
+    manifest = load_manifest(manifest_path)
+    if manifest is None:
+        return None
+    return f"{manifest.get('embedding_model')}@{manifest.get('updated_at')}"
+
+
+def is_manifest_compatible(manifest, embedding_model, vector_store_type):
+    """
+    Checks whether an existing manifest can be used for an incremental update.
+    A different embedding model or store type means every vector is stale.
+    """
+    if manifest is None:
+        return False
+    if manifest.get("embedding_model") != embedding_model:
+        logger.info(
+            f"Manifest was built with '{manifest.get('embedding_model')}', "
+            f"current model is '{embedding_model}'."
+        )
+        return False
+    if manifest.get("vector_store") != vector_store_type:
+        logger.info(
+            f"Manifest was built for '{manifest.get('vector_store')}', "
+            f"current store is '{vector_store_type}'."
+        )
+        return False
+    return True
+
+
+def diff_chunks(manifest, documents, chunk_ids):
+    """
+    Compares the current chunks against a manifest.
+    Returns the documents and IDs that need embedding, and the IDs of stale
+    chunks that should be deleted from the store.
+    """
+    indexed_ids = set(manifest.get("chunk_ids", []))
+    current_ids = set(chunk_ids)
+
+    new_documents = []
+    new_ids = []
+    for document, chunk_id in zip(documents, chunk_ids):
+        if chunk_id not in indexed_ids:
+            new_documents.append(document)
+            new_ids.append(chunk_id)
+    stale_ids = sorted(indexed_ids - current_ids)
+
+    logger.info(
+        f"Manifest diff: {len(new_ids)} new or changed chunks, {len(stale_ids)} stale chunks, "
+        f"{len(current_ids) - len(new_ids)} unchanged."
+    )
+    return new_documents, new_ids, stale_ids
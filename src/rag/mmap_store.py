@@ -0,0 +1,251 @@
+import json
+import os
+import shutil
+from collections.abc import Mapping
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+from src.rag.partitions import partition_of
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+DOCSTORE_DIRNAME = "docstore"
+DOCSTORE_FORMAT_FILE = "format.json"
+DOCSTORE_FORMAT_VERSION = 3
+TEXTS_FILENAME = "texts.arrow"
+METADATA_FILENAME = "metadata.arrow"
+# Schema metadata key listing the columns stored as JSON strings
+_JSON_COLUMNS_KEY = b"json_columns"
+
+
+def _metadata_column(values):
+    """
+    Returns an Arrow array for one metadata key, and whether its values had
+    to be stored as JSON because they have no single Arrow type (mixed types
+    across chunks, or nested dicts, which Arrow would pad with null fields).
+    """
+    if not any(isinstance(value, dict) for value in values):
+        try:
+            return pa.array(values), False
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+    encoded = [json.dumps(value, default=str) if value is not None else None for value in values]
+    return pa.array(encoded, type=pa.large_string()), True
+
+
+def _metadata_table(documents):
+    """
+    Builds a table with one column per metadata key. Chunks without a key
+    hold a null in its column.
+    """
+    keys = {}
+    for document in documents:
+        keys.update(dict.fromkeys(document.metadata))
+    columns = {}
+    json_columns = []
+    for key in keys:
+        column, is_json = _metadata_column([document.metadata.get(key) for document in documents])
+        columns[key] = column
+        if is_json:
+            json_columns.append(key)
+    table = pa.table(columns) if columns else pa.table({})
+    return table.replace_schema_metadata({_JSON_COLUMNS_KEY: json.dumps(json_columns)})
+
+
+def _write_table(path, table):
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_table(path, mmap):
+    """
+    Reads an Arrow IPC file. With mmap, the columns point into the memory
+    mapped file, so nothing is copied until a value is accessed.
+    """
+    source = pa.memory_map(path, 'r') if mmap else pa.OSFile(path, 'rb')
+    with source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def write_docstore(vector_store, persist_dir):
+    """
+    Writes the documents of a FAISS store as columnar files: chunk texts as
+    a single Arrow string column (one contiguous UTF-8 buffer plus offsets),
+    metadata as one Arrow column per key, chunk IDs as fixed-width arrays in
+    index order and in sorted order for lookups, and the partition of every
+    chunk as an array of codes into the partition names. The directory is
+    replaced as a whole, so readers never see a partially written docstore.
+    """
+    count = vector_store.index.ntotal
+    ids = [vector_store.index_to_docstore_id[i] for i in range(count)]
+    documents = [vector_store.docstore.search(chunk_id) for chunk_id in ids]
+
+    docstore_dir = os.path.join(persist_dir, DOCSTORE_DIRNAME)
+    tmp_dir = f"{docstore_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    texts = pa.array([document.page_content for document in documents], type=pa.large_string())
+    _write_table(os.path.join(tmp_dir, TEXTS_FILENAME), pa.table({"text": texts}))
+    _write_table(os.path.join(tmp_dir, METADATA_FILENAME), _metadata_table(documents))
+    id_array = np.array([chunk_id.encode("utf-8") for chunk_id in ids], dtype=bytes)
+    order = np.argsort(id_array, kind="stable")
+    np.save(os.path.join(tmp_dir, "ids.npy"), id_array)
+    np.save(os.path.join(tmp_dir, "ids_sorted.npy"), id_array[order])
+    np.save(os.path.join(tmp_dir, "ids_sorted_positions.npy"), order.astype(np.int64))
+    labels = [partition_of(document.metadata) for document in documents]
+    partition_names = sorted(set(labels))
+    codes = {name: code for code, name in enumerate(partition_names)}
+    np.save(os.path.join(tmp_dir, "partitions.npy"), np.array([codes[label] for label in labels], dtype=np.int16))
+    with open(os.path.join(tmp_dir, DOCSTORE_FORMAT_FILE), 'w') as f:
+        json.dump({"version": DOCSTORE_FORMAT_VERSION, "count": count, "partitions": partition_names}, f)
+
+    old_dir = f"{docstore_dir}.old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(docstore_dir):
+        os.replace(docstore_dir, old_dir)
+    os.replace(tmp_dir, docstore_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    logger.info(f"Wrote columnar docstore with {count} documents to '{docstore_dir}'.")
+
+
+def has_docstore(persist_dir, count=None):
+    """
+    Whether persist_dir has a columnar docstore of a supported version,
+    holding count documents if given.
+    """
+    path = os.path.join(persist_dir, DOCSTORE_DIRNAME, DOCSTORE_FORMAT_FILE)
+    if not os.path.exists(path):
+        return False
+    with open(path, 'r') as f:
+        docstore_format = json.load(f)
+    if docstore_format.get("version") != DOCSTORE_FORMAT_VERSION:
+        return False
+    return count is None or docstore_format.get("count") == count
+
+
+class PositionIds(Mapping):
+    """
+    Read-only stand-in for FAISS.index_to_docstore_id over an ID array.
+    """
+
+    def __init__(self, ids):
+        self._ids = ids
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self._ids):
+            raise KeyError(position)
+        return self._ids[position].decode("utf-8")
+
+    def __iter__(self):
+        return iter(range(len(self._ids)))
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class ColumnarDocstore(Docstore):
+    """
+    Read-only docstore over the columnar files written by write_docstore.
+    Chunks are kept as Arrow buffers rather than one Document per chunk;
+    Documents are only built for the hits a search returns. With mmap, the
+    buffers are memory-mapped, so nothing is read at startup and processes
+    serving the same index share its memory.
+    """
+
+    def __init__(self, persist_dir, mmap=True):
+        docstore_dir = os.path.join(persist_dir, DOCSTORE_DIRNAME)
+        mmap_mode = 'r' if mmap else None
+        self.ids = np.load(os.path.join(docstore_dir, "ids.npy"), mmap_mode=mmap_mode)
+        self._sorted_ids = np.load(os.path.join(docstore_dir, "ids_sorted.npy"), mmap_mode=mmap_mode)
+        self._sorted_positions = np.load(os.path.join(docstore_dir, "ids_sorted_positions.npy"), mmap_mode=mmap_mode)
+        self.partitions = np.load(os.path.join(docstore_dir, "partitions.npy"), mmap_mode=mmap_mode)
+        with open(os.path.join(docstore_dir, DOCSTORE_FORMAT_FILE), 'r') as f:
+            self.partition_names = json.load(f)["partitions"]
+        self._texts = _read_table(os.path.join(docstore_dir, TEXTS_FILENAME), mmap).column("text")
+        metadata = _read_table(os.path.join(docstore_dir, METADATA_FILENAME), mmap)
+        json_columns = set(json.loads((metadata.schema.metadata or {}).get(_JSON_COLUMNS_KEY, b"[]")))
+        self._metadata = {
+            name: (metadata.column(name), name in json_columns) for name in metadata.column_names
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    def position(self, chunk_id):
+        """
+        Returns the index position of a chunk ID, or None.
+        """
+        key = chunk_id.encode("utf-8")
+        i = int(np.searchsorted(self._sorted_ids, key))
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == key:
+            return int(self._sorted_positions[i])
+        return None
+
+    def document_at(self, position):
+        """
+        Builds the document stored at an index position.
+        """
+        metadata = {}
+        for name, (column, is_json) in self._metadata.items():
+            value = column[position].as_py()
+            if value is not None:
+                metadata[name] = json.loads(value) if is_json else value
+        return Document(
+            id=self.ids[position].decode("utf-8"),
+            page_content=self._texts[position].as_py(),
+            metadata=metadata,
+        )
+
+    def partition_mask(self, name):
+        """
+        Returns a boolean array marking the positions in a partition.
+        """
+        if name not in self.partition_names:
+            return np.zeros(len(self), dtype=bool)
+        return np.asarray(self.partitions) == self.partition_names.index(name)
+
+    def filter_mask(self, metadata_filter):
+        """
+        Returns a boolean array marking the positions whose metadata matches a
+        LangChain-style filter: a dict of keys to a value, or to a list of
+        accepted values. Evaluated column by column with Arrow compute.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for key, value in metadata_filter.items():
+            if key not in self._metadata:
+                return np.zeros(len(self), dtype=bool)
+            column, is_json = self._metadata[key]
+            if is_json:
+                raise ValueError(f"Metadata key '{key}' holds mixed types and cannot be filtered on.")
+            values = value if isinstance(value, list) else [value]
+            try:
+                matches = pc.is_in(column, value_set=pa.array(values, type=column.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                # Values of another type than the column never match
+                return np.zeros(len(self), dtype=bool)
+            mask &= pc.fill_null(matches, False).to_numpy(zero_copy_only=False)
+        return mask
+
+    def search(self, search):
+        position = self.position(search)
+        if position is None:
+            return f"ID {search} not found."
+        return self.document_at(position)
+
+
+def load_docstore(persist_dir):
+    """
+    Reads a columnar docstore into an InMemoryDocstore, for builds that
+    modify the store. Returns the docstore and the index_to_docstore_id
+    mapping.
+    """
+    docstore = ColumnarDocstore(persist_dir, mmap=False)
+    documents = [docstore.document_at(i) for i in range(len(docstore))]
+    index_to_docstore_id = {i: document.id for i, document in enumerate(documents)}
+    return InMemoryDocstore({document.id: document for document in documents}), index_to_docstore_id
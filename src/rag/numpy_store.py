@@ -0,0 +1,214 @@
+import json
+import os
+import time
+import uuid
+from typing import Any, Iterable, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from src.rag.bulk_embed import iter_bulk_embeddings
+from src.rag.config import EMBED_BATCH_SIZE, NUMPY_STORE_DTYPE
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+VECTORS_FILENAME = "vectors.npy"
+DOCUMENTS_FILENAME = "documents.json"
+# float16 matrices are multiplied in float32 blocks of this many rows, since
+# NumPy has no BLAS kernel for float16
+_FLOAT16_BLOCK_ROWS = 16384
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _matches(metadata, metadata_filter):
+    return all(
+        metadata.get(key) in value if isinstance(value, list) else metadata.get(key) == value
+        for key, value in metadata_filter.items()
+    )
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store for small corpora. Normalized embeddings are
+    kept in one contiguous float32 or float16 matrix and a batch of queries
+    is answered with a single matrix product and argpartition, so scores are
+    cosine similarities and results are exact. Needs nothing beyond NumPy.
+    """
+
+    def __init__(self, embedding: Embeddings, vectors=None, texts=None, metadatas=None, ids=None,
+                 dtype=NUMPY_STORE_DTYPE):
+        self.embedding = embedding
+        self.dtype = np.dtype(dtype)
+        self.vectors = np.ascontiguousarray(vectors, dtype=self.dtype) if vectors is not None else None
+        self.texts = list(texts or [])
+        self.metadatas = list(metadatas or [{} for _ in self.texts])
+        self.ids = list(ids or [str(uuid.uuid4()) for _ in self.texts])
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_vectors(self, vectors, texts, metadatas=None, ids=None):
+        """
+        Appends precomputed embeddings. The matrix is reallocated, which is
+        fine for the corpus sizes this store is meant for.
+        """
+        vectors = _normalize(vectors).astype(self.dtype)
+        self.vectors = vectors if self.vectors is None else np.concatenate([self.vectors, vectors])
+        ids = list(ids or [str(uuid.uuid4()) for _ in texts])
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas or [{} for _ in texts])
+        self.ids.extend(ids)
+        return ids
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[list[dict]] = None, *,
+                  ids: Optional[list[str]] = None, **kwargs: Any) -> list[str]:
+        texts = list(texts)
+        return self.add_vectors(self.embedding.embed_documents(texts), texts, metadatas, ids)
+
+    def delete(self, ids: Optional[list[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        removed = set(ids)
+        keep = [i for i, chunk_id in enumerate(self.ids) if chunk_id not in removed]
+        self.vectors = np.ascontiguousarray(self.vectors[keep]) if self.vectors is not None else None
+        self.texts = [self.texts[i] for i in keep]
+        self.metadatas = [self.metadatas[i] for i in keep]
+        self.ids = [self.ids[i] for i in keep]
+        return True
+
+    def _scores(self, queries):
+        if self.dtype == np.float32:
+            return queries @ self.vectors.T
+        scores = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), _FLOAT16_BLOCK_ROWS):
+            block = self.vectors[start:start + _FLOAT16_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        return scores
+
+    def search_vectors(self, queries, k, mask=None):
+        """
+        Returns the cosine similarities and positions of the k nearest stored
+        vectors for each row of queries, best first, as two (len(queries), k)
+        arrays. mask restricts the search to the positions set in it; missing
+        results have position -1.
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        k_found = min(k, len(self))
+        if k_found == 0:
+            return np.zeros((len(queries), 0), dtype=np.float32), np.zeros((len(queries), 0), dtype=np.int64)
+        scores = self._scores(queries)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        if k_found < len(self):
+            top = np.argpartition(-scores, k_found - 1, axis=1)[:, :k_found]
+        else:
+            top = np.broadcast_to(np.arange(len(self)), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        positions = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        positions = np.where(np.isneginf(top_scores), -1, positions)
+        return top_scores, positions
+
+    def _document(self, position):
+        return Document(id=self.ids[position], page_content=self.texts[position], metadata=self.metadatas[position])
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        mask = None
+        if filter:
+            mask = np.array([_matches(metadata, filter) for metadata in self.metadatas], dtype=bool)
+        scores, positions = self.search_vectors(embedding, k, mask)
+        return [
+            (self._document(int(position)), float(score))
+            for score, position in zip(scores[0], positions[0]) if position >= 0
+        ]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [document for document, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[Document]:
+        return [document for document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def batch_similarity_search(self, queries, k=4):
+        """
+        Embeds and searches several queries with one matrix product.
+        """
+        scores, positions = self.search_vectors(self.embedding.embed_documents(list(queries)), k)
+        return [[self._document(int(position)) for position in row if position >= 0] for row in positions]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(cls, texts: list[str], embedding: Embeddings, metadatas: Optional[list[dict]] = None, *,
+                   ids: Optional[list[str]] = None, **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def save(self, persist_dir):
+        """
+        Saves the matrix as a .npy file and the documents as JSON.
+        """
+        os.makedirs(persist_dir, exist_ok=True)
+        vectors = self.vectors if self.vectors is not None else np.zeros((0, 0), dtype=self.dtype)
+        np.save(os.path.join(persist_dir, VECTORS_FILENAME), vectors)
+        with open(os.path.join(persist_dir, DOCUMENTS_FILENAME), 'w') as f:
+            json.dump({"ids": self.ids, "texts": self.texts, "metadatas": self.metadatas}, f)
+        logger.info(f"Saved {len(self)} vectors to '{persist_dir}'.")
+
+    @classmethod
+    def load(cls, persist_dir, embedding, mmap=False):
+        """
+        Loads a store written by save. With mmap, the matrix is memory-mapped
+        read-only instead of read into memory.
+        """
+        vectors = np.load(os.path.join(persist_dir, VECTORS_FILENAME), mmap_mode='r' if mmap else None)
+        with open(os.path.join(persist_dir, DOCUMENTS_FILENAME), 'r') as f:
+            documents = json.load(f)
+        store = cls(embedding, dtype=vectors.dtype)
+        # Keep the (possibly memory-mapped) array instead of copying it
+        store.vectors = vectors if len(vectors) else None
+        store.texts, store.metadatas, store.ids = documents["texts"], documents["metadatas"], documents["ids"]
+        logger.info(f"Loaded {len(store)} {vectors.dtype} vectors from '{persist_dir}'.")
+        return store
+
+
+def embed_into_numpy(documents, ids, embeddings, vector_store=None, workers=None, threads_per_worker=None,
+                     batch_size=EMBED_BATCH_SIZE, dtype=NUMPY_STORE_DTYPE):
+    """
+    Embeds documents with the bulk embedding engine into a NumpyVectorStore,
+    keeping the documents' order. A new store is created unless an existing
+    one is given. Returns the store, or None if there was nothing to embed.
+    """
+    if not documents:
+        return vector_store
+    start = time.perf_counter()
+    cache = embeddings if isinstance(embeddings, CachedEmbeddings) else None
+    texts = [document.page_content for document in documents]
+    vectors = None
+    for batch, batch_vectors in iter_bulk_embeddings(texts, workers, threads_per_worker, batch_size, cache):
+        if vectors is None:
+            vectors = np.empty((len(texts), batch_vectors.shape[1]), dtype=np.float32)
+        vectors[batch] = batch_vectors
+
+    if vector_store is None:
+        vector_store = NumpyVectorStore(embeddings, dtype=dtype)
+    vector_store.add_vectors(vectors, texts, [document.metadata for document in documents], ids)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Embedded {len(texts)} chunks in {elapsed:.1f}s ({len(texts) / elapsed:.1f} chunks/sec).")
+    return vector_store
@@ -0,0 +1,86 @@
+import json
+import os
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from src.rag.config import EMBEDDING_ONNX_DIR, EMBEDDING_ONNX_QUANTIZED
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+EXPORT_CONFIG_FILE = "export_config.json"
+
+
+def onnx_model_path(model_dir=EMBEDDING_ONNX_DIR, quantized=EMBEDDING_ONNX_QUANTIZED):
+    """
+    Returns the path of the exported fp32 or int8 model in model_dir.
+    """
+    return os.path.join(model_dir, ONNX_QUANTIZED_MODEL_FILE if quantized else ONNX_MODEL_FILE)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Runs an ONNX export of the sentence-transformers embedding model through
+    onnxruntime, with the same mean pooling and L2 normalization, so vectors
+    can be searched against an index built with the PyTorch model.
+    Only onnxruntime and tokenizers are imported, not torch.
+    Export the model first with scripts/rag/export_onnx_model.py.
+    """
+
+    def __init__(self, model_dir=EMBEDDING_ONNX_DIR, quantized=EMBEDDING_ONNX_QUANTIZED, threads=None, batch_size=32):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_path = onnx_model_path(model_dir, quantized)
+        logger.info(f"Loading ONNX embedding model: {model_path}")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.batch_size = batch_size
+
+        with open(os.path.join(model_dir, EXPORT_CONFIG_FILE), 'r') as f:
+            self.export_config = json.load(f)
+        self.dimension = self.export_config["dimension"]
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.export_config["max_seq_length"])
+        pad_token = self.export_config["pad_token"]
+        self.tokenizer.enable_padding(pad_id=self.tokenizer.token_to_id(pad_token), pad_token=pad_token)
+
+    def encode(self, texts):
+        """
+        Embeds texts and returns a float32 array of normalized vectors.
+        Texts are processed in batches of similar length to limit padding.
+        """
+        # Same preprocessing as HuggingFaceEmbeddings.embed_documents
+        texts = [text.replace("\n", " ") for text in texts]
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors[batch] = self._encode_batch([texts[i] for i in batch])
+        return vectors
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Mean pooling over real tokens, then L2 normalization, as in the sentence-transformers pipeline
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode([text])[0].tolist()
@@ -0,0 +1,76 @@
+import numpy as np
+from src.rag.config import PARTITION_BY_DATE
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+GUIDES_PARTITION = "guides"
+TICKETS_PARTITION = "tickets"
+
+
+def partition_of(metadata, by_date=PARTITION_BY_DATE):
+    """
+    Returns the partition a chunk belongs to: ServiceNow tickets, which carry
+    an incident number, or markdown guides. With by_date, tickets are further
+    split by the year they were opened in, e.g. "tickets-2024".
+    """
+    if "incident_number" not in metadata:
+        return GUIDES_PARTITION
+    opened_at = str(metadata.get("opened_at") or "")
+    if by_date and opened_at[:4].isdigit():
+        return f"{TICKETS_PARTITION}-{opened_at[:4]}"
+    return TICKETS_PARTITION
+
+
+def parse_quotas(text):
+    """
+    Parses per-partition quotas such as "guides=3,tickets=2" into a dict.
+    A name ending in "*" covers every partition starting with the rest, so
+    "tickets*=2" applies to each yearly ticket partition.
+    """
+    quotas = {}
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        name, _, quota = item.partition("=")
+        if not quota.strip().isdigit():
+            raise ValueError(f"Invalid partition quota '{item}', expected name=count.")
+        quotas[name.strip()] = int(quota)
+    return quotas
+
+
+def expand_quotas(quotas, partition_names):
+    """
+    Resolves wildcard quotas against the partitions of an index. Partitions
+    without a quota are not searched.
+    """
+    expanded = {}
+    for name, quota in quotas.items():
+        if name.endswith("*"):
+            expanded.update({partition: quota for partition in partition_names if partition.startswith(name[:-1])})
+        elif name in partition_names:
+            expanded[name] = quota
+        else:
+            logger.warning(f"The index has no '{name}' partition.")
+    return expanded
+
+
+def selector_params(index, mask):
+    """
+    Returns faiss search parameters that restrict a search to the positions
+    set in a boolean mask, so filtering happens inside the index instead of by
+    over-fetching and discarding. The current nprobe and efSearch of the
+    index are kept. The selector and its bitmap are returned as well and must
+    outlive the search.
+    """
+    import faiss
+
+    bitmap = np.packbits(mask, bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+    keepalive = (selector, bitmap)
+    try:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=faiss.extract_index_ivf(index).nprobe), keepalive
+    except RuntimeError:
+        pass
+    hnsw = getattr(faiss.downcast_index(index), "hnsw", None)
+    if hnsw is not None:
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.efSearch), keepalive
+    return faiss.SearchParameters(sel=selector), keepalive
@@ -0,0 +1,234 @@
+import functools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from langchain_community.vectorstores import Qdrant
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    Distance, FieldCondition, Filter, IsEmptyCondition, MatchAny, PayloadField, PointStruct, VectorParams,
+)
+from src.rag.bulk_embed import iter_bulk_embeddings
+from src.rag.config import (
+    EMBED_BATCH_SIZE,
+    EMBEDDING_BACKEND,
+    EMBEDDING_DIMENSION,
+    EMBEDDING_MODEL_ID,
+    EMBEDDING_ONNX_DIR,
+    QDRANT_CHECKPOINT_PATH,
+    QDRANT_COLLECTION_NAME,
+    QDRANT_GRPC_PORT,
+    QDRANT_HOST,
+    QDRANT_LOCATION,
+    QDRANT_PORT,
+    QDRANT_PREFER_GRPC,
+    QDRANT_UPLOAD_BATCH_SIZE,
+    QDRANT_UPLOAD_PARALLEL,
+)
+from src.rag.dedup import DUPLICATES_KEY, with_duplicates
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.manifest import qdrant_point_id
+from src.rag.query_cache import QueryCachedEmbeddings
+from src.rag.servicenow import iter_batches, map_in_order
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def get_qdrant_client():
+    """
+    Returns the Qdrant client, shared within the process. QDRANT_LOCATION
+    selects qdrant-client's local mode (":memory:" or a directory), which
+    behaves like a server without running one; otherwise the client talks to
+    QDRANT_HOST, over gRPC if QDRANT_PREFER_GRPC is set.
+    """
+    if QDRANT_LOCATION == ":memory:":
+        logger.info("Using an in-memory local Qdrant.")
+        return QdrantClient(location=":memory:")
+    if QDRANT_LOCATION:
+        logger.info(f"Using a local Qdrant stored in '{QDRANT_LOCATION}'.")
+        return QdrantClient(path=QDRANT_LOCATION)
+    logger.info(f"Connecting to Qdrant at {QDRANT_HOST}:{QDRANT_PORT}{' (gRPC)' if QDRANT_PREFER_GRPC else ''}")
+    return QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT, grpc_port=QDRANT_GRPC_PORT, prefer_grpc=QDRANT_PREFER_GRPC)
+
+
+def _sentence_transformers_dimension(model_id):
+    """
+    Reads the output dimension of a sentence-transformers model from its
+    module configs (the pooling layer, or a trailing dense layer), which are
+    small files in the Hub cache, so the model is never loaded.
+    """
+    from huggingface_hub import hf_hub_download
+
+    def read_config(filename):
+        path = os.path.join(model_id, filename) if os.path.isdir(model_id) else hf_hub_download(model_id, filename)
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    dimension = None
+    for module in read_config("modules.json"):
+        if module["type"].endswith("Pooling"):
+            pooling = read_config(f"{module['path']}/config.json")
+            modes = sum(1 for key, value in pooling.items() if key.startswith("pooling_mode_") and value is True)
+            dimension = pooling["word_embedding_dimension"] * max(modes, 1)
+        elif module["type"].endswith("Dense"):
+            dimension = read_config(f"{module['path']}/config.json")["out_features"]
+    return dimension or read_config("config.json")["hidden_size"]
+
+
+def embedding_dimension(embeddings=None):
+    """
+    Returns the dimension of the embedding vectors without running the model:
+    EMBEDDING_DIMENSION if set, else from the loaded model or the model's
+    config files.
+    """
+    if EMBEDDING_DIMENSION:
+        return EMBEDDING_DIMENSION
+    if isinstance(embeddings, QueryCachedEmbeddings):
+        embeddings = embeddings.embeddings
+    # OnnxEmbeddings knows its dimension, HuggingFaceEmbeddings wraps a SentenceTransformer
+    dimension = getattr(embeddings, "dimension", None)
+    model = getattr(embeddings, "_client", None)
+    if not dimension and hasattr(model, "get_sentence_embedding_dimension"):
+        dimension = model.get_sentence_embedding_dimension()
+    if not dimension and EMBEDDING_BACKEND == "onnx":
+        from src.rag.onnx_embeddings import EXPORT_CONFIG_FILE
+        with open(os.path.join(EMBEDDING_ONNX_DIR, EXPORT_CONFIG_FILE), 'r') as f:
+            dimension = json.load(f)["dimension"]
+    if not dimension:
+        dimension = _sentence_transformers_dimension(EMBEDDING_MODEL_ID)
+    logger.info(f"Embedding dimension: {dimension}")
+    return dimension
+
+
+def ensure_collection(client, dimension, collection_name=QDRANT_COLLECTION_NAME):
+    """
+    Creates the collection if it does not exist yet. Returns True if it was
+    created. Raises a ValueError if an existing collection was created for
+    vectors of a different dimension.
+    """
+    if client.collection_exists(collection_name):
+        size = getattr(client.get_collection(collection_name).config.params.vectors, "size", None)
+        if size is not None and size != dimension:
+            raise ValueError(
+                f"Collection '{collection_name}' holds {size}-dimensional vectors, the embedding model "
+                f"produces {dimension}. Delete the collection or use another embedding model."
+            )
+        logger.info(f"Collection '{collection_name}' already exists.")
+        return False
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=VectorParams(size=dimension, distance=Distance.COSINE),
+    )
+    logger.info(f"Collection '{collection_name}' created successfully.")
+    return True
+
+
+def read_checkpoint(checkpoint_path):
+    """
+    Returns the chunk IDs an interrupted upload already wrote to Qdrant.
+    """
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, 'r') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def clear_checkpoint(checkpoint_path):
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+
+def upload_to_qdrant(client, documents, ids, embeddings, collection_name=QDRANT_COLLECTION_NAME,
+                     upload_batch_size=QDRANT_UPLOAD_BATCH_SIZE, parallel=QDRANT_UPLOAD_PARALLEL,
+                     checkpoint_path=QDRANT_CHECKPOINT_PATH, workers=None, threads_per_worker=None,
+                     batch_size=EMBED_BATCH_SIZE):
+    """
+    Embeds documents with the bulk embedding engine and upserts them into a
+    Qdrant collection in batches of upload_batch_size, with up to parallel
+    batches in flight while the next ones are embedded. Points are written
+    in the payload layout of LangChain's Qdrant store.
+    The chunk IDs of every batch Qdrant has acknowledged are appended to
+    checkpoint_path, so an interrupted upload resumes where it stopped. The
+    checkpoint is removed once all documents are uploaded.
+    """
+    start = time.perf_counter()
+    if client.count(collection_name=collection_name, exact=False).count == 0:
+        # The collection was recreated since the checkpoint was written
+        clear_checkpoint(checkpoint_path)
+    uploaded_ids = read_checkpoint(checkpoint_path)
+    todo = [i for i, chunk_id in enumerate(ids) if chunk_id not in uploaded_ids]
+    if len(todo) < len(ids):
+        logger.info(f"Resuming upload: {len(ids) - len(todo)} of {len(ids)} chunks are already in Qdrant.")
+    if not todo:
+        clear_checkpoint(checkpoint_path)
+        return 0
+    if QDRANT_LOCATION and parallel > 1:
+        # The local mode is not thread safe
+        parallel = 1
+
+    cache = embeddings if isinstance(embeddings, CachedEmbeddings) else None
+    texts = [documents[i].page_content for i in todo]
+
+    def iter_points():
+        for batch, vectors in iter_bulk_embeddings(texts, workers, threads_per_worker, batch_size, cache):
+            for i, vector in zip(batch, vectors):
+                document = documents[todo[i]]
+                chunk_id = ids[todo[i]]
+                payload = {Qdrant.CONTENT_KEY: document.page_content, Qdrant.METADATA_KEY: document.metadata}
+                yield chunk_id, PointStruct(id=qdrant_point_id(chunk_id), vector=vector.tolist(), payload=payload)
+
+    def upsert(batch):
+        client.upsert(collection_name=collection_name, points=[point for _, point in batch], wait=True)
+        return [chunk_id for chunk_id, _ in batch]
+
+    if checkpoint_path:
+        os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+    uploaded = 0
+    last_report = start
+    logger.info(f"Uploading {len(todo)} chunks to '{collection_name}' in batches of {upload_batch_size}, "
+                f"{parallel} in parallel.")
+    with ThreadPoolExecutor(max_workers=parallel) as executor, \
+            open(checkpoint_path or os.devnull, 'a') as checkpoint:
+        batches = iter_batches(iter_points(), upload_batch_size)
+        for chunk_ids in map_in_order(executor, upsert, batches, max_pending=parallel * 2):
+            checkpoint.write("".join(f"{chunk_id}\n" for chunk_id in chunk_ids))
+            checkpoint.flush()
+            uploaded += len(chunk_ids)
+            if time.perf_counter() - last_report > 30:
+                last_report = time.perf_counter()
+                logger.info(f"Uploaded {uploaded}/{len(todo)} chunks.")
+
+    clear_checkpoint(checkpoint_path)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Uploaded {uploaded} chunks in {elapsed:.1f}s ({uploaded / elapsed:.1f} chunks/sec).")
+    return uploaded
+
+
+def apply_duplicate_payloads(client, duplicates, collection_name=QDRANT_COLLECTION_NAME, batch_size=256):
+    """
+    Qdrant counterpart of apply_duplicate_metadata: rewrites the metadata of
+    the points of representative tickets, and of points still carrying a
+    duplicate list, to match duplicates. Returns the number of points updated.
+    """
+    metadata_key = Qdrant.METADATA_KEY
+    has_duplicates = Filter(must_not=[IsEmptyCondition(is_empty=PayloadField(key=f"{metadata_key}.{DUPLICATES_KEY}"))])
+    conditions = [has_duplicates]
+    if duplicates:
+        conditions.append(FieldCondition(key=f"{metadata_key}.incident_number", match=MatchAny(any=list(duplicates))))
+
+    updated = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(collection_name=collection_name, scroll_filter=Filter(should=conditions),
+                                       limit=batch_size, offset=offset, with_payload=True, with_vectors=False)
+        for point in points:
+            metadata = point.payload.get(metadata_key) or {}
+            new_metadata = with_duplicates(metadata, duplicates)
+            if new_metadata != metadata:
+                client.set_payload(collection_name=collection_name, payload={metadata_key: new_metadata},
+                                   points=[point.id])
+                updated += 1
+        if offset is None:
+            return updated
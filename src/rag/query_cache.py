@@ -0,0 +1,87 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+from src.rag.config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_query(text):
+    """
+    Lowercases a question and collapses whitespace. all-MiniLM-L6-v2 uses an
+    uncased tokenizer, so this does not change the query vector.
+    """
+    return _WHITESPACE_RE.sub(' ', text).strip().lower()
+
+
+class QueryCachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with a thread-safe, in-memory LRU cache of query
+    vectors, so repeated questions skip the model. Entries older than ttl
+    seconds are recomputed; a ttl of 0 keeps them until they are evicted.
+    Document embeddings are passed straight through.
+    """
+
+    def __init__(self, embeddings, maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.embeddings = embeddings
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (not self.ttl or time.monotonic() - entry[0] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def _put(self, key, vector):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def embed_query(self, text):
+        key = normalize_query(text)
+        vector = self._get(key)
+        if vector is None:
+            # Computed outside the lock so concurrent misses do not serialize on the model
+            vector = self.embeddings.embed_query(key)
+            self._put(key, vector)
+        return list(vector)
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self):
+        """
+        Returns the cache's hit and miss counters.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(
+            f"Query cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate), "
+            f"{stats['size']}/{stats['maxsize']} entries."
+        )
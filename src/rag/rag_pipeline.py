@@ -1,30 +1,78 @@
+import os
+import threading
 from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough, RunnableLambda
+from langchain_core.runnables import RunnableBranch, RunnableGenerator, RunnablePassthrough, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
+from src.rag.answer_cache import SemanticAnswerCache, context_ids
+from src.rag.config import (
+    ANSWER_CACHE, CONTEXT_MIN_TOKENS, CONTEXT_TOKEN_BUDGET, LLM_MAX_NEW_TOKENS, NUMPY_STORE_PATH, QDRANT_MANIFEST_PATH, RERANK,
+    RERANK_CANDIDATES,
+)
+from src.rag.context_packer import ContextPacker
+from src.rag.reranker import CrossEncoderReranker, RerankingRetriever
+from src.rag.manifest import MANIFEST_FILENAME, index_version
 from src.rag.vector_store import get_vector_store, get_embedding_model
 from src.rag.llm_provider import get_llm_provider
 from src.rag.logger import get_logger
 
 logger = get_logger(__name__)
 
-def create_rag_chain(llm_provider_name="huggingface_api", vector_store_type="qdrant", retriever=None):
+QUESTION_TOO_LONG_ANSWER = "Your question is too long for the model's context window. Please shorten it and ask again."
+
+def serialized(llm):
+    """
+    Wraps an LLM so only one request generates at a time, for servers that
+    answer requests on several threads. Tokens are still streamed. The lock
+    is released as soon as the stream is closed, so a cancelled request
+    frees the LLM after its current token.
     """
-    Creates the RAG chain.
+    lock = threading.Lock()
+
+    def generate(prompts):
+        for prompt in prompts:
+            with lock:
+                yield from llm.stream(prompt)
+
+    return RunnableGenerator(generate)
+
+def create_rag_chain(llm_provider_name="huggingface_api", vector_store_type="qdrant", retriever=None,
+                     answer_cache=None):
+    """
+    Creates the RAG chain. The answer can be streamed with chain.stream().
+    With an answer_cache (a SemanticAnswerCache), questions close enough to
+    an earlier one with the same retrieved chunks return its answer without
+    running the LLM. When the chain creates its own retriever, a cache is
+    set up if ANSWER_CACHE is enabled, and its results are reranked if
+    RERANK is.
     """
     logger.info(f"Creating RAG chain with LLM provider: {llm_provider_name} and vector store: {vector_store_type}...")
 
     # Get the embedding model and vector store
     if retriever is None:
         logger.info("No retriever provided, creating a new one...")
-        embeddings = get_embedding_model()
+        embeddings = get_embedding_model(query_cache=True)
         vector_store = get_vector_store(embeddings, vector_store_type=vector_store_type)
         retriever = vector_store.as_retriever()
+        if RERANK:
+            top_n = retriever.search_kwargs.get("k", 4)
+            retriever.search_kwargs["k"] = RERANK_CANDIDATES
+            retriever = RerankingRetriever(base_retriever=retriever, reranker=CrossEncoderReranker(), top_n=top_n)
+        if answer_cache is None and ANSWER_CACHE:
+            manifest_path = (
+                os.path.join(NUMPY_STORE_PATH, MANIFEST_FILENAME) if vector_store_type == "in_memory"
+                else QDRANT_MANIFEST_PATH
+            )
+            answer_cache = SemanticAnswerCache(embeddings, index_version(manifest_path))
     else:
         logger.info("Using the provided retriever.")
 
     # Get the LLM provider
     llm_provider = get_llm_provider(llm_provider_name)
     llm = llm_provider.get_llm()
+    # Tokens are counted with the LLM itself, not the serializing wrapper
+    count_tokens = llm_provider.get_token_counter(llm)
+    if not llm_provider.thread_safe:
+        llm = serialized(llm)
 
     # Define the prompt template
     template = """
@@ -42,14 +90,39 @@ def create_rag_chain(llm_provider_name="huggingface_api", vector_store_type="qdr
     """
     prompt = PromptTemplate.from_template(template)
 
-    # Create the RAG chain
-    def format_docs(docs):
-        return "\n\n".join(doc.page_content for doc in docs)
+    # Pack the retrieved chunks into what the context window leaves for them
+    packer = ContextPacker(count_tokens)
+
+    def context_budget(question):
+        # What the window leaves for context, which is negative if the question alone does not fit
+        if CONTEXT_TOKEN_BUDGET or llm_provider.context_window is None:
+            return CONTEXT_TOKEN_BUDGET or None
+        prompt_tokens = count_tokens(prompt.format(context="", question=question))
+        budget = llm_provider.context_window - LLM_MAX_NEW_TOKENS - prompt_tokens
+        if 0 < budget < CONTEXT_MIN_TOKENS:
+            logger.warning(
+                f"The prompt ({prompt_tokens} tokens) and answer ({LLM_MAX_NEW_TOKENS} tokens) only leave {budget} "
+                f"tokens of context."
+            )
+        return budget
+
+    def question_too_long(question):
+        budget = context_budget(question)
+        if budget is not None and budget <= 0:
+            logger.warning(f"The question leaves no room for context in a {llm_provider.context_window}-token window.")
+            return True
+        return False
 
-    rag_chain = (
-        {"context": retriever, "question": RunnablePassthrough()}
-        | RunnablePassthrough.assign(
-            context=lambda x: format_docs(x["context"])
+    def format_docs(docs, question):
+        budget = context_budget(question)
+        if budget is None:
+            return "\n\n".join(packer.spans(docs))
+        return packer.pack(docs, budget)
+
+    # Create the RAG chain
+    generate = (
+        RunnablePassthrough.assign(
+            context=lambda x: format_docs(x["context"], x["question"])
         )
         | RunnableLambda(
             lambda x: prompt.invoke(x) if x["context"] else "I couldn't find any relevant documents to answer your question. Please try rephrasing it."
@@ -58,6 +131,40 @@ def create_rag_chain(llm_provider_name="huggingface_api", vector_store_type="qdr
         | StrOutputParser()
     )
 
+    if answer_cache is None:
+        rag_chain = {"context": retriever, "question": RunnablePassthrough()} | generate
+    else:
+        def stream_and_store(chunks):
+            # Passes the answer through as it is generated and caches it at the end.
+            # Streaming sends the inputs and the answer in separate chunks, invoke
+            # sends one dict holding all of them
+            inputs, answer = {}, []
+            for chunk in chunks:
+                inputs.update((key, value) for key, value in chunk.items() if key != "answer")
+                if "answer" in chunk:
+                    answer.append(chunk["answer"])
+                    yield chunk["answer"]
+            if inputs.get("context"):
+                answer_cache.store(inputs["question"], context_ids(inputs["context"]), "".join(answer))
+
+        rag_chain = (
+            {"context": retriever, "question": RunnablePassthrough()}
+            | RunnablePassthrough.assign(
+                cached_answer=lambda x: answer_cache.lookup(x["question"], context_ids(x["context"]))
+                if x["context"] else None
+            )
+            | RunnableBranch(
+                (lambda x: x["cached_answer"] is not None, lambda x: x["cached_answer"]),
+                RunnablePassthrough.assign(answer=generate) | RunnableGenerator(stream_and_store),
+            )
+        )
+
+    # Questions that do not fit in the context window are turned away before retrieval
+    rag_chain = RunnableBranch(
+        (question_too_long, lambda question: QUESTION_TOO_LONG_ANSWER),
+        rag_chain,
+    )
+
     logger.info("RAG chain created successfully.")
     return rag_chain
 
@@ -0,0 +1,107 @@
+import time
+from typing import Any
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict
+from src.rag.config import RERANK_BATCH_SIZE, RERANK_MODEL, RERANK_TIME_BUDGET_MS
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    Reorders retrieved chunks by a cross-encoder's relevance score for the
+    question. Scoring runs in batches on the calling thread, so concurrent
+    requests never queue behind each other, and stops once the request has
+    spent time_budget_ms on it: the candidates scored so far are reordered
+    and the rest keep their retrieval order, so a slow or busy node degrades
+    to plain dense retrieval instead of delaying the answer.
+    Batches are shrunk to what the measured time per candidate says fits in
+    the remaining budget. Until a first batch has been timed, the first batch
+    of up to batch_size candidates can overrun it.
+    model is a loaded sentence_transformers CrossEncoder, or anything with
+    its predict method; by default model_id is loaded on the CPU.
+    """
+
+    # Weight of the latest batch in the running time-per-candidate estimate
+    _LATENCY_SMOOTHING = 0.3
+
+    def __init__(self, model_id=RERANK_MODEL, time_budget_ms=RERANK_TIME_BUDGET_MS, batch_size=RERANK_BATCH_SIZE,
+                 model=None):
+        if model is None:
+            from sentence_transformers import CrossEncoder
+
+            model = CrossEncoder(model_id, device="cpu")
+        self.model = model
+        self.time_budget_ms = time_budget_ms
+        self.batch_size = batch_size
+        self.requests = 0
+        self.timeouts = 0
+        self.seconds_per_candidate = None
+        logger.info(f"Loaded reranker '{model_id}' with a {time_budget_ms} ms budget.")
+
+    def _next_batch_size(self, remaining):
+        if self.seconds_per_candidate is None:
+            return self.batch_size
+        return min(self.batch_size, int(remaining / self.seconds_per_candidate))
+
+    def rerank(self, query, documents, top_n):
+        """
+        Returns the top_n of documents, best first. documents are expected in
+        retrieval order.
+        """
+        self.requests += 1
+        deadline = time.perf_counter() + self.time_budget_ms / 1000
+        scores = []
+        while len(scores) < len(documents):
+            start = time.perf_counter()
+            size = self._next_batch_size(deadline - start)
+            if size <= 0:
+                self.timeouts += 1
+                break
+            batch = [(query, document.page_content) for document in documents[len(scores):len(scores) + size]]
+            scores.extend(float(score) for score in self.model.predict(batch, batch_size=len(batch)))
+            latency = (time.perf_counter() - start) / len(batch)
+            if self.seconds_per_candidate is None:
+                self.seconds_per_candidate = latency
+            else:
+                self.seconds_per_candidate += self._LATENCY_SMOOTHING * (latency - self.seconds_per_candidate)
+        scored = len(scores)
+        if scored < len(documents):
+            logger.info(f"Reranking hit its time budget after scoring {scored} of {len(documents)} candidates.")
+        order = sorted(range(scored), key=lambda i: scores[i], reverse=True)
+        return [documents[i] for i in order + list(range(scored, len(documents)))][:top_n]
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "timeouts": self.timeouts,
+            "time_budget_ms": self.time_budget_ms,
+            "ms_per_candidate": self.seconds_per_candidate * 1000 if self.seconds_per_candidate is not None else None,
+        }
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Retrieves candidates with base_retriever, which should be set to return
+    a wider set than needed, and keeps the top_n after reranking them.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    base_retriever: Any
+    reranker: Any
+    top_n: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+        start = time.perf_counter()
+        candidates = self.base_retriever.invoke(query)
+        retrieved = time.perf_counter()
+        documents = self.reranker.rerank(query, candidates, self.top_n)
+        logger.debug(
+            f"Retrieved {len(candidates)} candidates in {(retrieved - start) * 1000:.1f} ms, "
+            f"reranked in {(time.perf_counter() - retrieved) * 1000:.1f} ms."
+        )
+        return documents
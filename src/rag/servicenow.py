@@ -0,0 +1,194 @@
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from src.rag.anonymizer import get_default_engine
+
+# Fields of a ServiceNow record that may contain PII
+ANONYMIZED_FIELDS = ['sys_updated_by', 'sys_created_by', 'short_description', 'watch_list']
+
+
+def anonymize_text(text):
+    """
+    Anonymizes PII in a given text string using the rules in PII_RULES_PATH.
+    """
+    return get_default_engine().anonymize(text)
+
+# Redundant trailing sections: everything from the first marker onwards is dropped
+TRAILING_SECTIONS_RE = re.compile(
+    r'#+\s*Below is the original account request\s*#+.*'  # "original account request" sections
+    r'|You are receiving this email because.*'  # Smartsheet footers
+    r'|Powered by Smartsheet Inc\..*',
+    flags=re.DOTALL
+)
+
+def clean_description(text):
+    """
+    Performs general cleaning on the description field.
+    """
+    if not isinstance(text, str):
+        return text
+
+    # Remove redundant "original account request" sections and Smartsheet footers
+    text = TRAILING_SECTIONS_RE.sub('', text, count=1)
+
+    # Normalize whitespace
+    text = ' '.join(text.split())
+
+    return text
+
+def anonymize_record(entry):
+    """
+    Anonymizes and cleans a single ServiceNow record.
+    """
+    anonymized_entry = {}
+    for key, value in entry.items():
+        processed_value = value
+        if key in ANONYMIZED_FIELDS:
+            processed_value = anonymize_text(value)
+        elif key == 'description':
+            anonymized_value = anonymize_text(value)
+            processed_value = clean_description(anonymized_value)
+
+        # Only add non-empty values to the cleaned entry
+        if processed_value != "":
+            anonymized_entry[key] = processed_value
+    return anonymized_entry
+
+def anonymize_batch(batch):
+    """
+    Anonymizes a batch of records. Used as the unit of work for the process pool.
+    """
+    return [anonymize_record(entry) for entry in batch]
+
+def iter_json_records(input_path, key='records', read_size=1 << 20):
+    """
+    Yields the objects of the top-level `key` array of a JSON file one at a
+    time, reading the file in fixed-size blocks so the whole export never has
+    to be held in memory.
+    """
+    decoder = json.JSONDecoder()
+    array_start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+
+    with open(input_path, 'r') as f:
+        # Find the opening bracket of the records array
+        buffer = ''
+        while True:
+            match = array_start.search(buffer)
+            if match:
+                buffer = buffer[match.end():]
+                break
+            block = f.read(read_size)
+            if not block:
+                return
+            # Keep a tail in case the key straddles two blocks
+            buffer = buffer[-1024:] + block
+
+        pos = 0
+        while True:
+            # Skip whitespace and separators between records
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buffer):
+                block = f.read(read_size)
+                if not block:
+                    raise json.JSONDecodeError("Unterminated records array", buffer, pos)
+                buffer, pos = block, 0
+                continue
+            if buffer[pos] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The record is incomplete, read the next block and retry
+                block = f.read(read_size)
+                if not block:
+                    raise
+                buffer, pos = buffer[pos:] + block, 0
+                continue
+
+            yield record
+            pos = end
+            if pos >= read_size:
+                buffer, pos = buffer[pos:], 0
+
+def iter_batches(iterable, batch_size):
+    """
+    Groups an iterable into lists of at most batch_size items.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def map_in_order(executor, fn, iterable, max_pending):
+    """
+    Like executor.map, but only keeps max_pending tasks in flight so the input
+    is consumed lazily. Results are yielded in input order.
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def available_cpus():
+    """
+    Returns the number of CPUs this process may run on. On Slurm nodes this is
+    the job's allocation rather than the whole node.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def clean_record_batches(records, workers=None, batch_size=500):
+    """
+    Anonymizes and cleans records in batches, fanning the batches out to a
+    process pool when more than one worker is used. Yields cleaned batches in
+    input order while only a bounded number of batches is in flight.
+    """
+    workers = workers or available_cpus()
+    batches = iter_batches(records, batch_size)
+    if workers <= 1:
+        yield from map(anonymize_batch, batches)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        yield from map_in_order(executor, anonymize_batch, batches, max_pending=workers * 2)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def prepare_record(record):
+    """
+    Combines the text fields of a cleaned record into the document used for
+    embedding, keeping the incident number as metadata.
+    """
+    short_desc = record.get('short_description', '')
+    desc = record.get('description', '')
+
+    # Combine the text fields
+    # Using a clear separator can sometimes help the model distinguish between title and body
+    combined_text = f"Title: {short_desc}\n\n{desc}"
+
+    # Store the original incident number as metadata
+    metadata = {
+        'incident_number': record.get('number', record.get('sys_id', 'N/A'))
+    }
+    # Used to partition the index by date
+    opened_at = record.get('opened_at') or record.get('sys_created_on')
+    if opened_at:
+        metadata['opened_at'] = opened_at
+
+    return {
+        'text': combined_text.strip(),
+        'metadata': metadata
+    }
@@ -0,0 +1,101 @@
+import os
+from src.rag.config import EMBEDDING_MODEL, FAISS_INDEX_SPEC, FAISS_TRAIN_SIZE
+from src.rag.faiss_index import apply_index_spec, save_index_spec
+from src.rag.manifest import MANIFEST_FILENAME, is_manifest_compatible, load_manifest, save_manifest
+from src.rag.vector_store import load_faiss_store, save_faiss_store
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+SHARDS_DIRNAME = "shards"
+
+
+def shard_of(chunk_id, num_shards):
+    """
+    Returns the shard a chunk belongs to. Shards are assigned from the chunk's
+    content hash, so every task computes the same split independently and a
+    chunk stays in the same shard across builds.
+    """
+    return int(chunk_id[:16], 16) % num_shards
+
+
+def select_shard(documents, chunk_ids, shard_index, num_shards):
+    """
+    Returns the documents and chunk IDs that belong to the given shard.
+    """
+    selected = [
+        (document, chunk_id)
+        for document, chunk_id in zip(documents, chunk_ids)
+        if shard_of(chunk_id, num_shards) == shard_index
+    ]
+    logger.info(f"Shard {shard_index}/{num_shards}: {len(selected)} of {len(chunk_ids)} chunks.")
+    return [document for document, _ in selected], [chunk_id for _, chunk_id in selected]
+
+
+def shard_dir(persist_dir, shard_index, num_shards):
+    """
+    Returns the directory a shard's partial index is written to.
+    """
+    return os.path.join(persist_dir, SHARDS_DIRNAME, f"shard_{shard_index:04d}_of_{num_shards:04d}")
+
+
+def slurm_shard_index():
+    """
+    Returns the shard index of the current Slurm array task, or None outside
+    of an array job. Array indices are taken relative to the first task.
+    """
+    task_id = os.environ.get("SLURM_ARRAY_TASK_ID")
+    if task_id is None:
+        return None
+    return int(task_id) - int(os.environ.get("SLURM_ARRAY_TASK_MIN", 0))
+
+
+def slurm_num_shards():
+    """
+    Returns the number of tasks in the current Slurm array job, or None.
+    """
+    task_count = os.environ.get("SLURM_ARRAY_TASK_COUNT")
+    return int(task_count) if task_count is not None else None
+
+
+def merge_shards(persist_dir, num_shards, embeddings, index_spec=FAISS_INDEX_SPEC, train_size=FAISS_TRAIN_SIZE):
+    """
+    Merges the partial FAISS indexes written by a sharded build into a single
+    index in persist_dir and writes its manifest. Chunk IDs are content
+    hashes, so they are already consistent across shards. Shards are flat;
+    the merged index is converted to index_spec.
+    Raises a RuntimeError naming the shards to rerun if any are missing or
+    incomplete; a shard is complete once its manifest has been written.
+    """
+    missing = []
+    for shard_index in range(num_shards):
+        manifest = load_manifest(os.path.join(shard_dir(persist_dir, shard_index, num_shards), MANIFEST_FILENAME))
+        if not is_manifest_compatible(manifest, EMBEDDING_MODEL, "faiss"):
+            missing.append(shard_index)
+    if missing:
+        raise RuntimeError(f"Shards {missing} of {num_shards} are missing or incomplete, rerun them before merging.")
+
+    vector_store = None
+    chunk_ids = []
+    for shard_index in range(num_shards):
+        path = shard_dir(persist_dir, shard_index, num_shards)
+        shard_ids = load_manifest(os.path.join(path, MANIFEST_FILENAME))["chunk_ids"]
+        if not shard_ids:
+            continue
+        shard_store = load_faiss_store(path, embeddings)
+        if vector_store is None:
+            vector_store = shard_store
+        else:
+            vector_store.merge_from(shard_store)
+        chunk_ids.extend(shard_ids)
+        logger.info(f"Merged shard {shard_index}: {len(shard_ids)} chunks, {len(chunk_ids)} in total.")
+
+    if vector_store is None:
+        raise RuntimeError("All shards are empty, nothing to merge.")
+
+    apply_index_spec(vector_store, index_spec, train_size)
+    logger.info(f"Saving merged FAISS index to '{persist_dir}'...")
+    save_faiss_store(vector_store, persist_dir)
+    save_index_spec(persist_dir, index_spec, train_size)
+    save_manifest(os.path.join(persist_dir, MANIFEST_FILENAME), chunk_ids, EMBEDDING_MODEL, "faiss")
+    return vector_store
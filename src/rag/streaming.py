@@ -0,0 +1,183 @@
+import json
+import time
+from collections import deque
+import numpy as np
+from src.rag.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Headers for Server-Sent Event responses; X-Accel-Buffering tells proxies not to buffer the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Chat page of the web front ends. It posts the question to /chat/stream and
+# renders the tokens of the answer as they arrive, or the error if one is sent.
+CHAT_PAGE_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Chat with Phi-3</title>
+    <style>
+        body { font-family: sans-serif; }
+        #chatbox { width: 80%; height: 400px; border: 1px solid #ccc; overflow-y: scroll; padding: 10px; margin-bottom: 10px; }
+        #userInput { width: 70%; padding: 10px; }
+        #sendButton { padding: 10px; }
+    </style>
+</head>
+<body>
+    <h1>Chat with Phi-3</h1>
+    <div id="chatbox"></div>
+    <input type="text" id="userInput" placeholder="Type your message...">
+    <button id="sendButton">Send</button>
+
+    <script>
+        const chatbox = document.getElementById('chatbox');
+        const userInput = document.getElementById('userInput');
+        const sendButton = document.getElementById('sendButton');
+
+        function addMessage(role) {
+            const div = document.createElement('div');
+            div.innerHTML = `<b>${role}:</b> `;
+            const text = document.createElement('span');
+            text.style.whiteSpace = 'pre-wrap';
+            div.appendChild(text);
+            chatbox.appendChild(div);
+            return text;
+        }
+
+        async function sendMessage() {
+            const message = userInput.value;
+            if (!message) return;
+
+            addMessage('You').textContent = message;
+            userInput.value = '';
+            const answer = addMessage('Assistant');
+            const status = document.createElement('small');
+            answer.parentElement.appendChild(status);
+            status.textContent = ' ...';
+            const start = performance.now();
+            let firstToken = null;
+
+            const response = await fetch('/chat/stream', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ message: message })
+            });
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                // Events are separated by a blank line
+                const events = buffer.split('\\n\\n');
+                buffer = events.pop();
+                for (const event of events) {
+                    const data = event.split('\\n').find(line => line.startsWith('data: '));
+                    if (!data) continue;
+                    const payload = JSON.parse(data.slice(6));
+                    if (payload.token !== undefined) {
+                        if (firstToken === null) firstToken = performance.now() - start;
+                        answer.textContent += payload.token;
+                    } else if (payload.error !== undefined) {
+                        answer.textContent += payload.error;
+                    }
+                }
+                chatbox.scrollTop = chatbox.scrollHeight;
+            }
+            const total = (performance.now() - start) / 1000;
+            status.textContent = firstToken === null ? ` (${total.toFixed(1)} s)`
+                : ` (first token ${(firstToken / 1000).toFixed(1)} s, done ${total.toFixed(1)} s)`;
+        }
+
+        sendButton.addEventListener('click', sendMessage);
+        userInput.addEventListener('keypress', function(e) {
+            if (e.key === 'Enter') {
+                sendMessage();
+            }
+        });
+    </script>
+</body>
+</html>
+"""
+
+
+class StreamingStats:
+    """
+    Keeps the time to first token and the total time of the last
+    max_samples streamed answers. Time to first token is the latency users
+    see once answers are streamed.
+    """
+
+    def __init__(self, max_samples=1000):
+        self.first_token = deque(maxlen=max_samples)
+        self.total = deque(maxlen=max_samples)
+
+    def record(self, first_token, total):
+        self.first_token.append(first_token)
+        self.total.append(total)
+
+    def stats(self):
+        def summary(samples):
+            if not samples:
+                return None
+            samples = np.array(samples)
+            return {
+                "mean": float(samples.mean()),
+                "p50": float(np.percentile(samples, 50)),
+                "p95": float(np.percentile(samples, 95)),
+            }
+
+        return {
+            "answers": len(self.total),
+            "time_to_first_token_s": summary(self.first_token),
+            "total_s": summary(self.total),
+        }
+
+
+def timed_stream(chunks, stats=None):
+    """
+    Passes the text chunks of a streamed answer through, skipping empty ones,
+    and logs the time to the first chunk and to the end. chunks is a
+    generator such as chain.stream(question). The times are recorded in
+    stats if given.
+    """
+    start = time.perf_counter()
+    first_token = None
+    count = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        count += 1
+        yield chunk
+    total = time.perf_counter() - start
+    if first_token is None:
+        first_token = total
+    logger.info(f"Streamed {count} chunks: first after {first_token:.2f}s, done after {total:.2f}s.")
+    if stats is not None:
+        stats.record(first_token, total)
+
+
+def sse_event(data, event=None):
+    """
+    Formats a Server-Sent Event carrying data as JSON.
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def sse_answer_events(chunks, stats=None):
+    """
+    Turns the text chunks of a streamed answer into Server-Sent Events: one
+    "token" event per chunk, an "error" event if generating the answer fails,
+    and a final "done" event. Timings are recorded in stats as in timed_stream.
+    """
+    try:
+        for chunk in timed_stream(chunks, stats):
+            yield sse_event({"token": chunk})
+    except Exception as e:
+        logger.error(f"Streaming the answer failed: {e}")
+        yield sse_event({"error": "An error occurred while generating the answer."})
+    yield sse_event({}, event="done")
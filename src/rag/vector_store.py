@@ -1,46 +1,90 @@
+import os
 from langchain_community.vectorstores import Qdrant, FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from qdrant_client import QdrantClient
-from src.rag.config import EMBEDDING_MODEL, QDRANT_HOST, QDRANT_PORT, QDRANT_COLLECTION_NAME
+from src.rag.config import (
+    BM25_INDEX,
+    EMBEDDING_BACKEND,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_MODEL,
+    EMBEDDING_ONNX_QUANTIZED,
+    FAISS_EF_SEARCH,
+    FAISS_MMAP,
+    FAISS_NPROBE,
+    HYBRID_FETCH_K,
+    HYBRID_SEARCH,
+    NUMPY_STORE_PATH,
+    PARTITION_QUOTAS,
+    QUERY_CACHE_SIZE,
+    QDRANT_COLLECTION_NAME,
+)
+from src.rag.bm25 import BM25Index, has_bm25_index, write_bm25_index
+from src.rag.dedup import apply_duplicate_metadata, with_duplicates
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.faiss_index import load_index_spec, set_search_params
+from src.rag.hybrid_retriever import HybridRetriever
+from src.rag.query_cache import QueryCachedEmbeddings
+from src.rag.qdrant_bulk import apply_duplicate_payloads, embedding_dimension, ensure_collection, get_qdrant_client
+from src.rag.manifest import qdrant_point_id
+from src.rag.numpy_store import NumpyVectorStore
+from src.rag.partitions import parse_quotas
+from src.rag.mmap_store import ColumnarDocstore, PositionIds, has_docstore, load_docstore, write_docstore
 from src.rag.logger import get_logger
 
 logger = get_logger(__name__)
 
-def get_embedding_model():
+def embedding_backend_name():
     """
-    Returns the embedding model.
+    Identifies the model and backend that produce document vectors. Quantized
+    vectors differ slightly from the PyTorch ones, so they are cached apart.
     """
-    logger.info(f"Loading embedding model: {EMBEDDING_MODEL}")
-    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    if EMBEDDING_BACKEND == "onnx":
+        return f"{EMBEDDING_MODEL}:onnx-{'int8' if EMBEDDING_ONNX_QUANTIZED else 'fp32'}"
+    return EMBEDDING_MODEL
+
+def load_embedding_model():
+    """
+    Loads the embedding model with the configured backend. The backends are
+    imported lazily so the ONNX backend never pulls in torch.
+    """
+    if EMBEDDING_BACKEND == "onnx":
+        from src.rag.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings()
+    elif EMBEDDING_BACKEND == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+        logger.info(f"Loading embedding model: {EMBEDDING_MODEL}")
+        return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+    else:
+        raise ValueError(f"Unknown embedding backend: {EMBEDDING_BACKEND}")
+
+def get_embedding_model(use_cache=False, query_cache=False):
+    """
+    Returns the embedding model. With use_cache, document embeddings are read
+    from and written to the on-disk cache at EMBEDDING_CACHE_PATH, and the
+    model is only loaded if some text is not cached yet. With query_cache,
+    query embeddings are kept in an in-memory LRU cache for serving.
+    """
+    if use_cache and EMBEDDING_CACHE_PATH:
+        logger.info(f"Using embedding cache at '{EMBEDDING_CACHE_PATH}'")
+        embeddings = CachedEmbeddings(load_embedding_model, model_name=embedding_backend_name())
+    else:
+        embeddings = load_embedding_model()
+    if query_cache and QUERY_CACHE_SIZE:
+        embeddings = QueryCachedEmbeddings(embeddings)
     return embeddings
 
-from qdrant_client.http.models import Distance, VectorParams
+def log_embedding_cache_stats(embeddings):
+    """
+    Logs hit/miss statistics if the embeddings are backed by the cache.
+    """
+    if isinstance(embeddings, CachedEmbeddings):
+        embeddings.log_stats()
 
-def get_vector_store(embeddings, vector_store_type="qdrant", documents=None):
+def get_vector_store(embeddings, vector_store_type="qdrant", documents=None, ids=None):
     """
     Creates or gets the vector store based on the vector_store_type.
     """
     if vector_store_type == "qdrant":
-        logger.info(f"Connecting to Qdrant at {QDRANT_HOST}:{QDRANT_PORT}")
-        client = QdrantClient(host=QDRANT_HOST, port=QDRANT_PORT)
-
-        # Get the embedding dimension by embedding a dummy text
-        dummy_embedding = embeddings.embed_query("test")
-        embedding_dim = len(dummy_embedding)
-        logger.info(f"Deduced embedding dimension: {embedding_dim}")
-
-        # Check if the collection exists
-        try:
-            client.get_collection(collection_name=QDRANT_COLLECTION_NAME)
-            logger.info(f"Collection '{QDRANT_COLLECTION_NAME}' already exists.")
-        except Exception:
-            logger.info(f"Collection '{QDRANT_COLLECTION_NAME}' not found. Creating new collection.")
-            client.recreate_collection(
-                collection_name=QDRANT_COLLECTION_NAME,
-                vectors_config=VectorParams(size=embedding_dim, distance=Distance.COSINE),
-            )
-            logger.info(f"Collection '{QDRANT_COLLECTION_NAME}' created successfully.")
-
+        client = get_qdrant_client()
+        ensure_collection(client, embedding_dimension(embeddings))
         vector_store = Qdrant(
             client=client,
             collection_name=QDRANT_COLLECTION_NAME,
@@ -48,27 +92,137 @@ def get_vector_store(embeddings, vector_store_type="qdrant", documents=None):
         )
         logger.info(f"Connected to Qdrant collection: {QDRANT_COLLECTION_NAME}")
         return vector_store
-    
+
     elif vector_store_type == "faiss":
         if documents is None:
             raise ValueError("Documents must be provided for in-memory vector store.")
         logger.info("Creating in-memory FAISS vector store.")
-        return FAISS.from_documents(documents, embeddings)
+        return FAISS.from_documents(documents, embeddings, ids=ids)
+
+    elif vector_store_type == "in_memory":
+        if documents is not None:
+            logger.info("Creating in-process NumPy vector store.")
+            return NumpyVectorStore.from_documents(documents, embeddings, ids=ids)
+        return NumpyVectorStore.load(NUMPY_STORE_PATH, embeddings, mmap=True)
 
-def load_faiss_index(persist_dir, embedding_model):
+    else:
+        raise ValueError(f"Unknown vector store type: {vector_store_type}")
+
+def save_faiss_store(vector_store, persist_dir):
+    """
+    Saves a FAISS vector store to disk, along with the columnar docstore used to
+    load it without unpickling and, with BM25_INDEX, a BM25 index of its chunks
+    for hybrid retrieval.
     """
-    Loads a persisted FAISS index from disk.
+    vector_store.save_local(persist_dir)
+    write_docstore(vector_store, persist_dir)
+    if BM25_INDEX:
+        write_bm25_index(vector_store, persist_dir)
+
+def load_faiss_store(persist_dir, embedding_model, mmap=False, read_only=False):
     """
-    logger.info(f"Loading FAISS index from '{persist_dir}'...")
+    Loads a persisted FAISS vector store from disk. Stores saved with a
+    columnar docstore are loaded without unpickling. With read_only, chunks
+    stay in the columnar docstore and Documents are only built for search
+    hits; otherwise they are loaded into an InMemoryDocstore that builds can
+    modify. With mmap (which implies read_only), the index and the docstore
+    are memory-mapped instead of read into memory, so startup is near-instant
+    and processes on a node share the page cache. Older stores fall back to
+    the pickled docstore.
+    """
+    import faiss
+
+    logger.info(f"Loading '{load_index_spec(persist_dir)}' FAISS index from '{persist_dir}'...")
+    if has_docstore(persist_dir):
+        flags = 0
+        if mmap:
+            # IO_FLAG_MMAP_IFC maps vector codes in place for every index type;
+            # older faiss releases only have IO_FLAG_MMAP, which cannot be
+            # combined with it for IVF indexes
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(os.path.join(persist_dir, "index.faiss"), flags)
+        if has_docstore(persist_dir, count=index.ntotal):
+            if mmap or read_only:
+                docstore = ColumnarDocstore(persist_dir, mmap=mmap)
+                index_to_docstore_id = PositionIds(docstore.ids)
+            else:
+                docstore, index_to_docstore_id = load_docstore(persist_dir)
+            logger.info(f"FAISS index loaded successfully ({'memory-mapped' if mmap else 'in memory'}).")
+            return FAISS(embedding_model, index, docstore, index_to_docstore_id)
+        logger.warning("Columnar docstore does not match the index, loading the pickled docstore instead.")
+
     vector_store = FAISS.load_local(persist_dir, embedding_model, allow_dangerous_deserialization=True)
     logger.info("FAISS index loaded successfully.")
-    return vector_store.as_retriever()
+    return vector_store
+
+def load_faiss_index(persist_dir, embedding_model, nprobe=FAISS_NPROBE, ef_search=FAISS_EF_SEARCH, mmap=FAISS_MMAP,
+                     hybrid=HYBRID_SEARCH, fetch_k=HYBRID_FETCH_K, quotas=PARTITION_QUOTAS):
+    """
+    Loads a persisted FAISS index from disk and returns it as a retriever.
+    nprobe and ef_search tune the recall/latency trade-off of IVF and HNSW indexes.
+    With hybrid, the index's BM25 index is searched as well and the rankings
+    are fused, taking fetch_k candidates from each. quotas, e.g.
+    "guides=3,tickets=2", searches those partitions separately and takes up
+    to that many chunks from each.
+    """
+    vector_store = load_faiss_store(persist_dir, embedding_model, mmap=mmap, read_only=True)
+    set_search_params(vector_store, nprobe=nprobe, ef_search=ef_search)
+    quotas = parse_quotas(quotas) if isinstance(quotas, str) else quotas
+    if not isinstance(vector_store.docstore, ColumnarDocstore):
+        if hybrid or quotas:
+            logger.warning("Hybrid retrieval and partitions need an index saved with a columnar docstore.")
+        return vector_store.as_retriever()
+
+    bm25 = None
+    if hybrid:
+        if has_bm25_index(persist_dir, count=vector_store.index.ntotal):
+            logger.info("Using hybrid BM25 + dense retrieval.")
+            bm25 = BM25Index(persist_dir)
+        else:
+            logger.warning("No BM25 index matches the FAISS index, using dense retrieval only.")
+    if quotas:
+        logger.info(f"Partition quotas: {quotas}")
+    return HybridRetriever(vector_store=vector_store, bm25=bm25, fetch_k=fetch_k, quotas=quotas or {})
 
-def add_documents_to_store(vector_store, documents, vector_store_type="qdrant"):
+def add_documents_to_store(vector_store, documents, vector_store_type="qdrant", ids=None):
     """
-    Adds documents to the Qdrant vector store.
+    Adds documents to the vector store, optionally under the given IDs.
     """
+    if not documents:
+        logger.info("No documents to add to the vector store.")
+        return
+    if vector_store_type == "qdrant" and ids is not None:
+        ids = [qdrant_point_id(chunk_id) for chunk_id in ids]
+    logger.info(f"Adding {len(documents)} documents to the vector store.")
+    vector_store.add_documents(documents, ids=ids)
+    logger.info("Successfully added documents to the vector store.")
+
+def delete_documents_from_store(vector_store, ids, vector_store_type="qdrant"):
+    """
+    Deletes the documents with the given chunk IDs from the vector store.
+    """
+    if not ids:
+        logger.info("No stale documents to delete from the vector store.")
+        return
     if vector_store_type == "qdrant":
-        logger.info(f"Adding {len(documents)} documents to the vector store.")
-        vector_store.add_documents(documents)
-        logger.info("Successfully added documents to the vector store.")
+        ids = [qdrant_point_id(chunk_id) for chunk_id in ids]
+    logger.info(f"Deleting {len(ids)} stale documents from the vector store.")
+    vector_store.delete(ids)
+    logger.info("Successfully deleted stale documents from the vector store.")
+
+def update_duplicate_metadata(vector_store, duplicates, vector_store_type="qdrant"):
+    """
+    Brings the duplicate lists stored on the chunks of representative tickets
+    up to date. Returns the number of chunks updated.
+    """
+    if vector_store_type == "faiss":
+        updated = apply_duplicate_metadata(vector_store, duplicates)
+    elif vector_store_type == "in_memory":
+        metadatas = [with_duplicates(metadata, duplicates) for metadata in vector_store.metadatas]
+        updated = sum(new != old for new, old in zip(metadatas, vector_store.metadatas))
+        vector_store.metadatas = metadatas
+    else:
+        updated = apply_duplicate_payloads(vector_store.client, duplicates, vector_store.collection_name)
+    if updated:
+        logger.info(f"Updated the duplicate lists of {updated} chunks.")
+    return updated
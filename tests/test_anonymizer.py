@@ -0,0 +1,29 @@
+import re
+import pytest
+from src.rag.anonymizer import PIIRuleEngine, build_trie_pattern
+from src.rag.anonymizer_reference import ANONYMIZED_FIELDS, SAMPLE_TICKETS, legacy_anonymize_text
+from src.rag.config import PII_RULES_PATH
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return PIIRuleEngine.from_config(PII_RULES_PATH)
+
+
+@pytest.mark.parametrize("ticket", SAMPLE_TICKETS)
+@pytest.mark.parametrize("field", ANONYMIZED_FIELDS)
+def test_engine_matches_legacy_chain(engine, ticket, field):
+    assert engine.anonymize(ticket.get(field)) == legacy_anonymize_text(ticket.get(field))
+
+
+def test_engine_output(engine):
+    assert engine.anonymize(SAMPLE_TICKETS[0]["description"]) == (
+        "Hi, my NetID is [USER] and my advisor [NAME] ([EMAIL]) approved it. "
+        "Please add me to /projects/[USER_PROJECT] on [CLUSTER_HOSTNAME]."
+    )
+
+
+def test_trie_pattern_matches_whole_words():
+    pattern = re.compile(r'\b' + build_trie_pattern({"pgarias", "thackray", "thack"}) + r'\b')
+    assert pattern.findall("thackray and pgarias, not thackrayx") == ["thackray", "pgarias"]
+    assert pattern.findall("thack") == ["thack"]
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import threading
+import time
+import pytest
+
+pytest.importorskip("starlette")
+
+from src.rag.asgi_server import AdmissionController, create_app
+
+
+class SlowChain:
+    """
+    Streams tokens every delay seconds until closed, and records when its
+    generator was closed.
+    """
+
+    def __init__(self, tokens=1000, delay=0.01):
+        self.tokens = tokens
+        self.delay = delay
+        self.closed = threading.Event()
+
+    def stream(self, question):
+        try:
+            for i in range(self.tokens):
+                time.sleep(self.delay)
+                yield f"token{i} "
+        finally:
+            self.closed.set()
+
+
+async def post_stream(app, disconnect_after=None):
+    """
+    Sends POST /chat/stream straight to the ASGI app. With disconnect_after,
+    the client goes away once it has received that many token events.
+    Returns the events received.
+    """
+    body = json.dumps({"message": "How do I submit a job?"}).encode()
+    received = []
+    disconnected = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            received.append(message["body"].decode())
+            if disconnect_after is not None and len(received) >= disconnect_after:
+                disconnected.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/chat/stream", "raw_path": b"/chat/stream", "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 1234),
+        "server": ("127.0.0.1", 8088),
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=5)
+    return received
+
+
+def test_disconnected_stream_gives_its_slot_back():
+    chain = SlowChain()
+    admission = AdmissionController(max_active=1, max_queue=0, queue_timeout=1)
+    app = create_app(chain, "<html></html>", admission=admission, workers=1)
+
+    received = asyncio.run(post_stream(app, disconnect_after=3))
+    assert len(received) >= 3
+    # The chain's thread was stopped before the slot was released
+    assert chain.closed.is_set()
+    assert admission.active == 0
+    assert admission.stats()["admitted"] == 1
+
+
+def test_finished_stream_gives_its_slot_back():
+    chain = SlowChain(tokens=3, delay=0)
+    admission = AdmissionController(max_active=1, max_queue=0, queue_timeout=1)
+    app = create_app(chain, "<html></html>", admission=admission, workers=1)
+
+    received = asyncio.run(post_stream(app))
+    assert received[-1].startswith("event: done")
+    assert admission.active == 0
@@ -0,0 +1,62 @@
+from src.rag.chunking import merge_sections, split_markdown_sections
+
+GUIDE = """# Slurm
+Slurm schedules jobs on the cluster.
+## sbatch
+Submit a batch script with sbatch.
+## srun
+Run a command interactively with srun.
+```bash
+# not a heading
+srun --pty bash
+```
+### Examples
+srun -n 4 hostname
+# Storage
+Home directories are backed up nightly.
+"""
+
+
+def count_words(text):
+    return len(text.split())
+
+
+def test_split_markdown_sections_ignores_code_fences():
+    sections = split_markdown_sections(GUIDE)
+    assert [headings for headings, _ in sections] == [
+        {"h1": "Slurm"},
+        {"h1": "Slurm", "h2": "sbatch"},
+        {"h1": "Slurm", "h2": "srun"},
+        {"h1": "Slurm", "h2": "srun", "h3": "Examples"},
+        {"h1": "Storage"},
+    ]
+    assert "# not a heading" in sections[2][1]
+    assert "".join(text for _, text in sections) == GUIDE
+
+
+def test_merge_sections_packs_small_sections_up_to_budget():
+    sections = split_markdown_sections(GUIDE)
+    merged = merge_sections(sections, 100, count_words)
+    # Sections under the same h1 are merged and keep only the headings they share
+    assert merged == [
+        ({"h1": "Slurm"}, "".join(text for _, text in sections[:4])),
+        ({"h1": "Storage"}, sections[4][1]),
+    ]
+
+
+def test_merge_sections_respects_budget():
+    sections = split_markdown_sections(GUIDE)
+    sizes = [count_words(text) for _, text in sections]
+    budget = sizes[0] + sizes[1]
+    merged = merge_sections(sections, budget, count_words)
+    # The srun section alone is over budget, so it is passed on whole to be split later
+    assert merged == [({"h1": "Slurm"}, sections[0][1] + sections[1][1])] + sections[2:]
+    assert merge_sections(sections, 1, count_words) == sections
+
+
+def test_merge_sections_keeps_shared_headings_from_the_top():
+    sections = [
+        ({"h1": "Slurm", "h2": "sbatch", "h3": "Examples"}, "sbatch job.sh\n"),
+        ({"h1": "Slurm", "h2": "srun", "h3": "Examples"}, "srun hostname\n"),
+    ]
+    assert merge_sections(sections, 100, count_words) == [({"h1": "Slurm"}, "sbatch job.sh\nsrun hostname\n")]
@@ -0,0 +1,185 @@
+import ctypes
+import sys
+import threading
+import time
+import types
+import numpy as np
+import pytest
+from src.rag.generation_scheduler import GenerationScheduler, _Sequence, missing_llama_cpp_api, sample_token
+
+N_VOCAB = 10
+EOG_TOKEN = 9
+NEXT_TOKEN = 5
+
+
+class FakeBatch:
+    def __init__(self, n_tokens, embd, n_seq_max, verbose):
+        self.batch = types.SimpleNamespace(
+            n_tokens=0, token=[0] * n_tokens, pos=[0] * n_tokens, n_seq_id=[0] * n_tokens,
+            seq_id=[[0] for _ in range(n_tokens)], logits=[False] * n_tokens,
+        )
+
+
+class FakeContext:
+    """
+    Stands in for llama.cpp's context: every sequence always predicts
+    NEXT_TOKEN. Records the tokens decoded per step and the sequences removed
+    from the KV cache.
+    """
+
+    def __init__(self, model, params, verbose):
+        self.steps = []
+        self.removed = []
+        logits = (ctypes.c_float * N_VOCAB)(*[0.0] * N_VOCAB)
+        logits[NEXT_TOKEN] = 10.0
+        self._logits = logits
+
+    def decode(self, batch):
+        # Slow enough for concurrent requests to join the batch
+        time.sleep(0.005)
+        self.steps.append(batch.batch.n_tokens)
+
+    def get_logits_ith(self, i):
+        return ctypes.cast(self._logits, ctypes.POINTER(ctypes.c_float))
+
+    def kv_cache_seq_rm(self, seq_id, start, end):
+        self.removed.append(seq_id)
+
+
+class FakeLlama:
+    def __init__(self, model_path, n_gpu_layers, n_ctx, n_batch, verbose):
+        self.context_params = None
+        self._model = types.SimpleNamespace(vocab=None)
+
+    def n_vocab(self):
+        return N_VOCAB
+
+    def tokenize(self, text, add_bos=True, special=True):
+        return [1] + [2 + byte % 7 for byte in text]
+
+    def detokenize(self, tokens):
+        return "".join(str(token) for token in tokens).encode("utf-8")
+
+
+@pytest.fixture
+def fake_llama_cpp(monkeypatch):
+    internals = types.ModuleType("llama_cpp._internals")
+    internals.LlamaBatch = FakeBatch
+    internals.LlamaContext = FakeContext
+    llama_cpp = types.ModuleType("llama_cpp")
+    llama_cpp._internals = internals
+    llama_cpp.Llama = FakeLlama
+    llama_cpp.llama_context_params = types.SimpleNamespace(from_buffer_copy=lambda params: types.SimpleNamespace())
+    llama_cpp.llama_vocab_is_eog = lambda vocab, token: token == EOG_TOKEN
+    monkeypatch.setitem(sys.modules, "llama_cpp", llama_cpp)
+    monkeypatch.setitem(sys.modules, "llama_cpp._internals", internals)
+    return llama_cpp
+
+
+@pytest.fixture
+def scheduler(fake_llama_cpp):
+    scheduler = GenerationScheduler("model.gguf", max_sequences=2, n_ctx=64, n_batch=16)
+    yield scheduler
+    scheduler.close()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        assert time.perf_counter() < deadline
+        time.sleep(0.01)
+
+
+def test_sample_token_greedy_and_penalty():
+    rng = np.random.default_rng(0)
+    logits = [2.0, 1.9, -1.0]
+    assert sample_token(logits, rng, temperature=0, repeat_penalty=1.0) == 0
+    # The penalty divides positive logits of recent tokens, so token 0 falls behind token 1
+    assert sample_token(logits, rng, temperature=0, recent_tokens=[0]) == 1
+    # and multiplies negative ones, pushing them further down
+    assert sample_token([-1.0, -1.05], rng, temperature=0, recent_tokens=[0]) == 1
+
+
+def test_sample_token_top_k_and_top_p():
+    rng = np.random.default_rng(0)
+    logits = [1.0, 3.0, 2.9, 0.5]
+    top_k = {sample_token(logits, rng, top_k=2, top_p=1.0, repeat_penalty=1.0) for _ in range(200)}
+    assert top_k == {1, 2}
+    top_p = {sample_token(logits, rng, top_k=0, top_p=0.01, repeat_penalty=1.0) for _ in range(50)}
+    assert top_p == {1}
+
+
+def emitted(sequence):
+    chunks = []
+    while not sequence.queue.empty():
+        chunks.append(sequence.queue.get())
+    return "".join(chunks)
+
+
+def test_emit_holds_back_possible_stop_string():
+    sequence = _Sequence([1], max_tokens=10, stop=["<|end|>"], sampling={}, seed=0)
+    sequence.output += b"Hello <|e"
+    assert not sequence.emit()
+    # Up to len("<|end|>") - 1 characters could start the stop string
+    assert emitted(sequence) == "Hel"
+    sequence.output += b"nd|> ignored"
+    assert sequence.emit()
+    assert emitted(sequence) == "lo "
+
+
+def test_emit_final_flushes_held_back_text():
+    sequence = _Sequence([1], max_tokens=10, stop=["<|end|>"], sampling={}, seed=0)
+    sequence.output += b"Done <|e"
+    sequence.emit()
+    sequence.emit(final=True)
+    assert emitted(sequence) == "Done <|e"
+
+
+def test_missing_llama_cpp_api(fake_llama_cpp):
+    assert missing_llama_cpp_api() == []
+    del fake_llama_cpp._internals.LlamaContext
+    assert missing_llama_cpp_api() == ["_internals.LlamaContext"]
+
+
+def test_requests_share_the_batch_and_free_their_sequences(scheduler):
+    answers = [None] * 3
+
+    def ask(i):
+        answers[i] = "".join(scheduler.generate(f"question {i}", max_tokens=4, temperature=0))
+
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert answers == [str(NEXT_TOKEN) * 4] * 3
+    # One at a time would take a prefill step and four generation steps per request
+    assert len(scheduler._context.steps) < 15
+    wait_for(lambda: scheduler.stats()["active"] == 0)
+    assert sorted(scheduler._free_ids) == [0, 1]
+    assert scheduler._context.removed.count(0) + scheduler._context.removed.count(1) == 3
+    assert scheduler.generated_tokens == 12
+
+
+def test_closing_a_stream_cancels_its_sequence(scheduler):
+    answer = scheduler.generate("question", max_tokens=1000, temperature=0)
+    assert next(answer).startswith(str(NEXT_TOKEN))
+    answer.close()
+    wait_for(lambda: scheduler.stats()["active"] == 0)
+    assert sorted(scheduler._free_ids) == [0, 1]
+    assert scheduler.generated_tokens < 1000
+
+
+def test_prompt_longer_than_context_is_rejected(scheduler):
+    with pytest.raises(ValueError):
+        list(scheduler.generate("x" * 100))
+
+
+def test_provider_falls_back_without_batching_api(fake_llama_cpp):
+    from src.rag.llm_provider import LlamaCPPProvider
+
+    assert LlamaCPPProvider("model.gguf", parallel=4).thread_safe
+    del fake_llama_cpp._internals.LlamaBatch
+    provider = LlamaCPPProvider("model.gguf", parallel=4)
+    assert provider.parallel == 1
+    assert not provider.thread_safe
@@ -0,0 +1,98 @@
+import zlib
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from src.rag.bm25 import BM25Index, tokenize, write_bm25_index
+from src.rag.hybrid_retriever import HybridRetriever, reciprocal_rank_fusion
+from src.rag.manifest import compute_chunk_id
+from src.rag.mmap_store import write_docstore
+from src.rag.vector_store import load_faiss_store
+
+CORPUS = [
+    "Slurm job stuck in pending state on the gpu partition",
+    "module load gcc/11.2.0 fails with an lmod error",
+    "Conda environment cannot find gcc after an update",
+    "VPN drops every hour",
+    "Ticket INC0012345 password reset for a new account",
+    "Password reset requests go through the account portal and take an hour or two to apply",
+]
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Gives every text its own random unit vector, seeded by the text.
+    """
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).normal(size=8)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def build_store(tmp_path, texts=CORPUS):
+    documents = [Document(page_content=text, metadata={"source": f"{chr(ord('a') + i)}.md"})
+                 for i, text in enumerate(texts)]
+    vector_store = FAISS.from_documents(documents, FakeEmbeddings(),
+                                        ids=[compute_chunk_id(document) for document in documents])
+    vector_store.save_local(str(tmp_path))
+    write_docstore(vector_store, str(tmp_path))
+    write_bm25_index(vector_store, str(tmp_path))
+    return load_faiss_store(str(tmp_path), FakeEmbeddings(), read_only=True)
+
+
+def test_tokenize_keeps_compound_tokens_and_their_parts():
+    assert tokenize("module load GCC/11.2.0") == ["module", "load", "gcc/11.2.0", "gcc", "11", "2", "0"]
+
+
+def test_bm25_ranks_exact_matches_first(tmp_path):
+    build_store(tmp_path)
+    bm25 = BM25Index(str(tmp_path))
+
+    positions, scores = bm25.search("gcc/11.2.0", k=5)
+    # The compound token only matches chunk 1; chunk 2 only shares the "gcc" part
+    assert list(positions) == [1, 2]
+    assert scores[0] > scores[1] > 0
+
+    # Chunks sharing no term with the query are never returned
+    positions, _ = bm25.search("vpn", k=5)
+    assert list(positions) == [3]
+    positions, _ = bm25.search("kerberos", k=5)
+    assert list(positions) == []
+
+
+def test_bm25_prefers_shorter_chunks_and_respects_mask(tmp_path):
+    build_store(tmp_path)
+    bm25 = BM25Index(str(tmp_path))
+
+    # Both chunks mention a password reset once, the shorter one scores higher
+    positions, _ = bm25.search("password reset", k=5)
+    assert list(positions) == [4, 5]
+    positions, _ = bm25.search("password reset", k=1)
+    assert list(positions) == [4]
+
+    mask = np.ones(len(CORPUS), dtype=bool)
+    mask[4] = False
+    positions, _ = bm25.search("password reset", k=5, mask=mask)
+    assert list(positions) == [5]
+
+
+def test_reciprocal_rank_fusion_order():
+    # a: 1/61 + 1/62, c: 1/63 + 1/61, b: 1/62, d: 1/63
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["c", "a", "d"]], rrf_k=60) == ["a", "c", "b", "d"]
+    assert reciprocal_rank_fusion([["a", "b"], []]) == ["a", "b"]
+
+
+def test_hybrid_retriever_finds_exact_ticket_number(tmp_path):
+    vector_store = build_store(tmp_path)
+    query = "INC0012345"
+
+    dense = HybridRetriever(vector_store=vector_store, search_kwargs={"k": 1})
+    assert dense.invoke(query)[0].page_content != CORPUS[4]
+
+    # BM25 ranks the ticket first, which outweighs any dense rank after fusion
+    hybrid = HybridRetriever(vector_store=vector_store, bm25=BM25Index(str(tmp_path)), search_kwargs={"k": 1},
+                             fetch_k=len(CORPUS))
+    assert hybrid.invoke(query)[0].page_content == CORPUS[4]
@@ -0,0 +1,238 @@
+import importlib.util
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS, Qdrant
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from qdrant_client import QdrantClient
+import src.rag.bulk_embed as bulk_embed
+import src.rag.ingest as ingest
+from src.rag.dedup import DUPLICATES_KEY, apply_duplicate_metadata
+from src.rag.embedding_cache import CachedEmbeddings
+from src.rag.faiss_index import load_index_spec
+from src.rag.manifest import compute_chunk_id
+from src.rag.numpy_store import NumpyVectorStore
+from src.rag.qdrant_bulk import ensure_collection
+from src.rag.vector_store import load_faiss_store, save_faiss_store, update_duplicate_metadata
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Gives every text its own random unit vector, seeded by the text.
+    """
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).normal(size=8)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def use_thread_pool(monkeypatch):
+    """
+    Runs the bulk embedding engine on threads with FakeEmbeddings instead of
+    spawning model workers. Returns the list of texts sent to the pool.
+    """
+    embedded = []
+
+    def encode(texts):
+        embedded.extend(texts)
+        return FakeEmbeddings().embed_documents(texts)
+
+    monkeypatch.setattr(bulk_embed, "ProcessPoolExecutor",
+                        lambda max_workers, **kwargs: ThreadPoolExecutor(max_workers))
+    monkeypatch.setattr(bulk_embed, "_worker_encode", encode)
+    monkeypatch.setattr(bulk_embed, "length_bucketed_batches", lambda texts, batch_size: [
+        order[i:i + batch_size]
+        for order in [sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)]
+        for i in range(0, len(texts), batch_size)
+    ])
+    return embedded
+
+
+def test_buffered_preserves_order():
+    assert list(ingest.buffered(iter(range(100)), maxsize=3)) == list(range(100))
+
+
+def test_buffered_reraises_stage_error():
+    def stage():
+        yield 1
+        raise ValueError("bad record")
+
+    items = ingest.buffered(stage())
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="bad record"):
+        next(items)
+
+
+def test_buffered_close_stops_producer():
+    closed = threading.Event()
+
+    def stage():
+        try:
+            for i in range(1000):
+                yield i
+        finally:
+            closed.set()
+
+    items = ingest.buffered(stage(), maxsize=2)
+    assert [next(items), next(items)] == [0, 1]
+    items.close()
+    assert closed.wait(timeout=5)
+
+
+def test_windowed_embeddings_keep_order_and_use_cache(monkeypatch, tmp_path):
+    embedded = use_thread_pool(monkeypatch)
+    pools = []
+    monkeypatch.setattr(bulk_embed, "ProcessPoolExecutor",
+                        lambda max_workers, **kwargs: pools.append(max_workers) or ThreadPoolExecutor(max_workers))
+    cache = CachedEmbeddings(FakeEmbeddings, cache_path=str(tmp_path / "embeddings.sqlite"))
+    texts = [f"chunk {i} " + "x" * (i % 7) for i in range(40)]
+    cache.store(texts[:5], FakeEmbeddings().embed_documents(texts[:5]))
+    windows = [[(text, i) for i, text in enumerate(texts)][start:start + 10] for start in range(0, 40, 10)]
+
+    results = list(bulk_embed.iter_windowed_embeddings(iter(windows), workers=2, threads_per_worker=1,
+                                                       batch_size=4, cache=cache))
+
+    items = [item for batch, _ in results for item in batch]
+    # Batches come back in submission order, so each window is done before the next starts
+    assert sorted(items) == list(range(40))
+    assert [max(batch) // 10 for batch, _ in results] == sorted(max(batch) // 10 for batch, _ in results)
+    for batch, vectors in results:
+        assert np.allclose(vectors, FakeEmbeddings().embed_documents([texts[i] for i in batch]))
+    assert sorted(embedded) == sorted(texts[5:])
+    assert pools == [2]
+    assert all(vector is not None for vector in cache.lookup(texts))
+
+    # Everything is cached now, so the second pass never starts the pool
+    assert len(list(bulk_embed.iter_windowed_embeddings(iter(windows), workers=2, cache=cache))) == 4
+    assert pools == [2]
+
+
+def test_chunk_id_ignores_duplicate_list():
+    chunk = Document(page_content="VPN drops every hour", metadata={"incident_number": "INC001"})
+    staged = Document(page_content=chunk.page_content,
+                      metadata={**chunk.metadata, DUPLICATES_KEY: ["INC002", "INC003"]})
+    assert compute_chunk_id(chunk) == compute_chunk_id(staged)
+
+
+def test_apply_duplicate_metadata():
+    chunks = [
+        Document(page_content="VPN drops every hour", metadata={"incident_number": "INC001"}),
+        Document(page_content="Printer is offline", metadata={"incident_number": "INC004", DUPLICATES_KEY: ["INC009"]}),
+        Document(page_content="Slurm job pending", metadata={"source": "guide.md"}),
+    ]
+    ids = [compute_chunk_id(chunk) for chunk in chunks]
+    vector_store = FAISS.from_documents(chunks, FakeEmbeddings(), ids=ids)
+
+    apply_duplicate_metadata(vector_store, {"INC001": ["INC002", "INC003"]})
+
+    metadata = [vector_store.docstore.search(chunk_id).metadata for chunk_id in ids]
+    assert metadata[0] == {"incident_number": "INC001", DUPLICATES_KEY: ["INC002", "INC003"]}
+    assert metadata[1] == {"incident_number": "INC004"}
+    assert metadata[2] == {"source": "guide.md"}
+    assert [compute_chunk_id(vector_store.docstore.search(chunk_id)) for chunk_id in ids] == ids
+
+
+def build_index(monkeypatch, persist_dir, guides, **kwargs):
+    use_thread_pool(monkeypatch)
+    monkeypatch.setattr(ingest, "get_embedding_model", lambda use_cache=True: FakeEmbeddings())
+    monkeypatch.setattr(ingest, "load_markdown_documents", lambda path, loader=None: list(guides))
+    ingest.run_ingest_pipeline(None, str(persist_dir), chunker="recursive", use_embedding_cache=False, **kwargs)
+    return load_faiss_store(str(persist_dir), FakeEmbeddings())
+
+
+def assert_every_chunk_found(vector_store, guides):
+    embeddings = FakeEmbeddings()
+    for guide in guides:
+        hit = vector_store.similarity_search_by_vector(embeddings.embed_query(guide.page_content), k=1)[0]
+        assert hit.page_content == guide.page_content
+
+
+def test_ingest_applies_index_spec_and_rebuilds_it(monkeypatch, tmp_path):
+    guides = [Document(page_content=f"Guide section {i} about module load gcc/{i}", metadata={"source": f"{i}.md"})
+              for i in range(30)]
+    vector_store = build_index(monkeypatch, tmp_path, guides, index_spec="HNSW8")
+    assert load_index_spec(str(tmp_path)) == "HNSW8"
+    assert vector_store.index.ntotal == 30
+    assert_every_chunk_found(vector_store, guides)
+
+    # Removing chunks from an HNSW index in place is not possible, so this rebuilds it
+    vector_store = build_index(monkeypatch, tmp_path, guides[5:], index_spec="HNSW8", incremental=True)
+    assert load_index_spec(str(tmp_path)) == "HNSW8"
+    assert vector_store.index.ntotal == 25
+    assert_every_chunk_found(vector_store, guides[5:])
+
+
+def test_incremental_ingest_deletes_from_flat_index(monkeypatch, tmp_path):
+    guides = [Document(page_content=f"Guide section {i} about sbatch --time={i}", metadata={"source": f"{i}.md"})
+              for i in range(10)]
+    build_index(monkeypatch, tmp_path, guides)
+    vector_store = build_index(monkeypatch, tmp_path, guides[3:] + [Document(page_content="A new section")],
+                               incremental=True)
+    assert load_index_spec(str(tmp_path)) == "Flat"
+    assert vector_store.index.ntotal == 8
+    assert_every_chunk_found(vector_store, guides[3:])
+
+
+def load_create_vector_store():
+    spec = importlib.util.spec_from_file_location(
+        "create_vector_store", os.path.join(ROOT, "scripts", "rag", "create_vector_store.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def tickets(duplicates):
+    return [
+        Document(page_content=f"Ticket {number} cannot log in", metadata={
+            "incident_number": number, **({DUPLICATES_KEY: duplicates[number]} if number in duplicates else {})
+        })
+        for number in ("INC001", "INC002", "INC003")
+    ]
+
+
+def test_staged_incremental_build_updates_duplicate_lists(tmp_path):
+    create_vector_store = load_create_vector_store()
+    embeddings = FakeEmbeddings()
+    chunks = tickets({"INC001": ["INC010"], "INC002": ["INC020"]})
+    ids = [compute_chunk_id(chunk) for chunk in chunks]
+    save_faiss_store(FAISS.from_documents(chunks, embeddings, ids=ids), str(tmp_path))
+    manifest = {"chunk_ids": ids}
+
+    # A later export adds a duplicate to INC001, INC002 loses its duplicate and INC003 gains one
+    chunks = tickets({"INC001": ["INC010", "INC011"], "INC003": ["INC030"]})
+    assert [compute_chunk_id(chunk) for chunk in chunks] == ids
+    assert create_vector_store.update_vector_store("faiss", str(tmp_path), embeddings, manifest, chunks, ids)
+
+    vector_store = load_faiss_store(str(tmp_path), embeddings)
+    assert vector_store.index.ntotal == 3
+    assert [vector_store.docstore.search(chunk_id).metadata for chunk_id in ids] == [chunk.metadata for chunk in chunks]
+
+
+def test_update_duplicate_metadata_in_memory_and_qdrant():
+    embeddings = FakeEmbeddings()
+    chunks = tickets({"INC002": ["INC020"]})
+    duplicates = {"INC001": ["INC010"]}
+    expected = [chunk.metadata for chunk in tickets(duplicates)]
+
+    numpy_store = NumpyVectorStore.from_documents(chunks, embeddings)
+    assert update_duplicate_metadata(numpy_store, duplicates, vector_store_type="in_memory") == 2
+    assert numpy_store.metadatas == expected
+
+    client = QdrantClient(location=":memory:")
+    ensure_collection(client, 8, "tickets")
+    qdrant_store = Qdrant(client=client, collection_name="tickets", embeddings=embeddings)
+    qdrant_store.add_documents(chunks)
+    assert update_duplicate_metadata(qdrant_store, duplicates, vector_store_type="qdrant") == 2
+    points, _ = client.scroll(collection_name="tickets", limit=10, with_payload=True)
+    metadata = {point.payload["metadata"]["incident_number"]: point.payload["metadata"] for point in points}
+    assert [metadata[m["incident_number"]] for m in expected] == expected
@@ -0,0 +1,117 @@
+import zlib
+import faiss
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from src.rag.faiss_index import apply_index_spec
+from src.rag.hybrid_retriever import HybridRetriever
+from src.rag.manifest import compute_chunk_id
+from src.rag.mmap_store import write_docstore
+from src.rag.partitions import expand_quotas, parse_quotas, partition_of, selector_params
+from src.rag.vector_store import load_faiss_store
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Gives every text its own random unit vector, seeded by the text.
+    """
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).normal(size=8)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def corpus():
+    guides = [Document(page_content=f"Guide section {i} on sbatch", metadata={"source": f"guide_{i}.md"})
+              for i in range(6)]
+    tickets = [
+        Document(page_content=f"Ticket {i} about sbatch", metadata={
+            "incident_number": f"INC{i:04d}", "opened_at": f"{2023 + i % 2}-03-01", "state": ["Closed", "Open"][i % 2],
+        })
+        for i in range(10)
+    ]
+    return guides + tickets
+
+
+def build_store(tmp_path, documents):
+    vector_store = FAISS.from_documents(documents, FakeEmbeddings(),
+                                        ids=[compute_chunk_id(document) for document in documents])
+    vector_store.save_local(str(tmp_path))
+    write_docstore(vector_store, str(tmp_path))
+    return load_faiss_store(str(tmp_path), FakeEmbeddings(), read_only=True)
+
+
+def test_partition_of():
+    assert partition_of({"source": "guide.md"}) == "guides"
+    assert partition_of({"incident_number": "INC1", "opened_at": "2024-05-01"}, by_date=False) == "tickets"
+    assert partition_of({"incident_number": "INC1", "opened_at": "2024-05-01"}, by_date=True) == "tickets-2024"
+    assert partition_of({"incident_number": "INC1", "opened_at": None}, by_date=True) == "tickets"
+
+
+def test_parse_and_expand_quotas():
+    assert parse_quotas(" guides=3, tickets*=2 ") == {"guides": 3, "tickets*": 2}
+    with pytest.raises(ValueError):
+        parse_quotas("guides")
+    partitions = ["guides", "tickets-2023", "tickets-2024"]
+    assert expand_quotas({"guides": 3, "tickets*": 2, "wiki": 1}, partitions) == {
+        "guides": 3, "tickets-2023": 2, "tickets-2024": 2,
+    }
+
+
+@pytest.mark.parametrize("index_spec", ["Flat", "HNSW8", "IVF2,Flat"])
+def test_selector_params_restrict_search(index_spec):
+    vectors = np.random.default_rng(0).normal(size=(200, 8)).astype(np.float32)
+    index = faiss.index_factory(8, index_spec)
+    index.train(vectors)
+    index.add(vectors)
+    mask = np.zeros(200, dtype=bool)
+    mask[::7] = True
+
+    params, _keepalive = selector_params(index, mask)
+    _, positions = index.search(vectors[:5], 10, params=params)
+    positions = positions[positions >= 0]
+    assert len(positions) > 0
+    assert mask[positions].all()
+
+
+def test_quotas_are_respected(tmp_path):
+    vector_store = build_store(tmp_path, corpus())
+    retriever = HybridRetriever(vector_store=vector_store, quotas={"guides": 2, "tickets": 3})
+
+    documents = retriever.invoke("sbatch")
+    # Each partition contributes its quota, interleaved by rank
+    assert [partition_of(document.metadata) for document in documents] == [
+        "guides", "tickets", "guides", "tickets", "tickets",
+    ]
+
+
+def test_filter_excludes_other_partitions(tmp_path):
+    vector_store = build_store(tmp_path, corpus())
+    retriever = HybridRetriever(vector_store=vector_store, search_kwargs={"k": 10, "filter": {"state": "Open"}})
+    documents = retriever.invoke("sbatch")
+    assert len(documents) == 5
+    assert all(document.metadata["state"] == "Open" for document in documents)
+
+    # Guides have no state, so the filter leaves nothing to search in their partition
+    retriever = HybridRetriever(vector_store=vector_store, quotas={"guides": 3, "tickets": 2},
+                                search_kwargs={"filter": {"state": "Open"}})
+    documents = retriever.invoke("sbatch")
+    assert [partition_of(document.metadata) for document in documents] == ["tickets", "tickets"]
+
+
+def test_quota_inside_hnsw_index(tmp_path):
+    documents = corpus()
+    vector_store = FAISS.from_documents(documents, FakeEmbeddings(),
+                                        ids=[compute_chunk_id(document) for document in documents])
+    apply_index_spec(vector_store, "HNSW8", 0)
+    vector_store.save_local(str(tmp_path))
+    write_docstore(vector_store, str(tmp_path))
+    vector_store = load_faiss_store(str(tmp_path), FakeEmbeddings(), read_only=True)
+
+    retriever = HybridRetriever(vector_store=vector_store, quotas={"guides": 4})
+    assert all(partition_of(document.metadata) == "guides" for document in retriever.invoke("sbatch"))
@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+import src.rag.qdrant_bulk as qdrant_bulk
+from src.rag.manifest import compute_chunk_id
+
+COLLECTION = "test_tickets"
+DIMENSION = 4
+
+
+def fake_bulk_embeddings(texts, workers=None, threads_per_worker=None, batch_size=8, cache=None):
+    """
+    Stands in for iter_bulk_embeddings with one vector per text derived from
+    its length, in batches like the worker pool yields them.
+    """
+    for start in range(0, len(texts), batch_size):
+        indices = list(range(start, min(start + batch_size, len(texts))))
+        yield indices, np.array([[len(texts[i]), i + 1, 1.0, 0.5] for i in indices], dtype=np.float32)
+
+
+class Crash(Exception):
+    pass
+
+
+def test_upload_resumes_after_crash(monkeypatch, tmp_path):
+    monkeypatch.setattr(qdrant_bulk, "iter_bulk_embeddings", fake_bulk_embeddings)
+    client = QdrantClient(location=":memory:")
+    qdrant_bulk.ensure_collection(client, DIMENSION, COLLECTION)
+    documents = [Document(page_content=f"ticket {i} " + "x" * i, metadata={"incident_number": f"INC{i:04d}"})
+                 for i in range(25)]
+    ids = [compute_chunk_id(document) for document in documents]
+    checkpoint_path = str(tmp_path / "upload.checkpoint")
+
+    upsert = client.upsert
+    calls = []
+
+    def crash_on_third_batch(**kwargs):
+        calls.append(len(kwargs["points"]))
+        if len(calls) == 3:
+            raise Crash()
+        return upsert(**kwargs)
+
+    monkeypatch.setattr(client, "upsert", crash_on_third_batch)
+    with pytest.raises(Crash):
+        qdrant_bulk.upload_to_qdrant(client, documents, ids, embeddings=None, collection_name=COLLECTION,
+                                     upload_batch_size=5, parallel=1, checkpoint_path=checkpoint_path)
+    assert len(qdrant_bulk.read_checkpoint(checkpoint_path)) == 10
+    # Batches in flight when the upload failed may be written but not checkpointed
+    assert client.count(collection_name=COLLECTION).count >= 10
+
+    monkeypatch.setattr(client, "upsert", upsert)
+    uploaded = qdrant_bulk.upload_to_qdrant(client, documents, ids, embeddings=None, collection_name=COLLECTION,
+                                            upload_batch_size=5, parallel=1, checkpoint_path=checkpoint_path)
+    assert uploaded == 15
+    assert client.count(collection_name=COLLECTION).count == len(documents)
+    assert not os.path.exists(checkpoint_path)
@@ -0,0 +1,92 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+import src.rag.rag_pipeline as rag_pipeline
+from src.rag.answer_cache import SemanticAnswerCache
+
+
+class FakeProvider:
+    """
+    LLM provider whose LLM records its prompts and answers with a fixed
+    text. Tokens are counted as words.
+    """
+
+    def __init__(self, context_window=2048, thread_safe=True, answer="fake answer"):
+        self.context_window = context_window
+        self.thread_safe = thread_safe
+        self.prompts = []
+        self.answer = answer
+
+    def get_llm(self):
+        return RunnableLambda(lambda prompt: self.prompts.append(prompt.to_string()) or self.answer)
+
+    def get_token_counter(self, llm):
+        return lambda text: len(text.split())
+
+
+def build_chain(monkeypatch, provider, documents, answer_cache=None):
+    monkeypatch.setattr(rag_pipeline, "get_llm_provider", lambda name: provider)
+    retriever = RunnableLambda(lambda question: documents)
+    return rag_pipeline.create_rag_chain(llm_provider_name="fake", retriever=retriever, answer_cache=answer_cache)
+
+
+def test_context_truncated_to_remaining_room(monkeypatch):
+    monkeypatch.setattr(rag_pipeline, "LLM_MAX_NEW_TOKENS", 40)
+    provider = FakeProvider(context_window=100)
+    documents = [Document(page_content=" ".join(f"word{i}" for i in range(50)), metadata={"source": "a.md"})]
+    chain = build_chain(monkeypatch, provider, documents)
+
+    assert chain.invoke("How do I log in?") == "fake answer"
+    prompt_tokens = len(provider.prompts[0].split())
+    assert "word0 word1" in provider.prompts[0]
+    assert prompt_tokens + 40 <= 100
+
+
+def test_question_too_long_is_turned_away(monkeypatch):
+    monkeypatch.setattr(rag_pipeline, "LLM_MAX_NEW_TOKENS", 512)
+    provider = FakeProvider(context_window=100)
+    chain = build_chain(monkeypatch, provider, [Document(page_content="Use ssh to log in.")])
+
+    assert chain.invoke("How do I log in?") == rag_pipeline.QUESTION_TOO_LONG_ANSWER
+    assert "".join(chain.stream("How do I log in?")) == rag_pipeline.QUESTION_TOO_LONG_ANSWER
+    assert provider.prompts == []
+
+
+def test_chain_with_non_thread_safe_provider(monkeypatch):
+    provider = FakeProvider(thread_safe=False)
+    # Like LlamaCpp, the LLM counts its own tokens, which the serializing wrapper cannot
+    llm = provider.get_llm()
+    llm.get_num_tokens = lambda text: len(text.split())
+    provider.get_llm = lambda: llm
+    provider.get_token_counter = lambda llm: llm.get_num_tokens
+    chain = build_chain(monkeypatch, provider, [Document(page_content="Use ssh to log in.")])
+
+    assert chain.invoke("How do I log in?") == "fake answer"
+    assert "".join(chain.stream("How do I log in?")) == "fake answer"
+
+
+class FakeEmbeddings:
+    """
+    Embeds a text as its counts of a few words, so the same question
+    always gets the same vector.
+    """
+
+    words = ["log", "in", "ssh", "gpu", "job", "slurm"]
+
+    def embed_query(self, text):
+        tokens = text.lower().replace("?", "").split()
+        return [float(tokens.count(word)) + 0.01 for word in self.words]
+
+
+@pytest.mark.parametrize("mode", ["invoke", "stream"])
+def test_answer_cache_miss_then_hit(monkeypatch, tmp_path, mode):
+    provider = FakeProvider()
+    cache = SemanticAnswerCache(FakeEmbeddings(), "v1", cache_path=str(tmp_path / "answers.sqlite"))
+    chain = build_chain(monkeypatch, provider, [Document(page_content="Use ssh to log in.")], answer_cache=cache)
+    ask = chain.invoke if mode == "invoke" else lambda question: "".join(chain.stream(question))
+
+    assert ask("How do I log in?") == "fake answer"
+    assert ask("How do I log in?") == "fake answer"
+    assert len(provider.prompts) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["size"] == 1
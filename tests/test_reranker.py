@@ -0,0 +1,57 @@
+import time
+from langchain_core.documents import Document
+from src.rag.reranker import CrossEncoderReranker
+
+
+class FakeCrossEncoder:
+    """
+    Scores a pair by the length of its text and takes delay seconds per pair.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def predict(self, pairs, batch_size=32):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay * len(pairs))
+        return [len(text) for _, text in pairs]
+
+
+DOCUMENTS = [Document(page_content="x" * length) for length in (1, 5, 3, 8, 2, 7, 4, 6)]
+
+
+def test_rerank_orders_by_score():
+    reranker = CrossEncoderReranker(model=FakeCrossEncoder(), time_budget_ms=10_000, batch_size=2)
+    reranked = reranker.rerank("question", DOCUMENTS, top_n=3)
+    assert [len(d.page_content) for d in reranked] == [8, 7, 6]
+    assert reranker.stats()["timeouts"] == 0
+
+
+def test_rerank_sizes_batches_to_fit_budget():
+    model = FakeCrossEncoder(delay=0.02)
+    reranker = CrossEncoderReranker(model=model, time_budget_ms=110, batch_size=4)
+    start = time.perf_counter()
+    reranked = reranker.rerank("question", DOCUMENTS, top_n=6)
+    elapsed = time.perf_counter() - start
+
+    # The first batch is full size; the next one is shrunk to what fits in the rest of the budget
+    assert model.batches[0] == 4
+    assert model.batches[1] < 4
+    assert elapsed < 0.11 + 0.02
+    assert reranker.stats()["timeouts"] == 1
+    scored = sum(model.batches)
+    assert [len(d.page_content) for d in reranked[:scored]] == sorted(
+        (len(d.page_content) for d in DOCUMENTS[:scored]), reverse=True
+    )
+    assert reranked[scored:] == DOCUMENTS[scored:6]
+
+
+def test_rerank_uses_measured_latency_from_the_start():
+    model = FakeCrossEncoder(delay=0.02)
+    reranker = CrossEncoderReranker(model=model, time_budget_ms=1000, batch_size=4)
+    reranker.rerank("question", DOCUMENTS[:4], top_n=1)
+    reranker.time_budget_ms = 50
+    model.batches.clear()
+    reranker.rerank("question", DOCUMENTS, top_n=1)
+    assert model.batches[0] == 2
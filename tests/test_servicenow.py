@@ -0,0 +1,54 @@
+import json
+import pytest
+from src.rag.servicenow import iter_json_records
+
+RECORDS = [
+    {"number": "INC0001", "short_description": "Cannot log in", "work_notes": "Reset the password, see [KB]"},
+    {"number": "INC0002", "short_description": "Job pending", "tags": ["slurm", "qos"], "nested": {"a": [1, 2]}},
+    {"number": "INC0003", "short_description": "Café wifi – “quota” exceeded", "empty": {}},
+]
+
+
+def write(tmp_path, text):
+    path = tmp_path / "export.json"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("read_size", [1, 7, 64, 1 << 20])
+def test_records_across_read_blocks(tmp_path, read_size):
+    path = write(tmp_path, json.dumps({"meta": {"count": 3}, "records": RECORDS}, indent=2, ensure_ascii=False))
+    assert list(iter_json_records(path, read_size=read_size)) == RECORDS
+
+
+def test_whitespace_and_commas_between_records(tmp_path):
+    text = '{"records" :\n [\n\n' + ' ,\r\n\t'.join(json.dumps(record) for record in RECORDS) + '\n ,\n]\n}'
+    assert list(iter_json_records(write(tmp_path, text), read_size=5)) == RECORDS
+
+
+def test_empty_and_missing_array(tmp_path):
+    assert list(iter_json_records(write(tmp_path, '{"records": [ ]}'), read_size=3)) == []
+    assert list(iter_json_records(write(tmp_path, '{"other": [1, 2]}'), read_size=3)) == []
+
+
+def test_truncated_input(tmp_path):
+    text = json.dumps({"records": RECORDS})
+    records = iter_json_records(write(tmp_path, text[:-30]), read_size=8)
+    assert next(records) == RECORDS[0]
+    assert next(records) == RECORDS[1]
+    with pytest.raises(json.JSONDecodeError):
+        next(records)
+
+
+def test_unterminated_array(tmp_path):
+    text = json.dumps({"records": RECORDS})[:-2]
+    with pytest.raises(json.JSONDecodeError, match="Unterminated records array"):
+        list(iter_json_records(write(tmp_path, text), read_size=8))
+
+
+def test_malformed_record(tmp_path):
+    text = '{"records": [{"number": "INC0001"}, {"number": "INC0002" "oops"}, {"number": "INC0003"}]}'
+    records = iter_json_records(write(tmp_path, text), read_size=8)
+    assert next(records) == {"number": "INC0001"}
+    with pytest.raises(json.JSONDecodeError):
+        next(records)
@@ -0,0 +1,51 @@
+import json
+import pytest
+from src.rag.streaming import StreamingStats, sse_answer_events, sse_event
+
+
+def parse_events(events):
+    parsed = []
+    for event in events:
+        lines = event.strip().split("\n")
+        name = next((line[len("event: "):] for line in lines if line.startswith("event: ")), None)
+        data = json.loads(next(line[len("data: "):] for line in lines if line.startswith("data: ")))
+        parsed.append((name, data))
+    return parsed
+
+
+def test_sse_event():
+    assert sse_event({"token": "hi"}) == 'data: {"token": "hi"}\n\n'
+    assert sse_event({}, event="done") == "event: done\ndata: {}\n\n"
+
+
+def test_sse_answer_events_streams_tokens():
+    stats = StreamingStats()
+    events = parse_events(sse_answer_events(iter(["Use ", "", "sbatch."]), stats))
+    assert events == [(None, {"token": "Use "}), (None, {"token": "sbatch."}), ("done", {})]
+    assert stats.stats()["answers"] == 1
+
+
+def test_sse_answer_events_sends_error():
+    def failing():
+        yield "Use "
+        raise RuntimeError("llama.cpp failed")
+
+    events = parse_events(sse_answer_events(failing()))
+    assert events[0] == (None, {"token": "Use "})
+    assert "error" in events[1][1]
+    assert events[-1] == ("done", {})
+
+
+def test_local_chat_stream_route():
+    pytest.importorskip("flask")
+    from src.rag.local_chat import create_web_app
+
+    def fake_llm(prompt, **kwargs):
+        assert kwargs["stream"]
+        return iter([{"choices": [{"text": text}]} for text in ["Use ", "sbatch."]])
+
+    client = create_web_app(fake_llm).test_client()
+    response = client.post("/chat/stream", json={"message": "How do I submit a job?"})
+    events = parse_events(event + "\n\n" for event in response.get_data(as_text=True).split("\n\n") if event)
+    assert events == [(None, {"token": "Use "}), (None, {"token": "sbatch."}), ("done", {})]
+    assert client.post("/chat", json={"message": "How?"}).get_json() == {"response": "Use sbatch."}